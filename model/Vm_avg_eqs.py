@@ -8,6 +8,7 @@ Date: 16/06/2022
 Implementation Notes
 --------------------------------------------------------------------------------
     | 1: For the details regarding the (summed) keyword and the synapses, refer to the question I posed on the Brian2 forum, here: https://brian.discourse.group/t/how-can-i-get-the-population-firing-rate-from-a-spiking-hh-network-during-simulation/496
+    | 2: Only used with the C++ standalone device; in runtime mode the Vm averages are reduced directly from the populations (model/reduction.py).
 """
 
 eq_record_neurons = '''
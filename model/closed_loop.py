@@ -0,0 +1,107 @@
+"""
+Implementation Notes
+--------------------------------------------------------------------------------
+    | 1: ClosedLoopStimulation is a network_operation that watches a signal of the network during the run and delivers a pulse train (src/stimulation.py, with the parameters of the "stimulation" section) when it crosses a target: the phase of the Kuramoto order parameter crossing a target phase [rad] (e.g. 0 for the peaks, pi for the troughs of the theta rhythm), or the filtered CA1 E rate of the S2R filter (drive) rising above a threshold [Hz]. It replaces the two-pass workflow of scripts/phase_split.py (simulate, find the target phases, simulate again with the stimulation times).
+    | 2: The trains are written in place into the values of the stimulation TimedArray, starting at the time of the crossing (+ latency); the values are read by the generated code at every time step, so the neurons receive the train from the next step on. The waveform starts empty and holds the delivered stimulation at the end of the run.
+    | 3: Rules: no trains before `start` or after `stop`, at least `refractory` between two trains and at most `max_trains` trains (default: nr_of_trains of the "stimulation" section). The signal is checked every `dt` (default: the simulation dt) at the start of the time step, i.e. on the values of the previous step.
+    | 4: The phase is computed from the order parameter (x, y) directly, as the phase monitor does; a crossing is a change of sign of the wrapped difference to the target from negative to non-negative, so phase wraps (+-pi) are not taken for crossings. The trigger times and the waveform are part of the network state (store/restore). network_operations only run in runtime mode; closed-loop stimulation is not available with the C++ standalone device.
+"""
+
+import numpy as np
+
+from brian2 import NetworkOperation, second
+
+from src import stimulation
+
+defaults = {'enabled':False, 'signal':'phase', 'target':0., 'start':0., 'stop':None, 'refractory':0.2, 'max_trains':None, 'latency':0., 'dt':None}
+
+
+def pulse_train(stim):
+    """ A single pulse train [nA] from the "stimulation" section of a configuration, sampled at its dt """
+    duration = stim['nr_of_pulses']/stim['pulse_freq'] + 20*stim['dt']
+    train, _ = stimulation.generate_stim(duration=duration,
+                                         dt=stim['dt'],
+                                         I_stim=stim['I'],
+                                         stim_on=0.,
+                                         nr_of_trains=1,
+                                         nr_of_pulses=stim['nr_of_pulses'],
+                                         stim_freq=stim['stim_freq'],
+                                         pulse_width=stim['pulse_width'],
+                                         pulse_freq=stim['pulse_freq'],
+                                         ipi=stim['ipi'])
+    return np.trim_zeros(train, 'b')
+
+
+def wrap(phase):
+    """ Phase wrapped to [-pi, pi) """
+    return (phase + np.pi) % (2*np.pi) - np.pi
+
+
+class ClosedLoopStimulation(NetworkOperation):
+    """ Delivers pulse trains when a signal of the network crosses a target (see notes #1-#4) """
+
+    def __init__(self, config, stim, inputs_stim, G_pop_avg=None, G_S2R=None, dt=0.1e-3):
+        config = dict(defaults, **config)
+        super().__init__(lambda t: self.check(t), dt=(config['dt'] or dt)*second, when='start', name='closed_loop')
+        self.signal = config['signal']
+        self.target = config['target']
+        self.start = config['start']
+        self.stop = config['stop']
+        self.refractory = config['refractory']
+        self.max_trains = config['max_trains'] if config['max_trains'] is not None else stim['nr_of_trains']
+        self.latency = config['latency']
+
+        if self.signal == 'phase':
+            if G_pop_avg is None:
+                raise ValueError('Phase-triggered stimulation requires the Kuramoto input; the fixed input is enabled')
+            x, y = G_pop_avg.variables['x'], G_pop_avg.variables['y']
+            self.source = lambda: wrap(np.arctan2(y.get_value()[0], x.get_value()[0]) - self.target)
+        elif self.signal == 'drive':
+            Y = G_S2R.variables['Y']
+            self.source = lambda: Y.get_value()[0] - self.target
+        else:
+            raise ValueError('Unknown closed-loop signal "{0}" [phase | drive]'.format(self.signal))
+
+        self.stim_dt = stim['dt']
+        self.train = pulse_train(stim)*1e-9 # nA -> A, as in the TimedArray
+        self.values = inputs_stim.values
+        self.reset()
+
+    def reset(self):
+        """ Clears the trigger times and the delivered waveform """
+        self.triggers = []
+        self.previous = None
+        self.values[:] = 0.
+
+    def crossed(self, value):
+        """ Sign change of the (wrapped) difference to the target, from negative to non-negative (note #4) """
+        if self.previous is None or not self.previous < 0. <= value:
+            return False
+        return self.signal != 'phase' or value - self.previous < np.pi
+
+    def check(self, t):
+        t = float(t/second)
+        value = self.source()
+        crossed = self.crossed(value)
+        self.previous = value
+        if not crossed or t < self.start or (self.stop is not None and t >= self.stop):
+            return
+        if len(self.triggers) >= self.max_trains or (self.triggers and t - self.triggers[-1] < self.refractory - 1e-9):
+            return
+
+        self.triggers.append(t)
+        i0 = int(round((t + self.latency)/self.stim_dt))
+        n = max(min(len(self.train), len(self.values)-i0), 0)
+        self.values[i0:i0+n] = self.train[:n]
+
+    def delivered(self):
+        """ Delivered stimulation waveform [nA] """
+        return self.values*1e9
+
+    def _full_state(self):
+        return {'triggers':list(self.triggers), 'previous':self.previous, 'values':self.values.copy()}
+
+    def _restore_from_full_state(self, state):
+        self.triggers = list(state['triggers'])
+        self.previous = state['previous']
+        self.values[:] = state['values']
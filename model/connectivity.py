@@ -0,0 +1,254 @@
+"""
+Implementation Notes
+--------------------------------------------------------------------------------
+    | 1: Building the distance-based projections is the slowest part of the network setup. The generated (i, j) index arrays only depend on the neuron positions, the connection probability, the kernel width and the random seed, so they can be stored on disk and reloaded through `connect(i=..., j=...)`.
+    | 2: Cache entries are named by a SHA-1 hash of everything the connectivity depends on (content-addressed). The gains do not change the indices but are part of the key as well, so that every projection maps to exactly one entry.
+    | 3: Entries are written to a temporary file and atomically renamed, so parallel jobs sharing a cache directory never read half-written files. The modification time of an entry is refreshed on every hit; when the directory grows larger than its size limit, the least recently used entries are deleted first.
+    | 4: The 'kdtree' generator only evaluates the kernel for pairs closer than cutoff*sigma (found with a cKDTree), then draws the Bernoulli trials in NumPy and hands the indices to Brian2. The cost is O(N*k) with k the number of candidates per neuron, instead of O(N_pre*N_post). The probability mass lost to the cutoff is estimated on random pre/post pairs and reported, so the cutoff can be tuned.
+    | 5: The inter-area kernel only depends on the z-coordinates. The 'banded' generator sorts the postsynaptic z-values (the groups are already created sorted by z), finds the window [z - cutoff*sigma, z + cutoff*sigma] of every presynaptic neuron with `searchsorted`, and expands all windows into candidate pairs without a Python loop over neurons.
+    | 6: Each projection draws from its own generator, seeded with (seed, crc32(name)); results do not depend on the order in which the projections are built.
+    | 7: Only the 'kdtree' and 'banded' generators with a seed are cached: their indices are a deterministic function of the key. The 'brian' generator draws from the global random stream, so its indices also depend on the projections built before it (generated or reloaded); unseeded runs draw fresh connectivity every time. Neither is cached. The indices are stored from the NumPy arrays, never read back from the synapses, which also works with the C++ standalone device.
+    | 8: 'kdtree' (intra) and 'banded' (inter) are the defaults, also for configurations without a "generator" section, so that the largest projections are cached. They draw from the per-projection streams of note #6 instead of the global stream, and drop the pairs beyond cutoff*sigma: a given seed gives a different connectivity than with the 'brian' generator (same statistics up to the truncated mass). Set the generators to 'brian' to reproduce the connectivity of earlier runs.
+"""
+
+import os
+import zlib
+import hashlib
+import tempfile
+import numpy as np
+from scipy.spatial import cKDTree
+
+from brian2.units import *
+
+# Default cache location and size limit
+conn_cache_dir = os.path.expanduser(os.path.join('~', '.memstim', 'connectivity'))
+conn_cache_size = 10*2**30  # bytes (10 GiB)
+
+
+def get_positions(G):
+    """ Returns the (N, 3) array of soma positions of a group, in metres; the copy kept at creation (G._positions) if any, since state variables cannot be read before the run with the C++ standalone device """
+    if getattr(G, '_positions', None) is not None:
+        return G._positions
+    return np.column_stack((G.x_soma_[:], G.y_soma_[:], G.z_soma_[:]))
+
+
+def conn_key(name, pos_pre, pos_post, p, sigma, gain, seed, kernel='xyz', autapses=True, method='brian', cutoff=None):
+    """ Content-addressed key (SHA-1 hex digest) for a single projection """
+    h = hashlib.sha1()
+    h.update(np.ascontiguousarray(pos_pre, dtype=np.float64).tobytes())
+    h.update(np.ascontiguousarray(pos_post, dtype=np.float64).tobytes())
+    h.update(repr((name, len(pos_pre), len(pos_post), float(p), float(sigma/metre), float(gain), seed, kernel, bool(autapses), method, cutoff)).encode('utf8'))
+    return h.hexdigest()
+
+
+def load_indices(cache_dir, key, N_pre, N_post):
+    """ Loads the (i, j) index arrays of a projection from the cache; returns None on a miss or on a corrupted/mismatching entry """
+    fname = os.path.join(cache_dir, key + '.npz')
+    if not os.path.isfile(fname):
+        return None
+
+    try:
+        with np.load(fname) as data:
+            i = data['i'].astype(np.int32)
+            j = data['j'].astype(np.int32)
+            N = tuple(data['N'])
+    except Exception:
+        os.remove(fname)
+        return None
+
+    # size checks
+    if (N != (N_pre, N_post)) or (len(i) != len(j)) or (len(i) and (i.max() >= N_pre or j.max() >= N_post)):
+        os.remove(fname)
+        return None
+
+    # refresh the LRU timestamp
+    os.utime(fname, None)
+
+    return i, j
+
+
+def store_indices(cache_dir, key, i, j, N_pre, N_post, max_size=None):
+    """ Atomically stores the (i, j) index arrays of a projection in the cache, then enforces the size limit """
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # smallest unsigned type that fits the indices
+    dtype = np.uint16 if max(N_pre, N_post) <= np.iinfo(np.uint16).max else np.uint32
+
+    fd, tmpname = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fout:
+            np.savez(fout, i=np.asarray(i).astype(dtype), j=np.asarray(j).astype(dtype), N=np.array([N_pre, N_post]))
+        os.replace(tmpname, os.path.join(cache_dir, key + '.npz'))
+    except Exception:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+        raise
+
+    evict(cache_dir, max_size)
+
+
+def evict(cache_dir, max_size=None):
+    """ Deletes the least recently used entries until the cache is smaller than max_size (bytes; default: conn_cache_size) """
+    if max_size is None:
+        max_size = conn_cache_size
+    entries = []
+    for fname in os.listdir(cache_dir):
+        if fname.endswith('.npz'):
+            try:
+                st = os.stat(os.path.join(cache_dir, fname))
+            except FileNotFoundError:
+                continue # removed by another job
+            entries.append((st.st_mtime, st.st_size, fname))
+
+    total = sum(e[1] for e in entries)
+    for mtime, size, fname in sorted(entries):
+        if total <= max_size:
+            break
+        try:
+            os.remove(os.path.join(cache_dir, fname))
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def gaussian_expr(p, sigma, kernel='xyz'):
+    """ Brian2 string expression for the (Gaussian) distance-based connection probability """
+    if kernel == 'z':
+        dist2 = '(z_soma_pre-z_soma_post)**2'
+    else:
+        dist2 = '(x_soma_pre-x_soma_post)**2+(y_soma_pre-y_soma_post)**2+(z_soma_pre-z_soma_post)**2'
+    return str(p)+'*exp(-('+dist2+')/(2*('+str(sigma/umetre)+'*umetre)**2))'
+
+
+def get_rng(seed, name):
+    """ Independent random generator per projection (see note #6) """
+    if seed is None:
+        return np.random.default_rng()
+    return np.random.default_rng([int(seed), zlib.crc32(name.encode('utf8'))])
+
+
+def truncated_mass(pos_pre, pos_post, sigma, cutoff, rng, samples=100000):
+    """ Estimates the fraction of the expected number of synapses lost by ignoring pairs further than cutoff*sigma, using random pre/post pairs """
+    i = rng.integers(0, len(pos_pre), samples)
+    j = rng.integers(0, len(pos_post), samples)
+    d2 = np.sum((pos_pre[i] - pos_post[j])**2, axis=1)
+    k = np.exp(-d2/(2*sigma**2))
+    if k.sum() == 0:
+        return 0.
+    return k[d2 > (cutoff*sigma)**2].sum() / k.sum()
+
+
+def kdtree_indices(pos_pre, pos_post, p, sigma, cutoff=4., autapses=True, rng=None, chunk=1000):
+    """ Samples Gaussian distance-based connectivity between two sets of positions (in metres, sigma unitless) using a KD-tree (see note #4).
+        Returns the (i, j) index arrays and the estimated truncated probability mass. """
+    if rng is None:
+        rng = np.random.default_rng()
+
+    radius = cutoff*sigma
+    tree_post = cKDTree(pos_post)
+
+    i_all = []
+    j_all = []
+    for start in range(0, len(pos_pre), chunk):
+        tree_pre = cKDTree(pos_pre[start:start+chunk])
+        pairs = tree_pre.sparse_distance_matrix(tree_post, radius, output_type='ndarray')
+
+        # Bernoulli trials on the candidates
+        prob = p*np.exp(-pairs['v']**2/(2*sigma**2))
+        keep = rng.random(len(prob)) < prob
+        i = pairs['i'][keep] + start
+        j = pairs['j'][keep]
+
+        if not autapses:
+            i, j = i[i!=j], j[i!=j]
+
+        i_all.append(i)
+        j_all.append(j)
+
+    # sort by presynaptic index, the way Brian2 generates them
+    i = np.concatenate(i_all).astype(np.int32)
+    j = np.concatenate(j_all).astype(np.int32)
+    order = np.lexsort((j, i))
+
+    return i[order], j[order], truncated_mass(pos_pre, pos_post, sigma, cutoff, rng)
+
+
+def banded_indices(z_pre, z_post, p, sigma, cutoff=4., rng=None, chunk=500):
+    """ Samples Gaussian connectivity over the z-axis (in metres, sigma unitless) using z-sorted windows (see note #5).
+        Returns the (i, j) index arrays and the estimated truncated probability mass. """
+    if rng is None:
+        rng = np.random.default_rng()
+
+    order = np.argsort(z_post, kind='stable')
+    z_sorted = z_post[order]
+
+    # window of candidates per presynaptic neuron
+    radius = cutoff*sigma
+    lo = np.searchsorted(z_sorted, z_pre - radius, side='left')
+    hi = np.searchsorted(z_sorted, z_pre + radius, side='right')
+
+    i_all = []
+    j_all = []
+    for start in range(0, len(z_pre), chunk):
+        counts = hi[start:start+chunk] - lo[start:start+chunk]
+
+        # expand the windows into (pre, sorted post) candidate pairs
+        i = np.repeat(np.arange(start, start+len(counts)), counts)
+        k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(lo[start:start+chunk], counts)
+
+        # Bernoulli trials on the candidates
+        prob = p*np.exp(-(z_pre[i] - z_sorted[k])**2/(2*sigma**2))
+        keep = rng.random(len(prob)) < prob
+
+        i_all.append(i[keep])
+        j_all.append(order[k[keep]])
+
+    i = np.concatenate(i_all).astype(np.int32)
+    j = np.concatenate(j_all).astype(np.int32)
+    idx = np.lexsort((j, i))
+
+    return i[idx], j[idx], truncated_mass(z_pre[:,np.newaxis], z_post[:,np.newaxis], sigma, cutoff, rng)
+
+
+def connect_gaussian(syn, p, sigma, kernel='xyz', autapses=True, gain=1., seed=None, cache_dir=None, max_size=None, method='brian', cutoff=4.):
+    """ Connects the synapses `syn` using a Gaussian kernel of width sigma, evaluated over all three coordinates ('xyz') or the z-axis only ('z').
+        method: 'brian' evaluates the string expression over all pairs, 'kdtree' uses kdtree_indices() and 'banded' (z-kernel only) uses banded_indices(), with the given cutoff (in units of sigma).
+        If cache_dir is given, the (i, j) arrays of the seeded 'kdtree'/'banded' generators are reloaded from / stored in the cache (note #7). Returns True on a cache hit. """
+    G_pre = syn.source
+    G_post = syn.target
+    pos_pre = get_positions(G_pre)
+    pos_post = get_positions(G_post)
+
+    key = None
+    if cache_dir and method in ['kdtree', 'banded'] and seed is not None:
+        key = conn_key(syn.name, pos_pre, pos_post, p, sigma, gain, seed, kernel, autapses, method, cutoff)
+        idx = load_indices(cache_dir, key, len(G_pre), len(G_post))
+        if idx is not None:
+            syn.connect(i=idx[0], j=idx[1])
+            return True
+
+    if method in ['kdtree', 'banded']:
+        rng = get_rng(seed, syn.name)
+        if method == 'banded':
+            if kernel != 'z':
+                raise ValueError('The banded generator only supports the z-axis kernel')
+            i, j, mass = banded_indices(pos_pre[:,2], pos_post[:,2], p, sigma/metre, cutoff, rng)
+            if not autapses:
+                i, j = i[i!=j], j[i!=j]
+        else:
+            if kernel == 'z':
+                pos_pre, pos_post = pos_pre[:,2:], pos_post[:,2:]
+            i, j, mass = kdtree_indices(pos_pre, pos_post, p, sigma/metre, cutoff, autapses, rng)
+        syn.connect(i=i, j=j)
+        print('[\u2022]\t{0}: {1} synapses | truncated mass @ {2}\u03c3: {3:.2e}'.format(syn.name, len(i), cutoff, mass))
+        if key is not None:
+            store_indices(cache_dir, key, i, j, len(G_pre), len(G_post), max_size)
+    elif method == 'brian':
+        if autapses:
+            syn.connect(p=gaussian_expr(p, sigma, kernel))
+        else:
+            syn.connect(condition='i!=j', p=gaussian_expr(p, sigma, kernel))
+    else:
+        raise ValueError('Unknown connectivity method: ' + method)
+
+    return False
@@ -0,0 +1,49 @@
+"""
+Implementation Notes
+--------------------------------------------------------------------------------
+    | 1: LFP proxy at a set of virtual electrodes: the signal of electrode k is sum_j v_j / max(r_kj, r_min), over the neurons j of the selected groups within `cutoff` of the electrode (r: distance from the soma, in mm). Neurons further than the cutoff do not contribute; r_min avoids the singularity of neurons right at a contact.
+    | 2: The weights only depend on the soma positions, so they are computed once, at build time, as a sparse (electrodes x neurons) matrix; neighbour search with a k-d tree, so the cost is proportional to the number of neurons within the cutoff, not electrodes x neurons.
+    | 3: During the run all electrode signals are one sparse mat-vec per recording step (model/reduction.py), recorded at the LFP dt. Its cost scales with the number of non-zero weights; with the default cutoff a few tens of contacts touch a small fraction of the ~40k neurons.
+    | 4: Electrodes are given explicitly ([x, y, z] in mm) and/or as a line of `n` equally spaced contacts between `start` and `end` (e.g. along the hippocampal axis).
+"""
+
+import numpy as np
+from scipy import sparse
+from scipy.spatial import cKDTree
+
+from model.reduction import PopulationReduction
+
+defaults = {'enabled':False,
+            'groups':['EC_pyCAN', 'EC_inh', 'DG_py', 'DG_inh', 'CA3_pyCAN', 'CA3_inh', 'CA1_pyCAN', 'CA1_inh'],
+            'electrodes':[], 'line':None, 'cutoff':1., 'r_min':10e-3, 'dt':1e-3, 'variable':'v'}
+
+
+def electrode_positions(config):
+    """ Electrode coordinates [mm], (electrodes, 3), from the explicit list and the line of contacts (note #4) """
+    electrodes = [np.asarray(config.get('electrodes', []), dtype=float).reshape(-1, 3)]
+    line = config.get('line', None)
+    if line:
+        frac = np.linspace(0., 1., int(line['n']))[:, np.newaxis]
+        electrodes.append(np.asarray(line['start'], dtype=float)*(1.-frac) + np.asarray(line['end'], dtype=float)*frac)
+    return np.concatenate(electrodes)
+
+
+def weight_matrix(electrodes, positions, cutoff=1., r_min=10e-3):
+    """ Sparse (electrodes x neurons) matrix of 1/max(r, r_min) weights [1/mm] within cutoff [mm] (notes #1, #2); electrodes, positions in mm """
+    dist = cKDTree(electrodes).sparse_distance_matrix(cKDTree(positions), cutoff, output_type='coo_matrix')
+    return sparse.csr_matrix((1./np.maximum(dist.data, r_min), (dist.row, dist.col)), shape=(len(electrodes), len(positions)))
+
+
+def make_lfp(config, groups, dt):
+    """ PopulationReduction computing the LFP proxy of all electrodes (note #3); groups is a {name: NeuronGroup} dictionary, dt [s] is used if the config has no dt """
+    config = dict(defaults, **config)
+    electrodes = electrode_positions(config)
+    G_lfp = [groups[name] for name in config['groups']]
+    positions = np.concatenate([np.column_stack((G.x_soma_[:], G.y_soma_[:], G.z_soma_[:])) for G in G_lfp])*1e3 # m -> mm
+    W = weight_matrix(electrodes, positions, config['cutoff'], config['r_min'])
+
+    lfp = PopulationReduction('lfp', config['dt'] or dt)
+    lfp.add('lfp', G_lfp, variable=config['variable'], weights=W)
+    lfp.electrodes = electrodes
+    lfp.weights = W
+    return lfp
@@ -0,0 +1,767 @@
+"""
+Implementation Notes
+--------------------------------------------------------------------------------
+    | 1: build_network() builds the complete model from a configuration: neuron groups, intra/inter-area synapses, Vm average groups, the S2R filter, the Kuramoto (or fixed) input, the stimulation TimedArray and the monitors. It returns a NetworkHandle. run_simulation.py is a thin command-line wrapper around it.
+    | 2: The handle keeps its own namespace (model constants, stimulation/theta TimedArrays, tstep) and passes it to every run, so the identifiers in the equations do not depend on the globals of the caller. Several configurations can be built and run back-to-back in one process, reusing the imports, the compiled code objects and the cached connectivity.
+    | 3: model.settings is still initialized from the configuration, since model.setup reads it; every value the handle needs after the build is copied to the handle itself.
+    | 4: In C++ standalone mode the device holds a single network per process; values that change between runs are passed as run-time arguments instead (see set_per_run). State variables cannot be read before the run: the soma positions are kept on the groups (_positions) for the connectivity generators and the spike counters.
+    | 5: State variables are only recorded as requested by the recording plan of the configuration (see model/recording.py).
+    | 6: run_streaming() splits long runs in segments and writes the monitors to disk in the background (see model/streaming.py); results() reads a streamed run back from disk.
+    | 7: fork() shares the simulation of the dynamics before the stimulation between the runs of a sweep: the network state (including monitors and the random number generator) is stored at t_fork and restored for every stimulation waveform, which only requires a new TimedArray in the run namespace.
+    | 8: An optional watchdog (model/watchdog.py) stops runaway or silent runs early; the reason and the time of the abort are part of the results.
+    | 9: The Vm averages are reduced directly from the membrane potentials of the populations (model/reduction.py) at the Vm_avg recording rate, instead of through one-neuron groups with summed synapses; the latter are only kept for the C++ standalone device.
+    | 10: An optional multi-electrode LFP proxy (model/lfp.py) is recorded the same way, as one sparse mat-vec per LFP sample (runtime mode only).
+    | 11: Optional binned spike counts per population (and spatial bin) are accumulated during the run (model/rate_bins.py); with recording.spikes = False the spike rasters are not kept at all and the results only hold the counts (n_spikes, rate_bins).
+    | 12: Optional closed-loop stimulation (model/closed_loop.py) delivers the pulse trains during the run, locked to the phase of the theta rhythm or to the CA1 rate, instead of at fixed onsets (runtime mode only).
+    | 13: phase_response() measures phase-response curves in one process: the unperturbed network runs once, up to every onset in turn; at every onset the state is stored and every stimulation train is simulated for a short window only, as is the unperturbed continuation (same random numbers), and the phase difference of the order parameter at the end of the window is the response (see prc.py).
+    | 14: In C++ standalone mode, the project is built in a subdirectory of the standalone directory named by the code signature of the binary (src/runcache.py) and the number of threads. It is built once, by warm_cache.py or by the first run, under a file lock; every later run of the same signature only builds the network in Python (to map the run-time arguments and read the results) and executes the existing binary with its own run-time arguments and results directory. Nothing in the project directory is regenerated, so concurrent runs do not race on the sources or the binary. Unseeded configurations cannot share a binary (it holds the random initial values and the connectivity): every run builds its own project.
+"""
+
+import os
+import numpy as np
+from scipy.spatial.transform import Rotation as R
+
+from brian2 import *
+from brian2.utils.filelock import FileLock
+
+import parameters
+from model import globals as model_globals
+from model.globals import *
+from model.HH_equations import *
+from model.kuramoto_equations import *
+from model.filter_equations import *
+from model.fixed_input_equations import *
+from model.Vm_avg_eqs import *
+from model import settings
+from model import setup
+from model.recording import make_recorders
+from model.watchdog import Watchdog
+from model.reduction import PopulationReduction
+from model.lfp import make_lfp
+from model.rate_bins import make_counters
+from model.closed_loop import ClosedLoopStimulation
+from model.streaming import StreamWriter, collect, clear, read_stream, smooth_rate
+
+from src.annex_funcs import make_flat
+from src import stimulation
+from src import runcache
+
+
+# Marks a complete C++ standalone build (note #14)
+BUILT_FNAME = '.built'
+
+# Stippled positions of the populations
+positions_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'neuron_positions', 'full')
+
+# Populations per area | (positions file, equations, name) for [E, I]
+populations = [
+    [('EC_E-stipple-10000.npy', py_CAN_inp_eqs, 'EC_pyCAN'), ('EC_I-stipple-1000.npy', inh_inp_eqs, 'EC_inh')],
+    [('DG_E-stipple-10000.npy', py_eqs, 'DG_py'), ('DG_I-stipple-100.npy', inh_eqs, 'DG_inh')],
+    [('CA3_E-stipple-1000.npy', py_CAN_eqs, 'CA3_pyCAN'), ('CA3_I-stipple-100.npy', inh_eqs, 'CA3_inh')],
+    [('CA1_E-stipple-10000.npy', py_CAN_eqs, 'CA1_pyCAN'), ('CA1_I-stipple-1000.npy', inh_eqs, 'CA1_inh')]
+]
+
+
+def load_positions(fname, N):
+    """ Loads the 2D stippled positions of a population, adds a random z-coordinate and sorts the neurons by increasing z [m] """
+    pos = np.load(os.path.join(positions_dir, fname))
+    pos = hstack((pos, zeros((N, 1)))) # add z-axis
+    pos = R.from_euler('x', 180, degrees=True).apply(pos) # fix rotated y-positions from stippling program
+    pos *= float(scale) # [m], plain array (Brian2 >= 2.6 returns a Quantity otherwise)
+    pos[:,2] += float(15*mm)*rand(N)
+    idx = np.argsort(pos[:,2]) # sort neurons by increasing z-coordinate
+    return pos[idx]
+
+
+def stimulation_waveform(stim, tv):
+    """ Stimulation waveform [nA] and its time-vector [s] from the "stimulation" section of a configuration; zeros over tv if there is no stimulation """
+    if not stim['I'][0]:
+        return zeros(tv.shape), tv
+
+    return stimulation.generate_stim(duration=stim['duration'],
+                                     dt=stim['dt'],
+                                     I_stim=stim['I'],
+                                     stim_on=stim['onset'],
+                                     nr_of_trains=stim['nr_of_trains'],
+                                     nr_of_pulses=stim['nr_of_pulses'],
+                                     stim_freq=stim['stim_freq'],
+                                     pulse_width=stim['pulse_width'],
+                                     pulse_freq=stim['pulse_freq'],
+                                     ipi=stim['ipi'])
+
+
+class NetworkHandle:
+    """ Handle on a built network: groups, monitors, run and results extraction """
+
+    def __init__(self, data):
+        self.data = data
+        self.duration = settings.duration
+        self.dt = settings.dt
+        self.fixed_input = settings.fixed_input_enabled
+        self.standalone = None
+        self.run_args = {}
+        self.namespace = {}
+        self.stream_dir = None
+        self.watchdog = None
+        self.Vm_avg = None
+        self.lfp = None
+        self.rate_bins = []
+        self.closed_loop = None
+        self.state_mon_Vm_avg = []
+
+        self.net = None
+        self.G_all = [[[] for pops in range(2)] for areas in range(4)]
+        self.groups = {}
+        self.monitors = {}
+
+    def set_per_run(self, group, varname, value):
+        """ Sets a variable that changes between runs of the same network; run-time argument in standalone mode """
+        if self.standalone:
+            self.run_args[getattr(group, varname)] = value
+        else:
+            setattr(group, varname, value)
+
+    def run(self, duration=None, report='text', report_period=10*second, profile=True, results_directory=None):
+        """ Runs the network for `duration` (default: the configured duration) """
+        if duration is None:
+            duration = self.duration
+        defaultclock.dt = self.dt
+
+        if self.standalone:
+            if duration != self.duration:
+                raise ValueError('The duration is part of the C++ standalone binary')
+            device.apply_run_args() # after all the initializations
+            self.net.run(duration, report=report, report_period=report_period, profile=profile, namespace=self.namespace)
+            self.build()
+            print('[+] Running standalone binary @', self.standalone)
+            if results_directory is not None:
+                results_directory = os.path.relpath(results_directory, self.standalone) # relative to the project directory
+            device.run(directory=self.standalone, run_args=self.run_args, results_directory=results_directory)
+        else:
+            self.net.run(duration, report=report, report_period=report_period, profile=profile, namespace=self.namespace)
+
+    def compile(self):
+        """ Generates and compiles all code objects without simulating (a single time step in runtime mode) """
+        defaultclock.dt = self.dt
+        if self.standalone:
+            device.apply_run_args()
+            self.net.run(self.duration, namespace=self.namespace)
+            self.build()
+        else:
+            self.net.run(defaultclock.dt, namespace=self.namespace)
+
+    def build(self):
+        """ Builds the C++ standalone project unless it is already built; the first process builds it, the others wait and reuse the binary (note #14) """
+        os.makedirs(self.standalone, exist_ok=True)
+        with FileLock(self.standalone + '.lock'):
+            if os.path.isfile(os.path.join(self.standalone, BUILT_FNAME)):
+                get_device().project_dir = self.standalone # run-time arguments are written to its static_arrays/
+                print('[+] Reusing standalone build @', self.standalone)
+                return
+            device.build(directory=self.standalone, run=False)
+            open(os.path.join(self.standalone, BUILT_FNAME), 'w').close()
+
+    def set_stimulation(self, xstim):
+        """ Replaces the stimulation waveform [nA], sampled at the configured stimulation dt (runtime mode) """
+        self.xstim = xstim
+        # same name -> same generated code for every waveform
+        self.inputs_stim = TimedArray(values=xstim*nA, dt=self.stim_dt*second, name='Input_stim')
+        self.namespace['inputs_stim'] = self.inputs_stim
+
+    def fork(self, t_fork, variants, filename=None, report='text', report_period=10*second, profile=True):
+        """ Runs [0, t_fork) once, stores the network state and runs every stimulation waveform of `variants` from the snapshot (note #7).
+            Yields (index, results) after every branch. The snapshot is kept in memory, or in `filename` if given. """
+        if self.standalone:
+            raise NotImplementedError('Forking is not supported with the C++ standalone device')
+        if self.closed_loop:
+            raise NotImplementedError('Forking is not supported with closed-loop stimulation')
+        defaultclock.dt = self.dt
+
+        # the branches must share the prefix
+        N_fork = int(round(t_fork/(self.stim_dt*second)))
+        for xstim in variants[1:]:
+            if not np.array_equal(xstim[:N_fork], variants[0][:N_fork]):
+                raise ValueError('The stimulation variants differ before t_fork = {0}'.format(t_fork))
+
+        print('[+] Common prefix: 0 - {0}'.format(t_fork))
+        self.set_stimulation(variants[0])
+        self.net.run(t_fork, report=report, report_period=report_period, profile=profile, namespace=self.namespace)
+        if self.watchdog and self.watchdog.reason:
+            # aborted before the stimulation; every branch shares the outcome
+            res = self.results()
+            for cnt in range(len(variants)):
+                yield cnt, res
+            return
+        self.net.store('fork', filename=filename)
+
+        for cnt, xstim in enumerate(variants):
+            print('[+] Branch {0}/{1}'.format(cnt+1, len(variants)))
+            self.net.restore('fork', filename=filename, restore_random_state=True)
+            if self.watchdog:
+                self.watchdog.reset()
+            self.set_stimulation(xstim)
+            self.net.run(self.duration-t_fork, report=report, report_period=report_period, profile=profile, namespace=self.namespace)
+            yield cnt, self.results()
+
+    def order_phase(self):
+        """ Current phase of the Kuramoto order parameter [rad] """
+        return float(np.arctan2(self.G_pop_avg.y[0], self.G_pop_avg.x[0]))
+
+    def phase_response(self, onsets, trains, window, filename=None):
+        """ Phase response of the theta rhythm to every stimulation train of `trains` ({key: train [nA]}) delivered at every onset [s] (note #13).
+            Yields (onset, phase at the onset, {key: phase difference after `window` [s], relative to the unperturbed network}) per onset. """
+        if self.standalone:
+            raise NotImplementedError('Phase response sweeps are not supported with the C++ standalone device')
+        if self.fixed_input or self.closed_loop:
+            raise NotImplementedError('Phase response sweeps require the Kuramoto input, without closed-loop stimulation')
+        defaultclock.dt = self.dt
+
+        N_stim = int(round(self.duration/(self.stim_dt*second)))+1
+        self.set_stimulation(zeros(N_stim))
+        for onset in sorted(onsets):
+            # unperturbed network up to the onset
+            self.net.run(onset*second-self.net.t, namespace=self.namespace)
+            phase0 = self.order_phase()
+            self.net.store('prc', filename=filename)
+            self.net.run(window*second, namespace=self.namespace)
+            phase_ref = self.order_phase()
+
+            d_phase = {}
+            for key, train in trains.items():
+                self.net.restore('prc', filename=filename, restore_random_state=True)
+                xstim = zeros(N_stim)
+                i0 = int(round(onset/self.stim_dt))
+                xstim[i0:i0+len(train)] = train[:N_stim-i0]
+                self.set_stimulation(xstim)
+                self.net.run(window*second, namespace=self.namespace)
+                d_phase[key] = float((self.order_phase()-phase_ref+np.pi) % (2*np.pi) - np.pi)
+
+            # back to the unperturbed network
+            self.net.restore('prc', filename=filename, restore_random_state=True)
+            self.set_stimulation(zeros(N_stim))
+            yield onset, phase0, d_phase
+
+    def run_streaming(self, dirname, segment=1*second, report='text', report_period=10*second, profile=True):
+        """ Runs the network in segments of `segment`, streaming the monitors to `dirname` and emptying them after every segment (runtime mode only) """
+        if self.standalone:
+            raise NotImplementedError('Streaming runs are not supported with the C++ standalone device')
+        defaultclock.dt = self.dt
+
+        N_steps = int(round(self.duration/self.dt))
+        N_seg = max(int(round(segment/self.dt)), 1)
+        monitors = list(self.monitors.values())
+
+        writer = StreamWriter(dirname)
+        writer.write('positions.npz', self.positions())
+        try:
+            for cnt, step in enumerate(range(0, N_steps, N_seg)):
+                self.net.run(min(N_seg, N_steps-step)*self.dt, report=report, report_period=report_period, profile=profile, namespace=self.namespace)
+                segment_data = collect(monitors)
+                for red in self.reductions():
+                    segment_data.update(red.collect())
+                    red.clear()
+                writer.write('segment_{0:05d}.npz'.format(cnt), segment_data)
+                clear(monitors)
+                if self.watchdog and self.watchdog.reason:
+                    break
+        finally:
+            writer.close()
+        self.stream_dir = dirname
+
+    def reductions(self):
+        """ Population reductions of the network (Vm averages, LFP) """
+        return [red for red in [self.Vm_avg, self.lfp] if red]
+
+    def positions(self):
+        """ Soma positions per group [m] """
+        return {G.name:np.column_stack((G.x_soma_[:], G.y_soma_[:], G.z_soma_[:])) for G in self.G_flat}
+
+    def results(self):
+        """ Extracts the recorded data as unitless numpy arrays (times in ms, currents in nA, voltages in mV); streamed runs are read back from disk """
+        spike_mons = make_flat([self.spike_mon_E_all, self.spike_mon_I_all])
+        rate_mon = self.rate_mon_E_all[3][0]
+        if self.stream_dir:
+            data = read_stream(self.stream_dir)
+        else:
+            data = collect(spike_mons + [rate_mon, self.state_mon_s2r] + make_flat(self.state_mon_Vm_avg) + self.state_mon_rec + [RB.monitor for RB in self.rate_bins] + ([] if self.fixed_input else [self.state_mon_order_param]))
+            for red in self.reductions():
+                data.update(red.collect())
+
+        res = {}
+        res['spikes'] = {SM.name:{'i':data[SM.name+'.i'], 't':data[SM.name+'.t']*1e3} for SM in spike_mons if SM.record}
+        res['n_spikes'] = {SM.name:int(np.sum(SM.count[:])) for SM in spike_mons}
+        res['rate_bins'] = {RB.group:{'counts':RB.counts(data[RB.monitor.name+'.count']), 'edges':RB.edges, 'dt':RB.dt_bin} for RB in self.rate_bins}
+        res['rate_CA1_E'] = smooth_rate(data[rate_mon.name+'.rate'], float(self.dt), 50e-3)
+        res['s2r_drive'] = data[self.state_mon_s2r.name+'.drive'][0]
+
+        if not self.fixed_input:
+            name = self.state_mon_order_param.name
+            res['order_param'] = {'phase':data[name+'.phase'][0],
+                                  'rhythm':data[name+'.rhythm'][0]*1e9,
+                                  'coherence':data[name+'.coherence'][0]}
+
+        res['stim_input'] = self.closed_loop.delivered() if self.closed_loop else self.xstim
+        if self.closed_loop:
+            res['closed_loop'] = {'t_trigger':np.array(self.closed_loop.triggers)}
+        if self.Vm_avg:
+            res['Vm_avg'] = {channel:data[self.Vm_avg.name+'.'+channel]*1e3 for channel, *_ in self.Vm_avg.channels}
+        else:
+            res['Vm_avg'] = {StM.name:data[StM.name+'.sum_v'][0]*1e3 for StM in make_flat(self.state_mon_Vm_avg)}
+
+        if self.lfp:
+            res['lfp'] = {'signal':np.atleast_2d(data['lfp.lfp'])*1e3, 'electrodes':self.lfp.electrodes}
+
+        res['recordings'] = {}
+        for SM in self.state_mon_rec:
+            res['recordings'][SM.name] = {'t':data[SM.name+'.t'], 'i':np.asarray(SM.record)}
+            for varname in SM.record_variables:
+                res['recordings'][SM.name][varname] = data[SM.name+'.'+varname].astype(self.rec_dtype)
+
+        res['positions'] = self.positions()
+
+        res['t_end'] = float(self.net.t/second)
+        res['watchdog'] = self.watchdog.status() if self.watchdog else {'aborted':False, 'reason':None, 't_abort':None}
+
+        return res
+
+
+def build_network(config, conn_cache_dir=None, standalone=None, threads=0):
+    """ Builds the full network from a configuration (dictionary or json file) and returns a NetworkHandle """
+    if isinstance(config, str):
+        config = parameters.load(config)
+
+    # Settings initialization
+    settings.init(config)
+    handle = NetworkHandle(config)
+
+    # Debugging?
+    if settings.debugging:
+        prefs.codegen.target = 'numpy' # Use Python code generation instead of Cython
+        prefs.codegen.loop_invariant_optimisations = False # Switch off some optimization that makes the link between code and equations less obvious
+        np.seterr(all='raise', under='ignore') # Make numpy raise errors for all kind of floating point problems, including division by 0, but ignoring underflows
+        print('###########################')
+        print(' [!]  DEBUGGING MODE ON')
+        print('###########################')
+
+    # Use C++ standalone code generation (note #4)
+    if standalone:
+        # one project per binary (note #14); without a seed, the initial values and the connectivity are drawn anew
+        signature = runcache.code_signature(config, standalone=True)[:runcache.HASH_LEN] if settings.seed_val is not None else 'unseeded_{0}'.format(os.getpid())
+        handle.standalone = os.path.join(standalone, '{0}_t{1}'.format(signature, threads))
+        set_device('cpp_standalone', directory=handle.standalone, build_on_run=False)
+        prefs.devices.cpp_standalone.openmp_threads = threads
+
+    defaultclock.dt = settings.dt
+
+
+    # Make the neuron groups
+    # -------------------------------------------------------------#
+    print('\n[10] Making the neuron groups...')
+    print('-'*32)
+
+    print('[+] Groups:')
+    N_all = [settings.N_EC, settings.N_DG, settings.N_CA3, settings.N_CA1]
+    for area_idx in range(4):
+        # E
+        fname, eqs, name = populations[area_idx][0]
+        pos = load_positions(fname, N_all[area_idx][0])
+        G_E = NeuronGroup(N=N_all[area_idx][0],
+            model=eqs,
+            threshold='v>V_th',
+            reset=reset_eqs,
+            refractory=refractory_time,
+            method=integ_method,
+            name=name)
+        G_E.size = cell_size_py
+        G_E.glu = 1
+        G_E.x_soma = pos[:,0]*metre
+        G_E.y_soma = pos[:,1]*metre
+        G_E.z_soma = pos[:,2]*metre
+        G_E._positions = pos # readable before the run in standalone mode (see connectivity.get_positions)
+
+        # I
+        fname, eqs, name = populations[area_idx][1]
+        pos = load_positions(fname, N_all[area_idx][1])
+        G_I = NeuronGroup(N=N_all[area_idx][1],
+            model=eqs,
+            threshold='v>V_th',
+            refractory=refractory_time,
+            method=integ_method,
+            name=name)
+        G_I.size = cell_size_inh
+        G_I.x_soma = pos[:,0]*metre
+        G_I.y_soma = pos[:,1]*metre
+        G_I.z_soma = pos[:,2]*metre
+        G_I._positions = pos # readable before the run in standalone mode (see connectivity.get_positions)
+
+        # Add to list
+        handle.G_all[area_idx][0].append(G_E)
+        handle.G_all[area_idx][1].append(G_I)
+        print('[\u2022]\t{0}: done'.format(areas[area_idx]))
+
+    # Flatten
+    G_all = handle.G_all
+    G_flat = handle.G_flat = make_flat(G_all)
+
+    # initialize the groups, set initial conditions
+    for ngroup in G_flat:
+        ngroup.v = '-60.*mvolt-rand()*10*mvolt' # str -> individual init. val. per neuron, randn is Gaussian
+
+        # target populations get stimulated
+        if ngroup.name in ['{group}_pyCAN'.format(group=settings.stim_target), '{group}_py'.format(group=settings.stim_target), '{group}_inh'.format(group=settings.stim_target)]:
+            print("[!] Stimulation applied @", ngroup.name)
+            handle.set_per_run(ngroup, 'r', 1) # 1 means on
+        else:
+            handle.set_per_run(ngroup, 'r', 0) # int -> same init. val. for all neurons
+
+
+    # Make the synapses
+    # -------------------------------------------------------------#
+    print('\n[12] Making the synapses...')
+
+    # gains
+    gains_all =  [[1./G, 1.], [G, G], [1./G, 1.], [1., G]]
+    print("[!] Gains:", gains_all)
+
+    # connectivity cache
+    if conn_cache_dir and settings.seed_val is not None:
+        print('[+] Connectivity cache:', conn_cache_dir, '(seeded kdtree/banded generators only)')
+    else:
+        print('[-] Connectivity cache disabled')
+    conn_kwargs = {'seed':settings.seed_val, 'cache_dir':conn_cache_dir, 'cutoff':settings.conn_cutoff}
+
+    # intra
+    print('[+] Intra-region [{0}]'.format(settings.conn_method_intra))
+
+    syn_EC_all = setup.connect_intra(G_all[0][0], G_all[0][1], settings.p_EC_all, gains_all[0], method=settings.conn_method_intra, **conn_kwargs)
+    print('[\u2022]\tEC-to-EC: done')
+
+    syn_DG_all = setup.connect_intra(G_all[1][0], G_all[1][1], settings.p_DG_all, gains_all[1], method=settings.conn_method_intra, **conn_kwargs)
+    print('[\u2022]\tDG-to-DG: done')
+
+    syn_CA3_all = setup.connect_intra(G_all[2][0], G_all[2][1], settings.p_CA3_all, gains_all[2], method=settings.conn_method_intra, **conn_kwargs)
+    print('[\u2022]\tCA3-to-CA3: done')
+
+    syn_CA1_all = setup.connect_intra(G_all[3][0], G_all[3][1], settings.p_CA1_all, gains_all[3], method=settings.conn_method_intra, **conn_kwargs)
+    print('[\u2022]\tCA1-to-CA1: done')
+
+    handle.syn_intra_all = [syn_EC_all, syn_DG_all, syn_CA3_all, syn_CA1_all]
+
+    # inter
+    print('[+] Inter-region [{0}]'.format(settings.conn_method_inter))
+
+    syn_EC_DG_all = setup.connect_inter(G_all[0][0], G_all[1][0], G_all[1][1], settings.p_inter_all[0][1], gains_all[0], method=settings.conn_method_inter, **conn_kwargs)
+    syn_EC_CA3_all = setup.connect_inter(G_all[0][0], G_all[2][0], G_all[2][1], settings.p_inter_all[0][2], gains_all[0], method=settings.conn_method_inter, **conn_kwargs)
+    syn_EC_CA1_all = setup.connect_inter(G_all[0][0], G_all[3][0], G_all[3][1], settings.p_inter_all[0][3], gains_all[0], method=settings.conn_method_inter, **conn_kwargs)
+    print('[\u2022]\tEC-to-all: done')
+
+    syn_DG_CA3_all = setup.connect_inter(G_all[1][0], G_all[2][0], G_all[2][1], settings.p_inter_all[1][2], gains_all[1], method=settings.conn_method_inter, **conn_kwargs)
+    print('[\u2022]\tDG-to-CA3: done')
+
+    syn_CA3_CA1_all = setup.connect_inter(G_all[2][0], G_all[3][0], G_all[3][1], settings.p_inter_all[2][3], gains_all[2], method=settings.conn_method_inter, **conn_kwargs)
+    print('[\u2022]\tCA3-to-CA1: done')
+
+    syn_CA1_EC_all = setup.connect_inter(G_all[3][0], G_all[0][0], G_all[0][1], settings.p_inter_all[3][0], gains_all[3], method=settings.conn_method_inter, **conn_kwargs)
+    print('[\u2022]\tCA1-to-EC: done')
+
+    handle.syn_inter_all = [syn_EC_DG_all, syn_EC_CA3_all, syn_EC_CA1_all, syn_DG_CA3_all, syn_CA3_CA1_all, syn_CA1_EC_all]
+
+    # re-seed so that the rest of the run does not depend on whether the connectivity was generated or reloaded
+    if standalone:
+        np.random.seed(settings.seed_val) # keep the seed out of the generated code
+    else:
+        seed(settings.seed_val)
+
+
+    # Add the monitors (spikes/rates)
+    # -------------------------------------------------------------#
+    print('\n[13] Adding monitors...')
+
+    handle.rec_dtype = settings.rec_dtype
+    handle.state_mon_rec = make_recorders(settings.rec_monitors, {G.name:G for G in G_flat}, dt=settings.rec_dt, seed=settings.seed_val)
+    print('[\u2022]\tState monitors [recording plan]: done')
+
+    # spike counts only, without rasters (note #11)
+    handle.spike_mon_E_all = [[SpikeMonitor(G_py, record=settings.rec_spikes, name=G_py.name+'_spikemon') for G_py in G_all[i][0] if G_py] for i in range(4)]
+    handle.spike_mon_I_all = [[SpikeMonitor(G_inh, record=settings.rec_spikes, name=G_inh.name+'_spikemon') for G_inh in G_all[i][1] if G_inh] for i in range(4)]
+    print('[\u2022]\tSpike monitors{0}: done'.format('' if settings.rec_spikes else ' [counts only]'))
+
+    if settings.rec_rate_bins.get('enabled', False):
+        handle.rate_bins = make_counters(settings.rec_rate_bins, {G.name:G for G in G_flat})
+        print('[\u2022]\tBinned spike counts: done')
+
+    handle.rate_mon_E_all = [[PopulationRateMonitor(G_py, name=G_py.name+'_ratemon') for G_py in G_all[i][0] if G_py] for i in range(4)]
+    handle.rate_mon_I_all = [[PopulationRateMonitor(G_inh, name=G_inh.name+'_ratemon') for G_inh in G_all[i][1] if G_inh] for i in range(4)]
+    print('[\u2022]\tRate monitors: done')
+
+
+    # Average Vm per population
+    # -------------------------------------------------------------#
+    # Mean Vm per group per area (note #9)
+    print('\n[20] Vm averages...')
+    print('-'*32)
+
+    Vm_avg_dt = settings.rec_Vm_avg_dt or settings.dt
+    G_Vm_avg = []
+    syn_Vm_avg_all = []
+
+    if not standalone:
+        handle.Vm_avg = PopulationReduction('Vm_avg', float(Vm_avg_dt/second))
+        for area_idx in range(4):
+            handle.Vm_avg.add('Vm_avg_mon_{0}_E'.format(areas[area_idx]), G_all[area_idx][0][0])
+            handle.Vm_avg.add('Vm_avg_mon_{0}_I'.format(areas[area_idx]), G_all[area_idx][1][0])
+        print('[\u2022]\tPopulation reductions: done')
+    else:
+        # network_operations are not available in standalone mode; summed synapses instead
+        for area_idx in range(4):
+            for pop_idx, pop in enumerate(['E', 'I']):
+                G_avg = NeuronGroup(1, eq_record_neurons, name='Vm_avg_{0}_{1}'.format(areas[area_idx], pop))
+                syn_avg = Synapses(G_all[area_idx][pop_idx][0], G_avg, model=eq_record_synapses, dt=Vm_avg_dt)
+                syn_avg.connect()
+                G_Vm_avg.append(G_avg)
+                syn_Vm_avg_all.append(syn_avg)
+                handle.state_mon_Vm_avg.append(StateMonitor(G_avg, ['sum_v'], record=True, dt=Vm_avg_dt, name='Vm_avg_mon_{0}_{1}'.format(areas[area_idx], pop)))
+        print('[\u2022]\tSummed synapses (standalone): done')
+
+
+    # LFP electrodes
+    # -------------------------------------------------------------#
+    if settings.lfp.get('enabled', False):
+        print('\n[21] LFP electrodes...')
+        print('-'*32)
+        if standalone:
+            print(bcolors.YELLOW + '[!]' + bcolors.ENDC + ' LFP disabled: network operations are not supported in standalone mode')
+        else:
+            handle.lfp = make_lfp(settings.lfp, {G.name:G for G in make_flat(G_all) if G}, float(settings.dt))
+            print('[\u2022]\t{0} electrodes | {1} weights: done'.format(handle.lfp.weights.shape[0], handle.lfp.weights.nnz))
+
+
+    # Make the spikes-to-rates group
+    # -------------------------------------------------------------#
+    print('\n[30] Spikes-to-rates group...')
+    print('-'*32)
+
+    G_S2R = handle.G_S2R = NeuronGroup(1,
+        model=firing_rate_filter_eqs,
+        method='exact',
+        name='S2R_filter',
+        namespace=filter_params)
+    G_S2R.Y = 0 # initial conditions
+    print('[\u2022]\tGroup: done')
+
+    print('\n[31] Making the synapses...')
+    # connect the CA1-E group to the low-pass-filter spikes-2-rates (S2R) group
+    syn_CA1_2_rates = Synapses(G_all[3][0][0], G_S2R, on_pre='Y_post += (1/tauFR)/N_incoming', namespace=filter_params)
+    syn_CA1_2_rates.connect()
+    print('[\u2022]\tConnecting CA1-to-S2R: done')
+
+    # spikes2rates monitor (vout)
+    print('\n[32] Adding monitors...')
+    handle.state_mon_s2r = StateMonitor(G_S2R, ['drive'], record=True, name='s2r_mon')
+    print('[\u2022]\tState monitor [drive]: done')
+
+    # early abort of runaway/silent runs (note #8)
+    if settings.watchdog.get('enabled', False):
+        if standalone:
+            print(bcolors.YELLOW + '[!]' + bcolors.ENDC + ' Watchdog disabled: network operations are not supported in standalone mode')
+        else:
+            rate_monitors = {mon.name:mon for mon in make_flat([handle.rate_mon_E_all, handle.rate_mon_I_all])}
+            handle.watchdog = Watchdog(settings.watchdog, rate_monitors, G_S2R, dt=float(settings.dt))
+            print('[\u2022]\tWatchdog on {0}: done'.format(list(handle.watchdog.sources)))
+
+
+    # Inputs
+    # -------------------------------------------------------------#
+    print('\n[40] Inputs...')
+    print('-'*32)
+
+    G_inputs = []
+    syn_inputs = []
+    state_mon_inputs = []
+
+    print('[+] Time-vector')
+    handle.tv = tv = linspace(0, settings.duration/second, int(settings.duration/(settings.dt))+1)
+
+    if settings.fixed_input_enabled:
+        # Fixed input
+        print('\n[41] Making the fixed input group...')
+
+        A0 = settings.fixed_input_low
+        A1 = settings.fixed_input_high
+        f_rhythm = settings.fixed_input_frequency
+
+        print(bcolors.YELLOW + '[!]' + bcolors.ENDC + ' Using fixed input at %dHz | range [%.2f, %.2f]' % (f_rhythm, A0, A1))
+
+        # Make the input TimedArray
+        inp_theta_rect = (A1-A0)*(sin(2*pi*f_rhythm/Hz*tv-pi/2)+1)/2+A0
+        trail_zeros = zeros(int(settings.fixed_input_delay/(settings.dt*second)))
+        handle.inp_theta_delayed = concatenate((trail_zeros, inp_theta_rect/nA))
+        handle.namespace['inp_theta'] = TimedArray(handle.inp_theta_delayed*nA, dt=settings.dt) # external theta (TESTING)
+
+        # Make the input group and append it to the list
+        G_input = NeuronGroup(1, model=fixed_input_TA_eqs,
+                threshold='False',
+                method='euler',
+                name='Fixed_input_%dHz' % f_rhythm)
+        G_inputs.append(G_input)
+        print('[\u2022]\tFixed input group: done')
+
+        # state monitor
+        handle.state_mon_theta_rhythm = StateMonitor(G_input, ['rhythm'], record=True, name='theta_rhythm_mon')
+        state_mon_inputs.append(handle.state_mon_theta_rhythm)
+        print('[\u2022]\tState monitor [rhythm]: done')
+
+    else:
+        # Kuramoto Oscillators
+        print('\n[41] Making the Kuramoto oscillators group...')
+
+        print(bcolors.YELLOW + '[!]' + bcolors.ENDC + ' Using dynamic input; Kuramoto oscillators of size N=%d w/ f0 = %.2f Hz | rhythm gain: %.2f nA | reset gain: %.2f' % (settings.N_Kur, settings.f0, settings.r_gain/nA, settings.k_gain))
+
+        # Make the necessary groups
+        G_K = NeuronGroup(settings.N_Kur,
+            model=kuramoto_eqs_stim,
+            threshold='True',
+            method='euler',
+            name='Kuramoto_oscillators_N_%d' % settings.N_Kur)
+        theta0 = 2*pi*rand(settings.N_Kur) # uniform U~[0,2π]
+        omega0 = 2*pi*(settings.f0 + settings.sigma*randn(settings.N_Kur)) # ~N(2πf0,σ)
+        G_K.Theta = theta0
+        G_K.omega = omega0
+        handle.set_per_run(G_K, 'kN', settings.kN_frac)
+        handle.set_per_run(G_K, 'G_in', settings.k_gain)
+        handle.set_per_run(G_K, 'offset', settings.offset)
+        G_inputs.append(G_K) # append to the group list!
+        handle.G_K = G_K
+        print('[\u2022]\tKuramoto oscillators group: done')
+
+        syn_kuramoto =  Synapses(G_K, G_K, on_pre=syn_kuramoto_eqs, method='euler', name='Kuramoto_intra')
+        syn_kuramoto.connect(condition='i!=j')
+        syn_inputs.append(syn_kuramoto)
+        print('[\u2022]\tSynapses (Kuramoto): done')
+
+        # Kuramoto order parameter group
+        G_pop_avg = NeuronGroup(1,
+            model=pop_avg_eqs,
+            name='Kuramoto_averaging')
+        r0 = 1/settings.N_Kur * sum(exp(1j*theta0))
+        handle.set_per_run(G_pop_avg, 'x', real(r0))  # avoid division by zero
+        handle.set_per_run(G_pop_avg, 'y', imag(r0))
+        handle.set_per_run(G_pop_avg, 'G_out', settings.r_gain)
+        G_input = G_pop_avg # G_input as alias for G_pop_avg
+        G_inputs.append(G_input) # append to the group list!
+        handle.G_pop_avg = G_pop_avg
+        print('[\u2022]\tOrder parameter group: done')
+
+        syn_avg = Synapses(G_K, G_pop_avg, syn_avg_eqs, name='Kuramoto_avg')
+        syn_avg.connect()
+        syn_inputs.append(syn_avg)
+        print('[\u2022]\tSynapses (OP): done')
+
+        # Connections
+        print('\n[42] Connecting oscillators and filters...')
+        print('-'*32)
+
+        # connect the S2R group to the Kuramoto oscillators by linking input X to firing rates (drive)
+        G_K.X = linked_var(G_S2R, 'drive')
+        print('[\u2022]\tLinking S2R to Kuramoto oscillators: done')
+
+        # Kuramoto monitors
+        print('\n[43] Kuramoto and Filter Monitors...')
+        print('-'*32)
+
+        handle.state_mon_kuramoto = StateMonitor(G_K, ['Theta'], record=True, name='kuramoto_mon')
+        handle.state_mon_order_param = StateMonitor(G_pop_avg, ['coherence', 'phase', 'rhythm', 'rhythm_rect'], record=True, name='order_param_mon')
+        state_mon_inputs.append(handle.state_mon_kuramoto)
+        state_mon_inputs.append(handle.state_mon_order_param)
+        print('[\u2022]\tState monitor [Theta]: done')
+
+    # connect the input to the I_exc variable in EC_E and EC_I
+    for g in G_all[0][0] + G_all[0][1]:
+        print('[+]\tLinking input (theta rhythm) to group ', g.name)
+        g.I_exc = linked_var(G_input, 'rhythm')
+    print('[\u2022]\tLinking input rhythm: done')
+    print('[\u2022]\tInputs: done')
+
+
+    # Stimulation and other inputs
+    # -------------------------------------------------------------#
+    print('\n[50] Stimulation...')
+    print('-'*32)
+
+    # generate stimulation signal
+    if settings.I_stim[0]:
+        print(bcolors.GREEN + '[+]' + bcolors.ENDC + ' Stimulation ON')
+    else:
+        print(bcolors.RED + '[-]' + bcolors.ENDC + ' No stimulation defined; using empty TimedArray')
+    xstim, tv_stim = stimulation_waveform(config['stimulation'], tv)
+    if settings.closed_loop.get('enabled', False) and not standalone:
+        # the trains are written during the run (note #12)
+        tv_stim = linspace(0, settings.stim_duration, int(settings.stim_duration/settings.stim_dt)+1)
+        xstim = zeros(tv_stim.shape)
+    handle.xstim, handle.tv_stim = xstim, tv_stim
+    handle.stim_dt = settings.stim_dt
+
+    if standalone:
+        # same code for every waveform; the values are a run-time argument
+        inputs_stim = TimedArray(values=zeros(xstim.shape)*nA, dt=settings.stim_dt*second, name='Input_stim')
+        handle.run_args[inputs_stim] = xstim*nA
+    else:
+        inputs_stim = TimedArray(values=xstim*nA, dt=settings.stim_dt*second, name='Input_stim')
+    handle.inputs_stim = inputs_stim
+
+    if settings.closed_loop.get('enabled', False):
+        print('\n[51] Closed-loop stimulation...')
+        print('-'*32)
+        if standalone:
+            print(bcolors.YELLOW + '[!]' + bcolors.ENDC + ' Closed-loop stimulation disabled: network operations are not supported in standalone mode')
+        else:
+            handle.closed_loop = ClosedLoopStimulation(settings.closed_loop, config['stimulation'], inputs_stim,
+                                                       G_pop_avg=None if settings.fixed_input_enabled else handle.G_pop_avg,
+                                                       G_S2R=G_S2R, dt=float(settings.dt))
+            print('[\u2022]\tTrigger on {0} = {1} | up to {2} trains: done'.format(handle.closed_loop.signal, handle.closed_loop.target, handle.closed_loop.max_trains))
+
+
+    # Create the Network
+    # -------------------------------------------------------------#
+    print('\n[70] Connecting the network...')
+    print('-'*32)
+
+    # identifiers used in the equations (note #2)
+    handle.namespace.update({k:v for k, v in vars(model_globals).items() if not k.startswith('_')})
+    handle.namespace.update({'tstep':settings.dt, 'inputs_stim':inputs_stim})
+
+    handle.net = Network()
+    handle.net.add(G_all) # add groups
+    handle.net.add(G_S2R)
+    handle.net.add(G_inputs)
+    handle.net.add(G_Vm_avg)
+    print('[\u2022]\tNetwork groups: done')
+
+    for syn_curr in make_flat([handle.syn_intra_all, handle.syn_inter_all, syn_Vm_avg_all]): # add synapses (intra/inter/Vm avg)
+        if syn_curr != 0:
+            handle.net.add(syn_curr)
+    handle.net.add(syn_CA1_2_rates)
+    handle.net.add(syn_inputs) # synapses about inputs
+    print('[\u2022]\tNetwork connections: done')
+
+    handle.net.add(handle.state_mon_rec) # monitors
+    handle.net.add(handle.spike_mon_E_all)
+    handle.net.add(handle.spike_mon_I_all)
+    handle.net.add([RB.objects for RB in handle.rate_bins])
+    handle.net.add(handle.rate_mon_E_all)
+    handle.net.add(handle.rate_mon_I_all)
+    handle.net.add(handle.state_mon_s2r)
+    handle.net.add(state_mon_inputs)
+    handle.net.add(handle.state_mon_Vm_avg)
+    handle.net.add(handle.reductions())
+    if handle.watchdog:
+        handle.net.add(handle.watchdog.operation)
+    if handle.closed_loop:
+        handle.net.add(handle.closed_loop)
+    print('[\u2022]\tNetwork monitors: done')
+
+    # named access
+    handle.groups = {obj.name:obj for obj in handle.net.objects if isinstance(obj, NeuronGroup)}
+    handle.monitors = {obj.name:obj for obj in handle.net.objects if isinstance(obj, (StateMonitor, SpikeMonitor, PopulationRateMonitor))}
+
+    return handle
@@ -0,0 +1,49 @@
+"""
+Implementation Notes
+--------------------------------------------------------------------------------
+    | 1: BinnedSpikeCounter counts the spikes of a population in fixed time bins, optionally per spatial bin (equal-width bins of the soma positions along one axis, z by default: the septotemporal axis). Every neuron has a single synapse to the counter of its spatial bin, which increments an integer counter on each spike; the cost is one synaptic event per spike and the memory is independent of the number of spikes.
+    | 2: The counters are cumulative; a StateMonitor samples them every bin at the start of the time step, i.e. before the spikes of that step, so consecutive differences are the counts in [t_k, t_k+dt_bin). The last bin is closed with the final value of the counters. This only uses standard Brian2 objects, so it works in runtime and C++ standalone mode, with store/restore (fork) and with streamed runs.
+    | 3: The counts are exact: windowed rates (e.g. 5 ms windows, 90% overlap) follow from sums of consecutive bins when the window step is a multiple of the bin (see src/freq_analysis.binned_spike_counts). With the spike rasters turned off (recording.spikes = False), the SpikeMonitors only keep their spike counts.
+"""
+
+import numpy as np
+
+from brian2 import NeuronGroup, Synapses, StateMonitor, second
+
+from model.connectivity import get_positions
+
+defaults = {'enabled':False, 'dt':0.5e-3, 'spatial_bins':1, 'axis':'z',
+            'groups':['EC_pyCAN', 'EC_inh', 'DG_py', 'DG_inh', 'CA3_pyCAN', 'CA3_inh', 'CA1_pyCAN', 'CA1_inh']}
+
+
+def spatial_bins(positions, n_bins):
+    """ Equal-width bin index of every neuron along one coordinate, and the bin edges """
+    edges = np.linspace(positions.min(), positions.max(), n_bins+1)
+    return np.clip(np.digitize(positions, edges)-1, 0, n_bins-1), edges
+
+
+class BinnedSpikeCounter:
+    """ Spike counts of a population in fixed time bins, optionally per spatial bin (see notes #1, #2) """
+
+    def __init__(self, group, dt_bin, n_spatial=1, axis='z'):
+        self.group = group.name
+        self.name = group.name + '_bincount'
+        self.dt_bin = dt_bin
+        idx, edges = spatial_bins(get_positions(group)[:,'xyz'.index(axis)], n_spatial)
+        self.edges = edges*1e3 # m -> mm
+
+        self.counter = NeuronGroup(n_spatial, 'count : integer', name=self.name)
+        self.synapses = Synapses(group, self.counter, on_pre='count_post += 1', name=self.name+'_syn')
+        self.synapses.connect(i=np.arange(group.N), j=idx)
+        self.monitor = StateMonitor(self.counter, 'count', record=True, dt=dt_bin*second, when='start', name=self.name+'_mon')
+        self.objects = [self.counter, self.synapses, self.monitor]
+
+    def counts(self, samples):
+        """ Counts per (spatial bin, time bin) from the sampled cumulative counters (note #2) """
+        return np.diff(np.column_stack((samples, np.asarray(self.counter.count[:]))), axis=1)
+
+
+def make_counters(config, groups):
+    """ One BinnedSpikeCounter per configured group; groups is a {name: NeuronGroup} dictionary """
+    config = dict(defaults, **config)
+    return [BinnedSpikeCounter(groups[name], config['dt'], config['spatial_bins'], config['axis']) for name in config['groups']]
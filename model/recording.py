@@ -0,0 +1,58 @@
+"""
+Implementation Notes
+--------------------------------------------------------------------------------
+    | 1: State variables are only recorded when the configuration asks for them ("recording" section). Each entry names a group, the variables and an optional neuron subset; there is no full-population `v` by default. Spikes, the order parameter and the Vm averages are always recorded by the network itself.
+    | 2: Subsets are given as index ranges ({"range": [[start, stop], ...]}), a random fraction ({"fraction": 0.1}) or the neurons within a radius of a point ({"center": [x, y, z], "radius": r}, in mm). Keys can be combined; the union of the selections is recorded.
+    | 3: The recording dt is passed to the StateMonitors, so decimation happens during the simulation. Brian2 keeps the recorded values in float64; they are converted to the storage dtype when extracted (NetworkHandle.results). The dtype only reduces the size of the extracted results and of the output files; the memory used by the monitors during the run is set by the number of recorded neurons and the recording dt.
+"""
+
+import numpy as np
+
+from brian2 import *
+
+from model.connectivity import get_positions, get_rng
+
+
+def select_neurons(G, subset=None, seed=None):
+    """ Returns the sorted indices of the neurons of group G selected by `subset` (see note #2); all neurons if subset is empty """
+    if not subset:
+        return np.arange(len(G))
+
+    idx = []
+    if 'range' in subset:
+        for start, stop in subset['range']:
+            idx.append(np.arange(max(start, 0), min(stop, len(G))))
+
+    if 'fraction' in subset:
+        rng = get_rng(seed, G.name+'_rec')
+        N_sel = int(round(subset['fraction']*len(G)))
+        idx.append(rng.choice(len(G), N_sel, replace=False))
+
+    if 'radius' in subset:
+        center = np.array(subset.get('center', (0., 0., 0.)))*1e-3 # mm -> m
+        dist = np.linalg.norm(get_positions(G) - center, axis=1)
+        idx.append(np.flatnonzero(dist <= subset['radius']*1e-3))
+
+    if not idx:
+        raise ValueError('Unknown subset specification: ' + str(subset))
+
+    return np.unique(np.concatenate(idx)).astype(int)
+
+
+def make_recorders(plan, groups, dt=None, seed=None):
+    """ Creates one StateMonitor per entry of the recording plan; groups is a {name: NeuronGroup} dictionary """
+    monitors = []
+    for cnt, entry in enumerate(plan):
+        G = groups[entry['group']]
+        idx = select_neurons(G, entry.get('subset', None), seed)
+        if not len(idx):
+            print('[-]\tRecording #{0}: empty subset of {1}, skipping'.format(cnt, G.name))
+            continue
+
+        kwargs = {'dt':dt} if dt is not None else {}
+        SM = StateMonitor(G, entry['variables'], record=idx, name='rec_{0}_{1}'.format(G.name, cnt), **kwargs)
+        monitors.append(SM)
+        print('[\u2022]\tRecording {0} from {1}: {2}/{3} neurons'.format(entry['variables'], G.name, len(idx), len(G)))
+
+    return monitors
+
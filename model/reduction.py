@@ -0,0 +1,68 @@
+"""
+Implementation Notes
+--------------------------------------------------------------------------------
+    | 1: PopulationReduction computes scalars of a state variable directly from the arrays of the neuron groups: the mean over a population, the mean over a subset of neurons, or weighted sums (a weight vector or a (channels x neurons) matrix, dense or scipy.sparse) for arbitrary neuron sets. A weighted channel can span several groups: their arrays are concatenated and reduced with one (sparse) mat-vec. It replaces the one-neuron groups with (summed) synapses from every neuron, which updated ~22k synapse entries per time step to compute eight means.
+    | 2: It is a network_operation running at its own dt (the recording rate), so only the resulting scalars are computed and stored, once per recorded sample; all channels of a sample are kept as one row.
+    | 3: The samples are part of the network state (store/restore, fork) and are emptied along with the monitors in streamed runs (collect/clear). Keys are '<name>.<channel>', as for the monitors (see model/streaming.py).
+    | 4: network_operations only run in runtime mode; with the C++ standalone device the network falls back to the summed synapses (model/Vm_avg_eqs.py), recorded at the same rate.
+"""
+
+import numpy as np
+
+from brian2 import NetworkOperation, second
+
+
+def values(var):
+    """ Unitless values of a variable, or of a list of variables concatenated """
+    if isinstance(var, list):
+        return np.concatenate([v.get_value() for v in var])
+    return var.get_value()
+
+
+class PopulationReduction(NetworkOperation):
+    """ Records reductions (means, weighted sums) of a state variable over neuron sets at its own rate (see notes #1-#3) """
+
+    def __init__(self, name, dt, when='start'):
+        super().__init__(lambda t: self.record(), dt=dt*second, when=when, name=name)
+        self.channels = []
+        self.samples = []
+
+    def add(self, channel, group, variable='v', weights=None, indices=None):
+        """
+        Adds a channel: the mean of `variable` over `group` (or its `indices`), or the weighted sums `weights @ variable`.
+
+        weights can be a vector (N,) or a matrix (K, N), dense or scipy.sparse; a matrix gives K values per sample.
+        group can be a list of groups for weighted channels; N is then their total size, in the order of the list.
+        """
+        var = [G.variables[variable] for G in group] if isinstance(group, (list, tuple)) else group.variables[variable]
+        if weights is not None:
+            K = weights.shape[0] if weights.ndim == 2 else 1
+            reduce = lambda v: np.atleast_1d(weights @ v)
+        elif indices is not None:
+            indices = np.asarray(indices)
+            K, reduce = 1, lambda v: v[indices].mean(keepdims=True)
+        else:
+            K, reduce = 1, lambda v: v.mean(keepdims=True)
+        self.channels.append((channel, var, reduce, K))
+
+    def record(self):
+        self.samples.append(np.concatenate([reduce(values(var)) for _, var, reduce, _ in self.channels]))
+
+    def collect(self):
+        """ Recorded values per channel, unitless: (samples,) for means and weight vectors, (K, samples) for weight matrices """
+        width = sum(K for _, _, _, K in self.channels)
+        data = np.array(self.samples).reshape(-1, width).T
+        out, row = {}, 0
+        for channel, var, _, K in self.channels:
+            out[self.name+'.'+channel] = data[row] if K == 1 else data[row:row+K]
+            row += K
+        return out
+
+    def clear(self):
+        self.samples = []
+
+    def _full_state(self):
+        return {'samples':list(self.samples)}
+
+    def _restore_from_full_state(self, state):
+        self.samples = list(state['samples'])
@@ -30,10 +30,32 @@ p_intra_all = None
 # inter-area conn. probabilities per area
 p_inter_all = None
 
+# connectivity generators (see model/connectivity.py)
+conn_method_intra = 'kdtree' # [brian | kdtree]
+conn_method_inter = 'banded' # [brian | banded]
+conn_cutoff = 4. # kernel cutoff, in units of sigma
+
 # inter-area conn. probabilities
 p_mono = None # def: 0.2 # monosynaptic pathway connectivity
 p_tri = None # def: 0.45 # trisynaptic pathway connectivity
 
+# Recording plan (see model/recording.py)
+rec_dt = None # recording time step; None -> simulation dt
+rec_Vm_avg_dt = None # Vm averages recording time step; None -> simulation dt
+rec_dtype = 'float32' # output files only; the monitors record float64
+rec_monitors = [] # [{group, variables, subset}, ...]
+rec_spikes = True # spike rasters; False -> spike counts only
+rec_rate_bins = {} # {enabled, groups, dt, spatial_bins, axis} (see model/rate_bins.py)
+
+# Watchdog (early abort)
+watchdog = {} # {enabled, groups, min_rate, max_rate, period, window, start}
+
+# LFP electrodes
+lfp = {} # {enabled, groups, electrodes, line, cutoff, r_min, dt, variable}
+
+# Closed-loop stimulation
+closed_loop = {} # {enabled, signal, target, start, stop, refractory, max_trains, latency, dt}
+
 # Fixed input settings
 fixed_input_enabled = False
 fixed_input_low = 0.
@@ -65,6 +87,7 @@ pulse_freq = 100. # [Hz]
 stim_ipi = .1e-3 # [sec]
 
 # Reproducibility settings
+seed_val = None
 timestamp = None
 git_branch = None
 git_hash = None
@@ -136,11 +159,51 @@ def init(data):
         p_inter_all[2][3][0] = [p_tri for ii in range(2)] # CA3_E to CA1_E | CA1_I
         p_inter_all[3][0][0] = [p_tri for ii in range(2)] # CA1_E to EC_E | EC_I
 
+    # Connectivity generators
+    global conn_method_intra, conn_method_inter, conn_cutoff
+    conn_method_intra = 'kdtree'
+    conn_method_inter = 'banded'
+    conn_cutoff = 4.
+    if 'generator' in data['connectivity'].keys():
+        conn_method_intra = data['connectivity']['generator'].get('intra', conn_method_intra)
+        conn_method_inter = data['connectivity']['generator'].get('inter', conn_method_inter)
+        conn_cutoff = data['connectivity']['generator'].get('cutoff', conn_cutoff)
+
     global duration, dt, debugging
     duration = data['simulation']['duration']*second
     dt = data['simulation']['dt']*second
     debugging = data['simulation']['debugging']
 
+    # Recording plan
+    global rec_dt, rec_Vm_avg_dt, rec_dtype, rec_monitors, rec_spikes, rec_rate_bins
+    rec_dt = None
+    rec_Vm_avg_dt = None
+    rec_dtype = 'float32'
+    rec_monitors = []
+    rec_spikes = True
+    rec_rate_bins = {}
+    if 'recording' in data.keys():
+        if data['recording'].get('dt', None):
+            rec_dt = data['recording']['dt']*second
+        if data['recording'].get('Vm_avg_dt', None):
+            rec_Vm_avg_dt = data['recording']['Vm_avg_dt']*second
+        rec_dtype = data['recording'].get('dtype', rec_dtype)
+        rec_monitors = data['recording'].get('monitors', rec_monitors)
+        rec_spikes = bool(data['recording'].get('spikes', rec_spikes))
+        rec_rate_bins = data['recording'].get('rate_bins', rec_rate_bins)
+
+    # Watchdog
+    global watchdog
+    watchdog = data.get('watchdog', {})
+
+    # LFP electrodes
+    global lfp
+    lfp = data.get('lfp', {})
+
+    # Closed-loop stimulation
+    global closed_loop
+    closed_loop = data.get('closed_loop', {})
+
     # Inputs
     # Fixed input
     global fixed_input_enabled, fixed_input_low, fixed_input_high, fixed_input_frequency, fixed_input_delay
@@ -176,7 +239,8 @@ def init(data):
     nr_of_pulses = data['stimulation']['nr_of_pulses']
     stim_ipi = data['stimulation']['ipi']
 
-    global timestamp, git_branch, git_hash, git_short_hash
+    global seed_val, timestamp, git_branch, git_hash, git_short_hash
+    seed_val = data['seed_val']
     timestamp = data['timestamp']
     git_branch = data['git_branch']
     git_hash = data['git_hash']
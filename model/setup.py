@@ -2,6 +2,7 @@ import sys
 from brian2 import *
 from model.globals import *
 from model.HH_equations import *
+from model.connectivity import connect_gaussian
 
 def create_group(parameters, name):
     """ Universal function that creates a group of neurons according to input parameters
@@ -58,9 +59,11 @@ def create_group(parameters, name):
     return G
 
 
-def connect_intra(G_py, G_inh, p_conn, gains):
+def connect_intra(G_py, G_inh, p_conn, gains, seed=None, cache_dir=None, method='brian', cutoff=4.):
     """ Function that takes care of intra-connectivity between populations in an area
-        Added (Gaussian) distance-based connectivity on the synapses in the `connect()` statement, {p=... + <distance>} """
+        Added (Gaussian) distance-based connectivity on the synapses in the `connect()` statement, {p=... + <distance>}
+        If cache_dir is set, the generated connectivity is stored on / reloaded from disk (see model/connectivity.py)
+        method: 'brian' (string expression over all pairs) or 'kdtree' (candidates within cutoff*sigma only) """
 
     N_py = len(G_py)
     N_inh = len(G_inh)
@@ -70,7 +73,7 @@ def connect_intra(G_py, G_inh, p_conn, gains):
         # self connection | is there a connection probability? does the group exist?
         if p_conn[pypop][pypop]!=0. and G_py[pypop]:
             syn_EE = Synapses(G_py[pypop], G_py[pypop], on_pre="he_post+="+str(gains[pypop])+"*"+str(g_max_e/psiemens)+"*psiemens*glu_pre", name=G_py[pypop].name+"to"+G_py[pypop].name) # create synapse
-            syn_EE.connect(condition='i!=j', p=str(p_conn[pypop][pypop])+'*exp(-((x_soma_pre-x_soma_post)**2+(y_soma_pre-y_soma_post)**2+(z_soma_pre-z_soma_post)**2)/(2*(2500*umetre)**2))') # connect E2E
+            connect_gaussian(syn_EE, p_conn[pypop][pypop], 2500*umetre, autapses=False, gain=gains[pypop], seed=seed, cache_dir=cache_dir, method=method, cutoff=cutoff) # connect E2E
             syn_all[pypop][pypop] = syn_EE
 
             # print("From: ", G_py[pypop].name, " to:", G_py[pypop].name, " p:", p_conn[pypop][pypop])
@@ -82,7 +85,7 @@ def connect_intra(G_py, G_inh, p_conn, gains):
         for inhpop in range(N_inh):
             if p_conn[pypop][N_py+inhpop]!=0. and G_py[pypop] and G_inh[inhpop]: # connection is valid (p>0); exc pop exists; inh pop exists. # the addition at the start makes sure we go to the inhibitory section of the connections
                 syn_EI = Synapses(G_py[pypop], G_inh[inhpop], on_pre="he_post+="+str(gains[pypop])+"*"+str(g_max_e/psiemens)+"*psiemens*glu_pre", name=G_py[pypop].name+"to"+G_inh[inhpop].name) # create the excitatory synapse on the inhibitory population
-                syn_EI.connect(p=str(p_conn[pypop][N_py+inhpop])+'*exp(-((x_soma_pre-x_soma_post)**2+(y_soma_pre-y_soma_post)**2+(z_soma_pre-z_soma_post)**2)/(2*(2500*umetre)**2))') # connect E2I
+                connect_gaussian(syn_EI, p_conn[pypop][N_py+inhpop], 2500*umetre, gain=gains[pypop], seed=seed, cache_dir=cache_dir, method=method, cutoff=cutoff) # connect E2I
                 syn_all[pypop][N_py+inhpop] = syn_EI
 
                 # print("From: ", G_py[pypop].name, " to:", G_inh[inhpop].name, " p:", p_conn[pypop][N_py+inhpop])
@@ -92,7 +95,7 @@ def connect_intra(G_py, G_inh, p_conn, gains):
 
             if p_conn[N_py+inhpop][pypop]!=0 and G_inh[inhpop] and G_py[pypop]: # same as before, but the other way around, I2E connection
                 syn_IE = Synapses(G_inh[inhpop], G_py[pypop], on_pre="hi_post+="+str(gains[N_py+inhpop])+"*"+str(g_max_i/psiemens)+"*psiemens", name=G_inh[inhpop].name+"to"+G_py[pypop].name) # create the inhibitory synapse on the excitatory population
-                syn_IE.connect(p=str(p_conn[N_py+inhpop][pypop])+'*exp(-((x_soma_pre-x_soma_post)**2+(y_soma_pre-y_soma_post)**2+(z_soma_pre-z_soma_post)**2)/(2*(350*umetre)**2))') # connect I2E
+                connect_gaussian(syn_IE, p_conn[N_py+inhpop][pypop], 350*umetre, gain=gains[N_py+inhpop], seed=seed, cache_dir=cache_dir, method=method, cutoff=cutoff) # connect I2E
                 syn_all[N_py+inhpop][pypop] = syn_IE
 
                 # print("From: ", G_inh[inhpop].name, " to:", G_py[pypop].name, " p:", p_conn[N_py+inhpop][pypop])
@@ -103,7 +106,7 @@ def connect_intra(G_py, G_inh, p_conn, gains):
     for inhpop in range(N_inh): # iterate over the inhibitory populations in the current area; handles I2I self connections
         if p_conn[N_py+inhpop][N_py+inhpop]!=0 and G_inh[inhpop]:
             syn_II = Synapses(G_inh[inhpop], G_inh[inhpop], on_pre="hi_post+="+str(gains[N_py+inhpop])+"*"+str(g_max_i/psiemens)+"*psiemens", name=G_inh[inhpop].name+"to"+G_inh[inhpop].name)
-            syn_II.connect(condition='i!=j', p=str(p_conn[N_py+inhpop][N_py+inhpop])+'*exp(-((x_soma_pre-x_soma_post)**2+(y_soma_pre-y_soma_post)**2+(z_soma_pre-z_soma_post)**2)/(2*(350*umetre)**2))') # connect I2I
+            connect_gaussian(syn_II, p_conn[N_py+inhpop][N_py+inhpop], 350*umetre, autapses=False, gain=gains[N_py+inhpop], seed=seed, cache_dir=cache_dir, method=method, cutoff=cutoff) # connect I2I
             syn_all[N_py+inhpop][N_py+inhpop] = syn_II
 
             # print("From: ", G_inh[inhpop].name, " to:", G_inh[inhpop].name, " p:", p_conn[N_py+inhpop][N_py+inhpop])
@@ -115,9 +118,11 @@ def connect_intra(G_py, G_inh, p_conn, gains):
     return syn_all
 
 
-def connect_inter(all_G_py_from, all_G_py_to, all_G_inh_to, all_p, gains):
+def connect_inter(all_G_py_from, all_G_py_to, all_G_inh_to, all_p, gains, seed=None, cache_dir=None, method='brian', cutoff=4.):
     """ Function that takes care of inter-connectivity between areas.
-        Added (Gaussian) distance-based connectivity between the areas """
+        Added (Gaussian) distance-based connectivity between the areas
+        If cache_dir is set, the generated connectivity is stored on / reloaded from disk (see model/connectivity.py)
+        method: 'brian' (string expression over all pairs) or 'banded' (z-sorted windows of cutoff*sigma) """
     N_py_from = len(all_G_py_from)
     N_py_to = len(all_G_py_to)
     N_inh_to = len(all_G_inh_to)
@@ -130,7 +135,7 @@ def connect_inter(all_G_py_from, all_G_py_to, all_G_inh_to, all_p, gains):
                 G_py_to = all_G_py_to[destination]
                 if G_py_to:
                     syn_E = Synapses(G_py_from, G_py_to, on_pre="he_ext_post+="+str(gains[origin])+"*"+str(g_max_e/psiemens)+"*psiemens*glu_pre", name=G_py_from.name+"to"+G_py_to.name)
-                    syn_E.connect(p=str(all_p[origin][destination])+'*exp(-((z_soma_pre-z_soma_post)**2)/(2*(1000*umetre)**2))')
+                    connect_gaussian(syn_E, all_p[origin][destination], 1000*umetre, kernel='z', gain=gains[origin], seed=seed, cache_dir=cache_dir, method=method, cutoff=cutoff)
                     syn_all[origin][destination] = syn_E
 
                     # print("From: ", G_py_from.name, " to:", G_py_to.name, " p:", all_p[origin][destination])
@@ -142,7 +147,7 @@ def connect_inter(all_G_py_from, all_G_py_to, all_G_inh_to, all_p, gains):
                 G_inh_to = all_G_inh_to[destination]
                 if G_inh_to:
                     syn_I = Synapses(G_py_from, G_inh_to, on_pre="he_ext_post+="+str(gains[origin])+"*"+str(g_max_e/psiemens)+"*psiemens*glu_pre", name=G_py_from.name+"to"+G_inh_to.name)
-                    syn_I.connect(p=str(all_p[origin][N_py_to+destination])+'*exp(-((z_soma_pre-z_soma_post)**2)/(2*(1000*umetre)**2))')
+                    connect_gaussian(syn_I, all_p[origin][N_py_to+destination], 1000*umetre, kernel='z', gain=gains[origin], seed=seed, cache_dir=cache_dir, method=method, cutoff=cutoff)
                     syn_all[origin][N_py_to+destination] = syn_I
 
                     # print("From: ", G_py_from.name, " to:", G_inh_to.name, " p:", all_p[origin][N_py_to+destination])
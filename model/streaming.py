@@ -0,0 +1,114 @@
+"""
+Implementation Notes
+--------------------------------------------------------------------------------
+    | 1: Long runs are split into segments. After every segment the data of all monitors is copied out (collect), the monitors are emptied (clear) and the copy is handed to a StreamWriter, so the memory used by the monitors is bounded by the segment length instead of the total duration.
+    | 2: The StreamWriter saves the segments on a background thread; the simulation only waits when more than `maxsize` segments are queued. Every segment goes to its own file (segment_XXXXX.npz), written to a temporary file and atomically renamed, so an interrupted run leaves every completed segment readable.
+    | 3: Arrays are stored unitless, in base units (seconds, volts, amperes, Hz), under the key '<monitor name>.<variable>'. StateMonitor variables are stored as (neurons, time). read_stream() concatenates the segments along time.
+    | 4: Emptying monitors resizes their dynamic arrays and resets their sample counter N; this is only possible in runtime mode (not with the C++ standalone device). SpikeMonitors without rasters (record=False) only hold their spike counts and are left as they are.
+"""
+
+import os
+import glob
+import queue
+import tempfile
+import threading
+import numpy as np
+
+from brian2 import SpikeMonitor, StateMonitor, PopulationRateMonitor
+
+
+def collect(monitors):
+    """ Copies the data of a list of monitors into a dictionary of unitless arrays (see note #3) """
+    data = {}
+    for mon in monitors:
+        if isinstance(mon, SpikeMonitor):
+            if not mon.record:
+                continue # spike counts only
+            data[mon.name+'.i'] = np.array(mon.i[:])
+            data[mon.name+'.t'] = np.array(mon.t_[:])
+        elif isinstance(mon, StateMonitor):
+            data[mon.name+'.t'] = np.array(mon.t_[:])
+            for varname in mon.record_variables:
+                data[mon.name+'.'+varname] = np.array(getattr(mon, varname+'_'))
+        elif isinstance(mon, PopulationRateMonitor):
+            data[mon.name+'.t'] = np.array(mon.t_[:])
+            data[mon.name+'.rate'] = np.array(mon.rate_[:])
+    return data
+
+
+def clear(monitors):
+    """ Empties a list of monitors (see note #4) """
+    for mon in monitors:
+        if isinstance(mon, SpikeMonitor) and not mon.record:
+            continue
+        mon.resize(0)
+        mon.variables['N'].set_value(0)
+
+
+def save_atomic(fname, data):
+    """ Saves a dictionary of arrays in an npz file through a temporary file in the same directory """
+    fd, tmpname = tempfile.mkstemp(dir=os.path.dirname(fname), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fout:
+            np.savez(fout, **data)
+        os.replace(tmpname, fname)
+    except Exception:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+        raise
+
+
+class StreamWriter:
+    """ Writes dictionaries of arrays to a directory on a background thread (see note #2) """
+
+    def __init__(self, dirname, maxsize=2):
+        os.makedirs(dirname, exist_ok=True)
+        self.dirname = dirname
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.error = None
+        self.thread = threading.Thread(target=self._work, name='StreamWriter', daemon=True)
+        self.thread.start()
+
+    def _work(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            if self.error is not None:
+                continue
+            fname, data = item
+            try:
+                save_atomic(os.path.join(self.dirname, fname), data)
+            except Exception as e:
+                self.error = e
+
+    def write(self, fname, data):
+        """ Queues `data` to be saved as dirname/fname; blocks if the queue is full """
+        if self.error is not None:
+            raise self.error
+        self.queue.put((fname, data))
+
+    def close(self):
+        """ Waits for all queued data to be written """
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+
+def read_stream(dirname):
+    """ Reads the segments of a streamed run and concatenates them along time (see note #3) """
+    data = {}
+    for fname in sorted(glob.glob(os.path.join(dirname, 'segment_*.npz'))):
+        with np.load(fname) as seg:
+            for key in seg.files:
+                data.setdefault(key, []).append(seg[key])
+
+    return {key:np.concatenate(vals, axis=-1) for key, vals in data.items()}
+
+
+def smooth_rate(rate, dt, width):
+    """ Gaussian smoothing of a population rate, same window as PopulationRateMonitor.smooth_rate() (dt, width in seconds) """
+    width_dt = int(np.round(2*width/dt))
+    window = np.exp(-np.arange(-width_dt, width_dt+1)**2 * 1./(2*(width/dt)**2))
+    return np.convolve(rate, window/window.sum(), mode='same')
@@ -0,0 +1,76 @@
+"""
+Implementation Notes
+--------------------------------------------------------------------------------
+    | 1: The watchdog is a network_operation that runs every `period`. It reads the mean rate of the watched populations over the last period from their PopulationRateMonitors, or the filtered CA1 E rate (drive) of the S2R filter. A population is in violation when its rate is above max_rate or below min_rate.
+    | 2: The run is stopped (brian2 stop()) once a population has been in violation for `window` in a row, i.e. the network saturated or went silent for a sustained time. The checks start after `start` so the initial transient is ignored. The reason and the time of the abort are kept on the watchdog and end up in the results.
+    | 3: The rates are read from the end of the monitors' dynamic arrays, so the checks cost O(period/dt) per call and work with streamed runs (emptied monitors). network_operations only run in runtime mode; the watchdog is not available with the C++ standalone device.
+"""
+
+import numpy as np
+
+from brian2 import NetworkOperation, stop, second
+
+defaults = {'enabled':False, 'groups':['CA1_pyCAN', 'CA1_inh'], 'min_rate':0.1, 'max_rate':100., 'period':50e-3, 'window':200e-3, 'start':200e-3}
+
+
+def monitor_rate(mon, n):
+    """ Mean rate [Hz] of a PopulationRateMonitor over its last n samples (note #3); None if empty """
+    rate = mon.variables['rate'].get_value()
+    if not len(rate):
+        return None
+    return float(np.mean(rate[-n:]))
+
+
+class Watchdog:
+    """ Stops a run when the population rates leave the configured bounds for a sustained time (see notes #1, #2) """
+
+    def __init__(self, config, rate_monitors, G_S2R=None, dt=0.1e-3):
+        config = dict(defaults, **config)
+        self.period = config['period']
+        self.window = config['window']
+        self.start = config['start']
+        self.min_rate = config['min_rate']
+        self.max_rate = config['max_rate']
+
+        n = max(int(round(self.period/dt)), 1)
+        self.sources = {}
+        for name in config['groups']:
+            if name == 'S2R_filter':
+                self.sources[name] = lambda: float(G_S2R.drive[0])
+            else:
+                self.sources[name] = lambda mon=rate_monitors[name+'_ratemon']: monitor_rate(mon, n)
+
+        self.operation = NetworkOperation(lambda t: self.check(t), dt=self.period*second, when='end', name='watchdog')
+        self.reset()
+
+    def reset(self):
+        """ Clears the violation counters and the abort reason (e.g. after restoring a snapshot) """
+        self.counts = {name:0 for name in self.sources}
+        self.reason = None
+        self.t_abort = None
+
+    def check(self, t):
+        t = float(t/second)
+        if t < self.start or self.reason is not None:
+            return
+
+        for name, source in self.sources.items():
+            rate = source()
+            if rate is None:
+                continue
+            if self.min_rate <= rate <= self.max_rate:
+                self.counts[name] = 0
+                continue
+
+            self.counts[name] += 1
+            if self.counts[name]*self.period >= self.window - 1e-9:
+                bound = 'above max_rate={0:.2f} Hz'.format(self.max_rate) if rate > self.max_rate else 'below min_rate={0:.2f} Hz'.format(self.min_rate)
+                self.reason = '{0}: rate {1:.2f} Hz {2} for {3:.3f} s'.format(name, rate, bound, self.window)
+                self.t_abort = t
+                print('\n[!] Watchdog: aborting at t={0:.3f} s | {1}'.format(t, self.reason))
+                stop()
+                return
+
+    def status(self):
+        """ Abort information for the results """
+        return {'aborted':self.reason is not None, 'reason':self.reason, 't_abort':self.t_abort}
@@ -1,5 +1,4 @@
 import os
-import warnings
 import csv
 
 import argparse
@@ -10,6 +9,71 @@ import scipy.spatial.distance as dst
 
 import parameters
 from optlib import cost_func
+from src.runmap import map_runs_csv
+from src.runfile import open_run, binned_counts
+
+
+def evaluate_run(currdir, target_vals, fnames, fs, winsize_FR, overlap_FR, settling_time, ending_time):
+    """ Cost function of a single run directory; returns its CSV row """
+    run = open_run(currdir)
+
+    # Load parameters file for later
+    params = parameters.load(os.path.join(currdir, 'parameters_bak.json'))
+
+    data = {}
+    for f in fnames:
+        tokens = f.split('_')
+        area = tokens[0]
+        pop = "I" if tokens[1] == "inh" else "E"
+
+        if area not in data:
+            data[area] = {}
+            data[area]["E"] = {}
+            data[area]["I"] = {}
+
+        # Crop the spikes to (settling_time, ending_time)
+        if 'spikes/'+f+'/t' in run:
+            i, t = run.spikes(f)
+            t = t/1000
+            mask = (t > settling_time) & (t < ending_time)
+            data[area][pop]["t"] = t[mask]
+            data[area][pop]["i"] = i[mask]
+        else:
+            # no spike rasters: binned spike counts (optlib.pop_FR)
+            counts, dt = binned_counts(run, f)
+            t_bins = np.arange(len(counts))*dt
+            data[area][pop]["counts"] = counts[(t_bins > settling_time) & (t_bins < ending_time)]
+            data[area][pop]["dt"] = dt
+
+    # Output rhythm
+    r = run['order_param/rhythm']
+    data["rhythm"] = r[int(settling_time*fs):int(ending_time*fs)]
+    duration = len(data["rhythm"])/fs
+    duration0 = (ending_time-settling_time)
+
+    # Run the cost function
+    params_FR = {"winsize":winsize_FR, "overlap":overlap_FR}
+    J, vec = cost_func(data, target_vals, duration, fs, params_FR=params_FR)
+
+    # Write to a CSV file
+    # csv_data = [os.path.join(currdir, 'parameters_bak.json'), params['areas'][args.area]["E"]["noise"], params['areas'][args.area]["I"]["noise"], J] + vec
+    inp_val =  params["Kuramoto"]["gain_rhythm"]
+    a = params["connectivity"]["inter_custom"]["EC"]["E"][1][0]
+    b = params["connectivity"]["inter_custom"]["EC"]["E"][2][0]
+    c = params["connectivity"]["inter_custom"]["EC"]["E"][3][0]
+    d = params["connectivity"]["inter_custom"]["CA1"]["E"][0][0]
+    noise_EC_exc = params["areas"]["EC"]["E"]["noise"]
+    noise_EC_inh = params["areas"]["EC"]["I"]["noise"]
+    noise_DG_exc = params["areas"]["DG"]["E"]["noise"]
+    noise_DG_inh = params["areas"]["DG"]["I"]["noise"]
+    noise_CA3_exc = params["areas"]["CA3"]["E"]["noise"]
+    noise_CA3_inh = params["areas"]["CA3"]["I"]["noise"]
+    noise_CA1_exc = params["areas"]["CA1"]["E"]["noise"]
+    noise_CA1_inh = params["areas"]["CA1"]["I"]["noise"]
+    csv_data = [os.path.join(currdir, 'parameters_bak.json'), J, inp_val, a, b, c, d, noise_EC_exc, noise_EC_inh, noise_DG_exc, noise_DG_inh, noise_CA3_exc, noise_CA3_inh, noise_CA1_exc, noise_CA1_inh] + vec
+
+    return csv_data
+
 
 # Main code
 if __name__ == "__main__":
@@ -37,6 +101,13 @@ if __name__ == "__main__":
                         type=str,
                         default='optimization_test.csv',
                         help='Output file name')
+
+    parser.add_argument('-w', '--workers',
+                        nargs='?',
+                        metavar='-w',
+                        type=int,
+                        default=None,
+                        help='Number of worker processes (default: all cores)')
     args = parser.parse_args()
 
     if len(args.target) != 5:
@@ -64,110 +135,13 @@ if __name__ == "__main__":
     # target_vals = [int(args.area == "EC")]*2 + [int(args.area == "DG")]*2 + [int(args.area == "CA3")]*2 + [int(args.area == "CA1")]*2 + [int(args.area == "CA1")] + [6.]
     target_vals = args.target
 
-    with open(args.output, 'w', encoding='UTF8', newline='') as fout:
-        writer = csv.writer(fout)
-
-        # Write the header to the CSV file
-        csv_header = ['fname', 'J', 'input' ,'a', 'b', 'c', 'd', 'vector']
-        writer.writerow(csv_header)
-
-        for item in os.listdir(basedir):
-            if os.path.isdir(os.path.join(basedir, item)):
-                currdir = os.path.join(basedir, item)
-                print()
-                print('Current directory:', currdir)
-
-                datadir = os.path.join(currdir, 'data')
-                spikesdir = os.path.join(datadir, 'spikes')
-                # print('Data/Spikes directory:', datadir)
-
-                # Load parameters file for later
-                params = parameters.load(os.path.join(currdir, 'parameters_bak.json'))
-
-                data = {}
-                for f in fnames:
-                    tokens = f.split('_')
-                    area = tokens[0]
-                    pop = tokens[1]
-
-                    if area not in data:
-                        data[area] = {}
-                        data[area]["E"] = {}
-                        data[area]["I"] = {}
-
-                    # Ignore empty txt file warnings
-                    with warnings.catch_warnings():
-                        warnings.simplefilter("ignore")
-
-                        if tokens[1] == "inh":
-                            t = np.loadtxt(spikesdir + '/' + f + '_spikemon_t.txt', ndmin=1)/1000
-                            i = np.loadtxt(spikesdir + '/' + f + '_spikemon_i.txt', ndmin=1)
-
-                            idx_crop = np.where(t <= settling_time)
-                            t_tmp = np.delete(t, idx_crop)
-                            i_tmp = np.delete(i, idx_crop)
-                            data[area]["I"]["t"] = t_tmp
-                            data[area]["I"]["i"] = i_tmp
-
-                            idx_crop = np.where(t_tmp >= ending_time)
-                            t_tmp = np.delete(t_tmp, idx_crop)
-                            i_tmp = np.delete(i_tmp, idx_crop)
-                            data[area]["I"]["t"] = t_tmp
-                            data[area]["I"]["i"] = i_tmp
-
-                        else:
-                            t = np.loadtxt(spikesdir + '/' + f + '_spikemon_t.txt', ndmin=1)/1000
-                            i = np.loadtxt(spikesdir + '/' + f + '_spikemon_i.txt', ndmin=1)
-
-                            idx_crop = np.where(t <= settling_time)
-                            t_tmp = np.delete(t, idx_crop)
-                            i_tmp = np.delete(i, idx_crop)
-                            data[area]["E"]["t"] = t_tmp
-                            data[area]["E"]["i"] = i_tmp
-
-                            idx_crop = np.where(t_tmp >= ending_time)
-                            t_tmp = np.delete(t_tmp, idx_crop)
-                            i_tmp = np.delete(i_tmp, idx_crop)
-                            data[area]["E"]["t"] = t_tmp
-                            data[area]["E"]["i"] = i_tmp
-
-                # Output rhythm
-                r = np.loadtxt(datadir + '/' + 'order_param_mon_rhythm.txt')
-                data["rhythm"] = r[int(settling_time*fs):int(ending_time*fs)]
-                duration = len(data["rhythm"])/fs
-                duration0 = (ending_time-settling_time)
-
-                # Run the cost function
-                params_FR = {"winsize":winsize_FR, "overlap":overlap_FR}
-                J, vec = cost_func(data, target_vals, duration, fs, params_FR=params_FR)
-
-                print("Euclidean distance:", J)
-                print(target_vals)
-                print(vec)
-
-                # Write to a CSV file
-                # csv_data = [os.path.join(currdir, 'parameters_bak.json'), params['areas'][args.area]["E"]["noise"], params['areas'][args.area]["I"]["noise"], J] + vec
-                inp_val =  params["Kuramoto"]["gain_rhythm"]
-                a = params["connectivity"]["inter_custom"]["EC"]["E"][1][0]
-                b = params["connectivity"]["inter_custom"]["EC"]["E"][2][0]
-                c = params["connectivity"]["inter_custom"]["EC"]["E"][3][0]
-                d = params["connectivity"]["inter_custom"]["CA1"]["E"][0][0]
-                noise_EC_exc = params["areas"]["EC"]["E"]["noise"]
-                noise_EC_inh = params["areas"]["EC"]["I"]["noise"]
-                noise_DG_exc = params["areas"]["DG"]["E"]["noise"]
-                noise_DG_inh = params["areas"]["DG"]["I"]["noise"]
-                noise_CA3_exc = params["areas"]["CA3"]["E"]["noise"]
-                noise_CA3_inh = params["areas"]["CA3"]["I"]["noise"]
-                noise_CA1_exc = params["areas"]["CA1"]["E"]["noise"]
-                noise_CA1_inh = params["areas"]["CA1"]["I"]["noise"]
-                csv_data = [os.path.join(currdir, 'parameters_bak.json'), J, inp_val, a, b, c, d, noise_EC_exc, noise_EC_inh, noise_DG_exc, noise_DG_inh, noise_CA3_exc, noise_CA3_inh, noise_CA1_exc, noise_CA1_inh] + vec
-
-                print(csv_data)
-
-                # write the data
-                writer.writerow(csv_data)
-
-                # continue
-                # print("Not reached!")
+    # Evaluate the runs in parallel; rows are written in directory order as they complete
+    run_dirs = [os.path.join(basedir, item) for item in sorted(os.listdir(basedir)) if os.path.isdir(os.path.join(basedir, item))]
+    csv_header = ['fname', 'J', 'input' ,'a', 'b', 'c', 'd', 'vector']
+    failed = map_runs_csv(evaluate_run, run_dirs, args.output, csv_header,
+                          workers=args.workers, desc='Cost function',
+                          target_vals=target_vals, fnames=fnames, fs=fs, winsize_FR=winsize_FR, overlap_FR=overlap_FR,
+                          settling_time=settling_time, ending_time=ending_time)
+    print('[+] {0} runs evaluated ({1} failed) | {2}'.format(len(run_dirs), failed, args.output))
 
     exit(0)
@@ -1,9 +1,13 @@
+import os
 import numpy as np
 import matplotlib.pyplot as plt
 from scipy import signal as sig
 import scipy.spatial.distance as dst
 import csv
 
+from src.freq_analysis import sliding_spike_counts, binned_spike_counts
+from src.runfile import open_run
+
 # Data processing functions
 def my_FR(spikes: np.ndarray,
             duration: float,
@@ -35,27 +39,28 @@ def my_FR(spikes: np.ndarray,
     win_step = window_size * round(1. - overlap, 4)
     fs_n = int(1/win_step)
 
-    # First center is at the middle of the first window
-    c0 = window_size/2
-    cN = duration-c0
-
-    # centers
-    centers = np.arange(c0, cN+win_step, win_step)
-
     # Calculate windowed FR
-    counts = []
-    for center in centers:
-        cl = center - c0
-        ch = center + c0
-        spike_cnt = np.count_nonzero(np.where((spikes >= cl) & (spikes < ch)))
-        counts.append(spike_cnt)
-
-    FR = (np.array(counts)/window_size)
+    centers, counts = sliding_spike_counts(spikes, duration, window_size, overlap)
+    FR = (counts/window_size)
 
     # return centers, spike counts, and adjusted sampling rates per window
     return centers, FR, fs_n
 
 
+def pop_FR(pop, duration, window_size, overlap):
+    """ my_FR() of a population of the cost function data: spike times ("t") or, for runs without the spike rasters, spike counts in fixed time bins ("counts", bin width "dt") """
+    if "t" in pop:
+        return my_FR(spikes=pop["t"], duration=duration, window_size=window_size, overlap=overlap)
+
+    centers, counts = binned_spike_counts(pop["counts"], pop["dt"], window_size, overlap)
+    return centers, counts/window_size, int(1/(window_size*round(1. - overlap, 4)))
+
+
+def n_spikes(pop):
+    """ Number of spikes of a population of the cost function data """
+    return len(pop["t"]) if "t" in pop else int(np.sum(pop["counts"]))
+
+
 def my_PSD(data, fs, N):
 
     # Welch estimate parameters
@@ -221,17 +226,17 @@ def cost_func(data, target=None, duration=1, fs=10000, areasizes={"EC":[10000, 1
     # Firing rates
     # ------------
     # Calcualte FRs per area
-    tv_FR, FR_EC_exc, fs_FR = my_FR(spikes=data["EC"]["E"]["t"], duration=duration, window_size=winsize_FR, overlap=overlap_FR)
-    _, FR_EC_inh, _ = my_FR(spikes=data["EC"]["I"]["t"], duration=duration, window_size=winsize_FR, overlap=overlap_FR)
+    tv_FR, FR_EC_exc, fs_FR = pop_FR(data["EC"]["E"], duration, winsize_FR, overlap_FR)
+    _, FR_EC_inh, _ = pop_FR(data["EC"]["I"], duration, winsize_FR, overlap_FR)
 
-    _, FR_DG_exc, _ = my_FR(spikes=data["DG"]["E"]["t"], duration=duration, window_size=winsize_FR, overlap=overlap_FR)
-    _, FR_DG_inh, _ = my_FR(spikes=data["DG"]["I"]["t"], duration=duration, window_size=winsize_FR, overlap=overlap_FR)
+    _, FR_DG_exc, _ = pop_FR(data["DG"]["E"], duration, winsize_FR, overlap_FR)
+    _, FR_DG_inh, _ = pop_FR(data["DG"]["I"], duration, winsize_FR, overlap_FR)
 
-    _, FR_CA3_exc, _ = my_FR(spikes=data["CA3"]["E"]["t"], duration=duration, window_size=winsize_FR, overlap=overlap_FR)
-    _, FR_CA3_inh, _ = my_FR(spikes=data["CA3"]["I"]["t"], duration=duration, window_size=winsize_FR, overlap=overlap_FR)
+    _, FR_CA3_exc, _ = pop_FR(data["CA3"]["E"], duration, winsize_FR, overlap_FR)
+    _, FR_CA3_inh, _ = pop_FR(data["CA3"]["I"], duration, winsize_FR, overlap_FR)
 
-    _, FR_CA1_exc, _ = my_FR(spikes=data["CA1"]["E"]["t"], duration=duration, window_size=winsize_FR, overlap=overlap_FR)
-    _, FR_CA1_inh, _ = my_FR(spikes=data["CA1"]["I"]["t"], duration=duration, window_size=winsize_FR, overlap=overlap_FR)
+    _, FR_CA1_exc, _ = pop_FR(data["CA1"]["E"], duration, winsize_FR, overlap_FR)
+    _, FR_CA1_inh, _ = pop_FR(data["CA1"]["I"], duration, winsize_FR, overlap_FR)
 
     # Normalize w.r.t. area size
     FR_EC_exc /= N_EC_exc
@@ -244,26 +249,26 @@ def cost_func(data, target=None, duration=1, fs=10000, areasizes={"EC":[10000, 1
     FR_CA1_inh /= N_CA1_inh
 
     # Mean FR per area
-    FR_EC_exc_mean = (len(data["EC"]["E"]["t"])/duration)/N_EC_exc
-    FR_EC_inh_mean = (len(data["EC"]["I"]["t"])/duration)/N_EC_inh
+    FR_EC_exc_mean = (n_spikes(data["EC"]["E"])/duration)/N_EC_exc
+    FR_EC_inh_mean = (n_spikes(data["EC"]["I"])/duration)/N_EC_inh
     vals0.append(FR_EC_exc_mean)
     vals.append(FR_EC_exc_mean)
     vals.append(FR_EC_inh_mean)
 
-    FR_DG_exc_mean = (len(data["DG"]["E"]["t"])/duration)/N_DG_exc
-    FR_DG_inh_mean = (len(data["DG"]["I"]["t"])/duration)/N_DG_inh
+    FR_DG_exc_mean = (n_spikes(data["DG"]["E"])/duration)/N_DG_exc
+    FR_DG_inh_mean = (n_spikes(data["DG"]["I"])/duration)/N_DG_inh
     vals0.append(FR_DG_exc_mean)
     vals.append(FR_DG_exc_mean)
     vals.append(FR_DG_inh_mean)
 
-    FR_CA3_exc_mean = (len(data["CA3"]["E"]["t"])/duration)/N_CA3_exc
-    FR_CA3_inh_mean = (len(data["CA3"]["I"]["t"])/duration)/N_CA3_inh
+    FR_CA3_exc_mean = (n_spikes(data["CA3"]["E"])/duration)/N_CA3_exc
+    FR_CA3_inh_mean = (n_spikes(data["CA3"]["I"])/duration)/N_CA3_inh
     vals0.append(FR_CA3_exc_mean)
     vals.append(FR_CA3_exc_mean)
     vals.append(FR_CA3_inh_mean)
 
-    FR_CA1_exc_mean = (len(data["CA1"]["E"]["t"])/duration)/N_CA1_exc
-    FR_CA1_inh_mean = (len(data["CA1"]["I"]["t"])/duration)/N_CA1_inh
+    FR_CA1_exc_mean = (n_spikes(data["CA1"]["E"])/duration)/N_CA1_exc
+    FR_CA1_inh_mean = (n_spikes(data["CA1"]["I"])/duration)/N_CA1_inh
     vals0.append(FR_CA1_exc_mean)
     vals.append(FR_CA1_exc_mean)
     vals.append(FR_CA1_inh_mean)
@@ -347,6 +352,7 @@ if __name__ == "__main__":
     tdir = 'results/analysis/optimization_test/good_noise/data'
     fnames = ["EC_pyCAN", "EC_inh", "DG_py", "DG_inh", "CA3_pyCAN", "CA3_inh", "CA1_pyCAN", "CA1_inh"]
 
+    run = open_run(os.path.dirname(tdir))
     data = {}
     for f in fnames:
         tokens = f.split('_')
@@ -358,15 +364,16 @@ if __name__ == "__main__":
             data[area]["E"] = {}
             data[area]["I"] = {}
 
+        i, t = run.spikes(f)
         if tokens[1] == "inh":
-            data[area]["I"]["t"] = np.loadtxt(tdir + '/spikes/' + f + '_spikemon_t.txt')/1000
-            data[area]["I"]["i"] = np.loadtxt(tdir + '/spikes/' + f + '_spikemon_i.txt')/1000
+            data[area]["I"]["t"] = t/1000
+            data[area]["I"]["i"] = i/1000
         else:
-            data[area]["E"]["t"] = np.loadtxt(tdir + '/spikes/' + f + '_spikemon_t.txt')/1000
-            data[area]["E"]["i"] = np.loadtxt(tdir + '/spikes/' + f + '_spikemon_i.txt')/1000
+            data[area]["E"]["t"] = t/1000
+            data[area]["E"]["i"] = i/1000
 
     # Output rhythm
-    data["rhythm"] = np.loadtxt(tdir + '/' + 'order_param_mon_rhythm.txt')
+    data["rhythm"] = run['order_param/rhythm']
     duration = len(data["rhythm"])/fs
 
     # Run the cost function
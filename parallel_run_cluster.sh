@@ -23,6 +23,12 @@ fi
 # CONF_DIRS="configs/${ISTIM}_nA"
 CONF_DIRS="configs/fig4_ext_K_0.19"
 
+### Compile everything once into the shared caches; the jobs then start without compiling
+### Brian2 compiles with -march=native: warm on a compute node (blocks until the job is done), not on this node
+echo "Warming caches..."
+python3 warm_cache.py --slurm --mem_per_cpu=24G --time=120 $CONF_DIRS || exit 1
+
+
 ### Go through the config directories and do the following:
 for DIR in $CONF_DIRS;
     do
@@ -53,21 +59,16 @@ for DIR in $CONF_DIRS;
         ### Set the variables used as arguments
         CNT=0
         RESDIR=$CURRRES
-        for FN_CONF in $DIR/*.json
+        ### Only the configurations without a complete result (see src/runcache.py)
+        for FN_CONF in $(python3 -m src.runcache -sd $RESBASE $DIR)
             do
                 echo $FN_CONF
 
                 ### Queue the simulation
-                let DELAY="CNT*60"
-        		echo "Delayed: $DELAY seconds"
-			DELAY_TOT=$(($DELAY+$1))
-			echo "Delay TOTAL: $DELAY_TOT seconds"
-                sbatch --job-name="SIM_${FN_CONF}" --begin=now+$DELAY_TOT --time=120 --cpus-per-task=1 --mem-per-cpu=24G --ntasks=1 --export=FCONF=$FN_CONF,RESDIR=$RESDIR,CNT=$CNT,OUTDIR=$RESBASE run_sim.sh
+                sbatch --job-name="SIM_${FN_CONF}" --time=120 --cpus-per-task=1 --mem-per-cpu=24G --ntasks=1 --export=FCONF=$FN_CONF,RESDIR=$RESDIR,CNT=$CNT,OUTDIR=$RESBASE run_sim.sh
 
                 let "CNT+=1"
 
-                sleep 1
-
                 ### Copy the config file used to results dir
                 cp $FN_CONF $BACKCONF
             done
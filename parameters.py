@@ -109,6 +109,11 @@ _data = {
             "p_tri"     : 0.45,     # tri: [DG->CA3, CA3->CA1, CA1->EC] Aussel, pages 49,59
             "p_mono"    : 0.2       # mono: [EC->CA3, EC->CA1]
         },
+        "generator" : { # connectivity generators, see model/connectivity.py
+            "intra"     : "kdtree", # [brian | kdtree]; "brian" is the original generator (not cached)
+            "inter"     : "banded", # [brian | banded]
+            "cutoff"    : 4.        # kernel cutoff, in units of sigma
+        },
         "inter_custom" : {
             "EC" : {
                 "E" : [[0., 0.], [a, a], [b, b], [c, c]],
@@ -179,6 +184,62 @@ _data = {
         "debugging"     : False
     },
 
+    # recording plan; order parameter and Vm averages are always recorded
+    "recording" : {
+        "dt"            : 1.e-3,            # second
+        "dtype"         : "float32",        # storage type of the output files (monitors record float64 during the run)
+        "Vm_avg_dt"     : None,             # second; Vm averages (None -> simulation dt)
+        "spikes"        : True,             # spike rasters (False: spike counts only)
+        "rate_bins"     : {                 # binned population spike counts, recorded during the run
+            "enabled"       : False,
+            "groups"        : ["EC_pyCAN", "EC_inh", "DG_py", "DG_inh", "CA3_pyCAN", "CA3_inh", "CA1_pyCAN", "CA1_inh"],
+            "dt"            : .5e-3,        # second; time bin
+            "spatial_bins"  : 1,            # equal-width bins of the soma positions along `axis`
+            "axis"          : "z"
+        },
+        "monitors"      : [                 # per-variable opt-in, e.g.
+            # {"group": "CA1_pyCAN", "variables": ["v"], "subset": {"range": [[0, 100]]}},
+            # {"group": "EC_inh", "variables": ["v", "I_exc"], "subset": {"fraction": 0.05}},
+            # {"group": "CA1_pyCAN", "variables": ["v"], "subset": {"center": [5.0, -8., 7.5], "radius": 0.5}}   # [mm]
+        ]
+    },
+
+    # early abort of runaway/silent networks; rates are averaged over `period` and must be out of bounds for `window` in a row
+    "watchdog" : {
+        "enabled"       : False,
+        "groups"        : ["CA1_pyCAN", "CA1_inh"],    # rate monitor groups; "S2R_filter" for the filtered CA1 E rate
+        "min_rate"      : 0.1,              # Hz
+        "max_rate"      : 100.,             # Hz
+        "period"        : 50.e-3,           # second
+        "window"        : 200.e-3,          # second
+        "start"         : 200.e-3           # second; initial transient ignored
+    },
+
+    # LFP proxy at virtual electrodes: sum of v/r over the neurons within `cutoff` of each contact
+    "lfp" : {
+        "enabled"       : False,
+        "groups"        : ["EC_pyCAN", "EC_inh", "DG_py", "DG_inh", "CA3_pyCAN", "CA3_inh", "CA1_pyCAN", "CA1_inh"],
+        "electrodes"    : [],               # [[x, y, z], ...] in mm
+        "line"          : None,             # {"start": [x, y, z], "end": [x, y, z], "n": 32}; contacts along a line [mm]
+        "cutoff"        : 1.,               # mm
+        "r_min"         : 10.e-3,           # mm
+        "dt"            : 1.e-3,            # second
+        "variable"      : "v"
+    },
+
+    # closed-loop stimulation: one train of the "stimulation" section every time the signal crosses the target
+    "closed_loop" : {
+        "enabled"       : False,
+        "signal"        : "phase",          # [phase | drive]; Kuramoto order parameter phase or filtered CA1 E rate
+        "target"        : 0.,               # rad for phase (0: peaks, pi: troughs); Hz for drive
+        "start"         : 0.5,              # second; no trains before
+        "stop"          : None,             # second; no trains after
+        "refractory"    : 0.2,              # second; minimum time between trains
+        "max_trains"    : None,             # None -> stimulation nr_of_trains
+        "latency"       : 0.,               # second; delay from the crossing to the train
+        "dt"            : None              # second; check period (None -> simulation dt)
+    },
+
     # git stuff
     "timestamp"         : None,
     "git_branch"        : None,
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Phase-response curve (PRC) of the theta rhythm, computed in-process.
+#
+#   python3 prc.py -p configs/default.json -on 1.5 1.75 32 -a 2 5 10 20 40 -w 8
+#
+# Every worker builds the network once and runs the unperturbed dynamics up to
+# each of its onsets in turn (NetworkHandle.phase_response): at every onset the
+# state is stored, one pulse train per amplitude (the "stimulation" section of
+# the configuration, rescaled) and the unperturbed continuation are simulated
+# for a short window only, and the phase difference of the Kuramoto order
+# parameter at the end of the window is the response. This replaces one full
+# simulation per onset and amplitude (scripts/PRC_calc.py).
+#
+# The onsets are split in contiguous chunks, one per worker. The table
+# (onset, phase at the onset, one phase difference per amplitude) is written to
+# <save dir>/PRC.csv and PRC.npz.
+# -----------------------------------------------------------------------------
+import os
+
+# one simulation per core; keep the numerical libraries single-threaded
+for var in ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS']:
+    os.environ.setdefault(var, '1')
+
+import csv
+import time
+import argparse
+import concurrent.futures as cf
+
+import numpy as np
+from brian2 import prefs
+
+import parameters
+from model.globals import bcolors
+from model import connectivity
+from model.network import build_network
+from model.closed_loop import pulse_train
+
+
+def make_trains(stim, amplitudes):
+    """ One pulse train [nA] per amplitude [nA]; the phases of the configured pulse are rescaled to the amplitude """
+    I_max = max(abs(I) for I in stim['I']) or 1.
+    return {amp:pulse_train(dict(stim, I=[amp*I/I_max for I in stim['I']])) for amp in amplitudes}
+
+
+def run_chunk(fconfig, onsets, amplitudes, window, conn_cache_dir, cython_cache):
+    """ Builds the network and returns the PRC rows (onset, phase, phase differences per amplitude) of a chunk of onsets """
+    prefs.codegen.runtime.cython.cache_dir = cython_cache
+    prefs.codegen.runtime.cython.multiprocess_safe = True
+
+    data = parameters.load(fconfig)
+    model = build_network(data, conn_cache_dir=conn_cache_dir)
+    trains = make_trains(data['stimulation'], amplitudes)
+
+    rows = []
+    for onset, phase, d_phase in model.phase_response(onsets, trains, window):
+        print('[•]\tonset {0:.4f} s | phase {1:+.3f} rad: done'.format(onset, phase))
+        rows.append([onset, phase] + [d_phase[amp] for amp in amplitudes])
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='In-process phase-response curve of the theta rhythm')
+
+    parser.add_argument('-p', '--parameters',
+                        nargs='?',
+                        type=str,
+                        default=os.path.join('configs', 'default.json'),
+                        help='Parameters file (json format); the "stimulation" section defines the pulse train')
+
+    parser.add_argument('-on', '--onsets',
+                        nargs=3,
+                        type=float,
+                        default=[1.5, 1.75, 32],
+                        help='Stimulation onsets: start, end (seconds) and number of points, e.g. one theta cycle')
+
+    parser.add_argument('-a', '--amplitudes',
+                        nargs='+',
+                        type=float,
+                        default=[2., 5., 10., 20., 40.],
+                        help='Stimulation amplitudes (nA)')
+
+    parser.add_argument('-win', '--window',
+                        nargs='?',
+                        type=float,
+                        default=2.5e-3,
+                        help='Window after the onset (seconds) at the end of which the phase difference is measured')
+
+    parser.add_argument('-w', '--workers',
+                        nargs='?',
+                        type=int,
+                        default=1,
+                        help='Number of worker processes; every worker builds the network and runs a contiguous chunk of onsets')
+
+    parser.add_argument('-sd', '--save_dir',
+                        nargs='?',
+                        type=str,
+                        default='results_PRC',
+                        help='Destination directory of the PRC table')
+
+    parser.add_argument('-cc', '--conn_cache',
+                        nargs='?',
+                        type=str,
+                        default=connectivity.conn_cache_dir,
+                        help='Connectivity cache directory; pass an empty string to disable the cache')
+
+    parser.add_argument('-cy', '--cython_cache',
+                        nargs='?',
+                        type=str,
+                        default=os.path.expanduser(os.path.join('~', '.cython', 'brian_extensions')),
+                        help='Shared Cython cache directory')
+
+    args = parser.parse_args()
+
+    onsets = np.linspace(args.onsets[0], args.onsets[1], int(args.onsets[2]), endpoint=False)
+    chunks = [chunk.tolist() for chunk in np.array_split(onsets, min(args.workers, len(onsets))) if len(chunk)]
+
+    print('[+] PRC: {0} onsets x {1} amplitudes | window: {2:.1f} ms | workers: {3}'.format(len(onsets), len(args.amplitudes), args.window*1e3, len(chunks)))
+    start = time.time()
+
+    rows = []
+    with cf.ProcessPoolExecutor(len(chunks)) as pool:
+        futures = [pool.submit(run_chunk, args.parameters, chunk, args.amplitudes, args.window, args.conn_cache, args.cython_cache) for chunk in chunks]
+        for fut in futures:
+            rows += fut.result()
+
+    # Save the table
+    os.makedirs(args.save_dir, exist_ok=True)
+    header = ['onset', 'phase'] + ['d_phase_{0:g}nA'.format(amp) for amp in args.amplitudes]
+    with open(os.path.join(args.save_dir, 'PRC.csv'), 'w', newline='') as fout:
+        writer = csv.writer(fout)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+    table = np.array(rows)
+    np.savez(os.path.join(args.save_dir, 'PRC.npz'), onsets=table[:,0], phase=table[:,1], d_phase=table[:,2:].T, amplitudes=np.array(args.amplitudes), window=args.window)
+
+    print(bcolors.GREEN + '[+]' + bcolors.ENDC + ' PRC saved in {0} ({1:.1f} min)'.format(args.save_dir, (time.time()-start)/60))
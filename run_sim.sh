@@ -17,7 +17,7 @@ FNAME=$(basename $FCONF)
 FNAME=$(echo $FNAME | cut -f 1 -d '.')
 
 # python3 -c "from brian2 import *; clear_cache('cython');" > /dev/null 2>&1
-command time -v python3 run_sim_dumb.py -p $FCONF -sd $OUTDIR > "$RESDIR/sim_${CNT}_${FNAME}.txt" 2>&1
+command time -v python3 run_simulation.py -p $FCONF -sd $OUTDIR -rc > "$RESDIR/sim_${CNT}_${FNAME}.txt" 2>&1
 
 CODE=$?
 echo $CODE
@@ -15,6 +15,14 @@ from matplotlib.ticker import (MultipleLocator, FormatStrFormatter, AutoMinorLoc
 
 from scipy import signal as sig
 
+import sys
+from pathlib import Path
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = Path(script_dir).parent
+sys.path.insert(0, os.path.abspath(parent_dir))
+
+from src.freq_analysis import my_FR
+
 
 fontprops = fm.FontProperties(size=12, family='monospace')
 
@@ -22,55 +30,6 @@ fontprops = fm.FontProperties(size=12, family='monospace')
 mplb.rcParams['pdf.fonttype'] = 42
 mplb.rcParams['ps.fonttype'] = 42
 
-def my_FR(spikes: np.ndarray,
-            duration: int,
-            window_size: float,
-            overlap: float) -> (np.ndarray, np.ndarray):
-    """
-    Compute the firing rate using a windowed moving average.
-
-    Parameters
-    ----------
-    spikes: numpy.ndarray
-        The spike times (Brian2 format, in ms)
-    duration: int
-        The duration of the recording (in seconds)
-    window_size: float
-        Width of the moving average window (in seconds)
-    overlap: float
-        Desired overlap between the windows (percentage, in [0., 1.))
-
-    Returns
-    -------
-    t: numpy.ndarray
-        Array of time values for the computed firing rate. These are the window centers.
-    FR: numpy.ndarray
-        Spikes per window (needs to be normalized)
-    """
-
-    # Calculate new sampling times
-    win_step = window_size * round(1. - overlap, 4)
-    # fs_n = int(1/win_step)
-
-    # First center is at the middle of the first window
-    c0 = window_size/2
-    cN = duration-c0
-
-    # centers
-    centers = np.arange(c0, cN+win_step, win_step)
-
-    # Calculate windowed FR
-    counts = []
-    for center in centers:
-        cl = center - c0
-        ch = center + c0
-        spike_cnt = np.count_nonzero(np.where((spikes >= cl) & (spikes < ch)))
-        counts.append(spike_cnt)
-
-    # return centers and spike counts per window
-    return np.array(counts), centers
-
-
 def my_FR_hist(spikes: np.ndarray,
             duration: int,
             window_size: float) -> (np.ndarray, np.ndarray):
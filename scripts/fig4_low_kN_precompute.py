@@ -3,19 +3,11 @@
 # OS stuff
 import os
 import sys
-import warnings
+import argparse
 from pathlib import Path
-from tqdm import tqdm
 
 # Computational stuff
 import numpy as np
-import matplotlib as mplb
-import matplotlib.pyplot as plt
-from matplotlib.gridspec import GridSpecFromSubplotSpec
-
-# TensorPAC
-from tensorpac import Pac
-from tensorpac.utils import PSD
 
 # Other scripts and my stuff
 script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -23,7 +15,18 @@ parent_dir = Path(script_dir).parent
 sys.path.insert(0, os.path.abspath(parent_dir))
 
 import parameters
-from src.freq_analysis import *
+from src import pac_sweep
+from model.globals import bcolors
+
+parser = argparse.ArgumentParser(description='Precompute the low-kN figure 4 heatmaps (MI, theta/gamma power)')
+
+parser.add_argument('-w', '--workers',
+                    nargs='?',
+                    type=int,
+                    default=None,
+                    help='Number of worker processes (default: all cores)')
+
+args = parser.parse_args()
 
 # get the root directory for the simulations
 root_cluster = os.path.join(parent_dir, 'results_cluster', 'results_fig4_low_kN')
@@ -79,22 +82,10 @@ kN_vals = np.array(kN_vals)
 
 # make a meshgrid for plotting heatmaps
 X, Y = np.meshgrid(osc_amps, kN_vals)
-# MI_heatmap_E = np.zeros(X.shape)
-# MI_heatmap_I = np.zeros(X.shape)
-MI_heatmap_E = np.zeros((len(osc_amps), len(kN_vals)))
-MI_heatmap_I = np.zeros((len(osc_amps), len(kN_vals)))
-
-# peak frequencies
-peak_freqs_inh = []
-peak_freqs_exc = []
 
-# theta / gamma power matrices
+# theta / gamma bands
 theta_band = [3, 9]
 gamma_band = [40, 80]
-theta_heatmap_E = np.zeros((len(osc_amps), len(kN_vals)))
-theta_heatmap_I = np.zeros((len(osc_amps), len(kN_vals)))
-gamma_heatmap_E = np.zeros((len(osc_amps), len(kN_vals)))
-gamma_heatmap_I = np.zeros((len(osc_amps), len(kN_vals)))
 
 # noise - uniform function instead [min/max]
 curr_state = np.random.get_state() # get current state
@@ -102,24 +93,19 @@ np.random.seed(42) # fix the noise - reproducibility
 noise = np.random.uniform(0, 10, int((duration-winsize_FR)*fs_FR)+2) # change max noise value
 np.random.set_state(curr_state) # resume state
 
-# Make a PAC object
-f_pha_PAC = theta_band
-f_amp_PAC = gamma_band
-pac_obj = Pac(idpac=(2, 0, 0), f_pha=f_pha_PAC, f_amp=f_amp_PAC)
-
 # Parameters (backup) filename
 fname = 'parameters_bak.json'
 # t_stim = data['stimulation']['onset']*1000
 t_stim = 2000.0 # ms
 
-# iterate over oscillator amplitudes
-for osc_amp_dir in tqdm(osc_amplitude_dirs, desc='Computing the modulation index...'):
+# gather the runs of the sweep: osc_<amp>/8.0_nA/0.00_2000.0_ms/<kN sim>
+runs = []
+for osc_amp_dir in osc_amplitude_dirs:
     curr_osc_amp = float(osc_amp_dir.split('_')[1])
-    idx_osc_amp = np.where(osc_amps == curr_osc_amp)[0] # index for heatmap
+    idx_osc_amp = np.where(osc_amps == curr_osc_amp)[0][0] # index for heatmap
 
     # one step in
     curr_osc_dir = os.path.join(root_cluster, osc_amp_dir)
-    print('osc: ', osc_amp_dir)
 
     # two steps in - stim 8.0nA @ 2000ms
     for kN_dir in next(os.walk(os.path.join(curr_osc_dir, '8.0_nA', '0.00_2000.0_ms')))[1]:
@@ -135,137 +121,26 @@ for osc_amp_dir in tqdm(osc_amplitude_dirs, desc='Computing the modulation index
             continue;
 
         curr_kN_val = data['Kuramoto']['kN']
-        idx_kN_val = np.where(kN_vals == curr_kN_val)[0] # index for heatmap
-
-        # load the data (spikes) for the CA1 E-group
-        curr_data_dir = os.path.join(curr_kN_dir, 'data')
-        curr_spikes_dir = os.path.join(curr_data_dir, 'spikes')
-        with warnings.catch_warnings():
-            warnings.filterwarnings("ignore", category=UserWarning, append=1)
-
-            if len([entry for entry in os.listdir(curr_spikes_dir) if os.path.isfile(os.path.join(curr_spikes_dir, entry))]) == 16:
-                i_exc = np.loadtxt(os.path.join(curr_spikes_dir, 'CA1_pyCAN_spikemon_i.txt'))
-                t_exc = np.loadtxt(os.path.join(curr_spikes_dir, 'CA1_pyCAN_spikemon_t.txt'))
-                i_inh = np.loadtxt(os.path.join(curr_spikes_dir, 'CA1_inh_spikemon_i.txt'))
-                t_inh = np.loadtxt(os.path.join(curr_spikes_dir, 'CA1_inh_spikemon_t.txt'))
-            else:
-                print("[!] Warning: files missing!", "osc_amp: ", curr_osc_amp, " kN_val: ", curr_kN_val)
-                continue
-
-        # Fix the timings -> from ms to sec
-        i_exc = i_exc.astype(int)
-        t_exc = t_exc*ms
-        i_inh = i_inh.astype(int)
-        t_inh = t_inh*ms
-
-        # get the firing rate (spikes-to-rates)
-        tv_inh_FR, FR_inh = my_FR(spikes=t_inh, duration=duration, window_size=winsize_FR, overlap=overlap_FR)
-        tv_exc_FR, FR_exc = my_FR(spikes=t_exc, duration=duration, window_size=winsize_FR, overlap=overlap_FR)
-
-        # Normalize the FRs
-        FR_inh_norm = (FR_inh/winsize_FR)/N_tot[3][1]
-        FR_exc_norm = (FR_exc/winsize_FR)/N_tot[3][0]
-
-        # Add noise
-        FR_inh_norm_noise = FR_inh_norm + noise
-        FR_exc_norm_noise = FR_exc_norm + noise
-
-        # get the post-stim indices
-        tlims_post = np.array([500, 5500]) + t_stim # avoid stim artifact | 5s window
-        tidx_post = np.logical_and(np.round(tv_exc_FR/ms,4)>tlims_post[0], np.round(tv_exc_FR/ms,4)<=tlims_post[1])
-
-        # Use the TensorPAC module to calculate the PSDs
-        psd_pac_inh = PSD(FR_inh_norm[np.newaxis,tidx_post], fs_FR)
-        psd_pac_exc = PSD(FR_exc_norm[np.newaxis,tidx_post], fs_FR)
-
-        # Theta band indices
-        f_theta_idxs = np.logical_and(psd_pac_inh.freqs>=theta_band[0], psd_pac_inh.freqs<=theta_band[1])
-        f_gamma_idxs = np.logical_and(psd_pac_inh.freqs>=gamma_band[0], psd_pac_inh.freqs<=gamma_band[1])
-
-        # Calculate peaks - can use argmax or np.argwhere(np.abs(x-x.max())<1e-6)
-        peaks_inh, props_inh = sig.find_peaks(psd_pac_inh.psd[0], prominence=1)
-        peaks_exc, props_exc = sig.find_peaks(psd_pac_exc.psd[0], prominence=1)
-
-        # Check if we have ~any~ peaks
-        if peaks_inh.size > 0:
-            # Filter out peaks lower than 10% of signal max
-            threshold_inh = psd_pac_inh.psd[0].max()*0.1
-            idx_peaks_inh_filt = psd_pac_inh.psd[0][peaks_inh] > threshold_inh
-            peaks_inh = peaks_inh[idx_peaks_inh_filt]
-
-            # All peaks to theta peaks
-            idx_theta_peaks = np.argwhere(np.logical_and(psd_pac_inh.freqs[peaks_inh]>=theta_band[0], psd_pac_inh.freqs[peaks_inh]<=theta_band[1]))
-
-            if idx_theta_peaks.size > 0:
-                # Idx of max theta power
-                idx_max_theta_peak = np.argmax(psd_pac_inh.psd[0][peaks_inh[idx_theta_peaks]])
-
-                # Which frequency is the max?
-                peak_theta_freq_inh = psd_pac_inh.freqs[peaks_inh[idx_theta_peaks[idx_max_theta_peak]]].tolist()
-
-                # Find peak frequency
-                # peak_freq_inh = psd_pac_inh.freqs[peaks_inh][np.argwhere(psd_pac_inh.psd[0][peaks_inh] == psd_pac_inh.psd[0][peaks_inh].max())].squeeze().tolist()
-
-                # Add to the list for later (hist calc)
-                peak_freqs_inh.extend(peak_theta_freq_inh)
-
-        if peaks_exc.size > 0:
-            # Filter out peaks lower than 10% of signal max
-            threshold_exc = psd_pac_exc.psd[0].max()*0.1
-            idx_peaks_exc_filt = psd_pac_exc.psd[0][peaks_exc] > threshold_exc
-            peaks_exc = peaks_exc[idx_peaks_exc_filt]
-
-            # All peaks to theta peaks
-            idx_theta_peaks = np.argwhere(np.logical_and(psd_pac_exc.freqs[peaks_exc]>=theta_band[0], psd_pac_exc.freqs[peaks_exc]<=theta_band[1]))
-
-            if idx_theta_peaks.size > 0:
-                # Idx of max theta power
-                idx_max_theta_peak = np.argmax(psd_pac_exc.psd[0][peaks_exc[idx_theta_peaks]])
-
-                # Which frequency is the max?
-                peak_theta_freq_exc = psd_pac_exc.freqs[peaks_exc[idx_theta_peaks[idx_max_theta_peak]]].tolist()
-
-                # Find peak frequency
-                # peak_freq_exc = psd_pac_exc.freqs[peaks_exc][np.argwhere(psd_pac_exc.psd[0][peaks_exc] == psd_pac_exc.psd[0][peaks_exc].max())].squeeze().tolist()
-
-                # Add to the list for later (hist calc)
-                peak_freqs_exc.extend(peak_theta_freq_exc)
-
-        # Print peak frequencies
-        print("="*24)
-        if (peaks_inh.size > 0):
-            print("Inh. Peak Freqs: [", psd_pac_inh.freqs[peaks_inh], "] Hz")
-
-        if (peaks_inh.size > 0):
-            print("Exc. Peak Freqs: [", psd_pac_exc.freqs[peaks_exc], "] Hz")
-        print("="*24, "\n")
-
-        # if there is theta activity
-        theta_flag_inh = np.any(np.isin(psd_pac_inh.freqs[peaks_inh], psd_pac_inh.freqs[f_theta_idxs], assume_unique=True))
-        theta_flag_exc = np.any(np.isin(psd_pac_exc.freqs[peaks_exc], psd_pac_exc.freqs[f_theta_idxs], assume_unique=True))
-
-        # if there is gamma activity
-        gamma_flag_inh = np.any(np.isin(psd_pac_inh.freqs[peaks_inh], psd_pac_inh.freqs[f_gamma_idxs], assume_unique=True))
-        gamma_flag_exc = np.any(np.isin(psd_pac_exc.freqs[peaks_exc], psd_pac_exc.freqs[f_gamma_idxs], assume_unique=True))
-
-        # Calculate modulation index
-        MI_I = pac_obj.filterfit(fs_FR, FR_inh_norm_noise[np.newaxis, tidx_post])
-        MI_E = pac_obj.filterfit(fs_FR, FR_exc_norm_noise[np.newaxis, tidx_post])
-
-        # Calculate theta/gamma power (post-stim)
-        theta_band_pow_inh = bandpower(FR_inh_norm[np.newaxis, tidx_post], fs_FR, theta_band, window_sec=1., overlap=0.9, relative=False)
-        theta_band_pow_exc = bandpower(FR_exc_norm[np.newaxis, tidx_post], fs_FR, theta_band, window_sec=1., overlap=0.9, relative=False)
-        gamma_band_pow_inh = bandpower(FR_inh_norm[np.newaxis, tidx_post], fs_FR, gamma_band, window_sec=1., overlap=0.9, relative=False)
-        gamma_band_pow_exc = bandpower(FR_exc_norm[np.newaxis, tidx_post], fs_FR, gamma_band, window_sec=1., overlap=0.9, relative=False)
-
-        # Add the values to the heatmaps
-        MI_heatmap_I[idx_osc_amp, idx_kN_val] = MI_I
-        MI_heatmap_E[idx_osc_amp, idx_kN_val] = MI_E
-
-        theta_heatmap_I[idx_osc_amp, idx_kN_val] = theta_band_pow_inh
-        gamma_heatmap_I[idx_osc_amp, idx_kN_val] = gamma_band_pow_inh
-        theta_heatmap_E[idx_osc_amp, idx_kN_val] = theta_band_pow_exc
-        gamma_heatmap_E[idx_osc_amp, idx_kN_val] = gamma_band_pow_exc
+        idx_kN_val = np.where(kN_vals == curr_kN_val)[0][0] # index for heatmap
+
+        runs.append({'dir':curr_kN_dir, 'index':(idx_osc_amp, idx_kN_val), 't_stim':t_stim*ms})
+
+# compute the MI / theta / gamma heatmaps of the CA1 E-I populations in one pass
+res = pac_sweep.precompute(runs, grid_shape=(len(osc_amps), len(kN_vals)),
+                           groups=areas[3], N=N_tot[3], duration=duration,
+                           t_post=(500*ms, 5500*ms), # avoid stim artifact | 5s window
+                           window_size=winsize_FR, overlap=overlap_FR,
+                           theta_band=theta_band, gamma_band=gamma_band, noise=noise,
+                           workers=args.workers,
+                           cache=os.path.join(parent_dir, 'figures', 'fig4_low_kN', 'data', 'pac_sweep.npz'))
+
+MI_heatmap_E, MI_heatmap_I = res['MI'][..., 0], res['MI'][..., 1]
+theta_heatmap_E, theta_heatmap_I = res['theta'][..., 0], res['theta'][..., 1]
+gamma_heatmap_E, gamma_heatmap_I = res['gamma'][..., 0], res['gamma'][..., 1]
+
+# peak frequencies (theta)
+peak_freqs_exc = res['theta_peak'][:, 0][~np.isnan(res['theta_peak'][:, 0])]
+peak_freqs_inh = res['theta_peak'][:, 1][~np.isnan(res['theta_peak'][:, 1])]
 
 
 # Done with the iterations
@@ -25,6 +25,7 @@ sys.path.insert(0, os.path.abspath(parent_dir))
 
 from src.freq_analysis import *
 from src.figure_plots_parameters import *
+from src.runfile import open_run
 
 # Set font to Arial -- is this working?
 plt.rcParams['font.family'] = 'sans-serif'
@@ -155,7 +156,7 @@ if __name__ == "__main__":
     # results_dir = os.path.join(parent_dir, 'results', 'analysis', 'PRC_offsets', 'pos_pi_2')
     # results_dir = os.path.join(parent_dir, 'results', 'analysis', 'PRC_offsets', 'neg_pi_2')
     data_dir = os.path.join(results_dir, 'data')
-    spikes_dir = os.path.join(data_dir, 'spikes')
+    run = open_run(results_dir)
 
     """ Plot supplementary figures for fig4 of the paper - TODO: Add DOI"""
     print('[+] Generating the figure...')
@@ -332,7 +333,7 @@ if __name__ == "__main__":
 
     print('[+] Plotting rhythm...')
 
-    rhythm = np.loadtxt(os.path.join(data_dir, 'order_param_mon_rhythm.txt'))
+    rhythm = run['order_param/rhythm']
     ax_rhythm.plot(tv, rhythm/(np.max(rhythm)), ls='-', c='k', linewidth=1.2, rasterized=False, zorder=1)
 
     # vertical lines at x-points
@@ -371,7 +372,7 @@ if __name__ == "__main__":
 
     if args.order_parameter:
         print('[+] Plotting order parameter...')
-        data = np.loadtxt(os.path.join(data_dir, 'order_param_mon_coherence.txt'))
+        data = run['order_param/coherence']
 
         # asymptote
         ax_common.hlines(y=1., xmin=0., xmax=duration, color='k', ls='--', linewidth=0.5, zorder=11)
@@ -381,7 +382,7 @@ if __name__ == "__main__":
 
     else:
         print('[+] Plotting phase...')
-        data = np.loadtxt(os.path.join(data_dir, 'order_param_mon_phase.txt'))
+        data = np.array(run['order_param/phase']) # modified below
 
         # data = (data + np.pi) % (2 * np.pi)
         data += (1.*(data<0)*2*np.pi)
@@ -404,10 +405,8 @@ if __name__ == "__main__":
     for area_name, fname, N_area, curr_ax_rasters, curr_ax_rates in zip(area_labels, areas, N_tot, axs[2], axs[3]):
         # load t-i arrays for this area
         print('[+] Loading the spikes for area:', area_name)
-        i_exc = np.loadtxt(os.path.join(spikes_dir, '{0}_spikemon_i.txt'.format(fname[0])))
-        t_exc = np.loadtxt(os.path.join(spikes_dir, '{0}_spikemon_t.txt'.format(fname[0])))
-        i_inh = np.loadtxt(os.path.join(spikes_dir, '{0}_spikemon_i.txt'.format(fname[1])))
-        t_inh = np.loadtxt(os.path.join(spikes_dir, '{0}_spikemon_t.txt'.format(fname[1])))
+        i_exc, t_exc = run.spikes(fname[0])
+        i_inh, t_inh = run.spikes(fname[1])
 
         i_exc = i_exc.astype(int)
         t_exc = t_exc*ms
@@ -25,6 +25,10 @@ sys.path.insert(0, os.path.abspath(parent_dir))
 
 from src.freq_analysis import *
 from src.figure_plots_parameters import *
+from src.runfile import open_run
+
+# cached analysis stages; `python -m src.memo clear` invalidates them
+from src.memo import my_FR, PSD
 
 # Arial font everywhere
 # ILLUSTRATOR STUFF
@@ -136,10 +140,9 @@ if __name__ == "__main__":
     print('[+] Loading the spikes for area', areas[3][0].split('_')[0])
 
     # Load the spikes for CA1
-    i_exc = np.loadtxt(os.path.join(dir_data, 'spikes/CA1_pyCAN_spikemon_i.txt'))
-    t_exc = np.loadtxt(os.path.join(dir_data, 'spikes/CA1_pyCAN_spikemon_t.txt'))
-    i_inh = np.loadtxt(os.path.join(dir_data, 'spikes/CA1_inh_spikemon_i.txt'))
-    t_inh = np.loadtxt(os.path.join(dir_data, 'spikes/CA1_inh_spikemon_t.txt'))
+    run = open_run(os.path.dirname(dir_data))
+    i_exc, t_exc = run.spikes('CA1_pyCAN')
+    i_inh, t_inh = run.spikes('CA1_inh')
 
     # Fix the timings -> from ms to sec
     i_exc = i_exc.astype(int)
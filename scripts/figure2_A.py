@@ -27,6 +27,10 @@ sys.path.insert(0, os.path.abspath(parent_dir))
 
 from src.freq_analysis import *
 from src.figure_plots_parameters import *
+from src.runfile import open_run
+
+# cached analysis stages; `python -m src.memo clear` invalidates them
+from src.memo import my_FR, my_specgram, PSD
 
 # Arial font everywhere
 # ILLUSTRATOR STUFF
@@ -120,6 +124,9 @@ if __name__ == "__main__":
     duration_adj = t_lims_adj[1] - t_lims_adj[0]
     interp = 'nearest'
 
+    # Results of the run (memory-mapped run file, or the older text files)
+    run = open_run(os.path.join(parent_dir, 'results', 'analysis', 'current', 'desc3'))
+
     # Area names and sizes
     areas = [['EC_pyCAN', 'EC_inh'], ['DG_py', 'DG_inh'], ['CA3_pyCAN', 'CA3_inh'], ['CA1_pyCAN', 'CA1_inh']]
     area_labels = ['EC', 'DG', 'CA3', 'CA1']
@@ -510,10 +517,8 @@ if __name__ == "__main__":
 
         # load t-i arrays for this area
         print('[+] Loading the spikes for area', areas[area_idx][0].split('_')[0])
-        i_exc = np.loadtxt(os.path.join(parent_dir, 'results', 'analysis', 'current', 'desc3', 'data', 'spikes/{0}_spikemon_i.txt'.format(areas[area_idx][0])))
-        t_exc = np.loadtxt(os.path.join(parent_dir, 'results', 'analysis', 'current', 'desc3', 'data', 'spikes/{0}_spikemon_t.txt'.format(areas[area_idx][0])))
-        i_inh = np.loadtxt(os.path.join(parent_dir, 'results', 'analysis', 'current', 'desc3', 'data', 'spikes/{0}_spikemon_i.txt'.format(areas[area_idx][1])))
-        t_inh = np.loadtxt(os.path.join(parent_dir, 'results', 'analysis', 'current', 'desc3', 'data', 'spikes/{0}_spikemon_t.txt'.format(areas[area_idx][1])))
+        i_exc, t_exc = run.spikes(areas[area_idx][0])
+        i_inh, t_inh = run.spikes(areas[area_idx][1])
 
         i_exc = i_exc.astype(int)
         t_exc = t_exc*ms
@@ -609,7 +614,7 @@ if __name__ == "__main__":
     # =====================
     print('[+] Plotting rhythm...')
 
-    rhythm = np.loadtxt(os.path.join(parent_dir, 'results', 'analysis', 'current', 'desc3', 'data', 'order_param_mon_rhythm.txt'))
+    rhythm = run['order_param/rhythm']
     ax_rhythm.plot(tv, rhythm/(np.max(rhythm)), ls='-', c='k', linewidth=1.2, rasterized=False, zorder=1)
 
     # vertical lines at x-points
@@ -663,7 +668,7 @@ if __name__ == "__main__":
     # ================================
     if args.order_parameter:
         print('[+] Plotting order parameter...')
-        data = np.loadtxt(os.path.join(parent_dir, 'results', 'analysis', 'current', 'desc3', 'data', 'order_param_mon_coherence.txt'))
+        data = run['order_param/coherence']
 
         # asymptote
         ax_common.hlines(y=1., xmin=0., xmax=duration, color='k', ls='--', linewidth=0.5, zorder=11)
@@ -673,7 +678,7 @@ if __name__ == "__main__":
 
     else:
         print('[+] Plotting phase...')
-        data = np.loadtxt(os.path.join(parent_dir, 'results', 'analysis', 'current', 'desc3', 'data', 'order_param_mon_phase.txt'))
+        data = np.array(run['order_param/phase']) # modified below
         # data = (data + np.pi) % (2 * np.pi)
         data += (1.*(data<0)*2*np.pi)
 
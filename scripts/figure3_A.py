@@ -5,6 +5,7 @@ import os
 import sys
 import warnings
 from pathlib import Path
+from tqdm import tqdm
 
 import numpy as np
 import matplotlib as mplb
@@ -20,6 +21,11 @@ parent_dir = Path(script_dir).parent
 sys.path.insert(0, os.path.abspath(parent_dir))
 
 from src.freq_analysis import *
+from src.runmap import map_runs
+from src.runfile import open_run
+
+# cached analysis stages; `python -m src.memo clear` invalidates them
+from src.memo import my_FR
 
 fontprops = fm.FontProperties(size=12, family='monospace')
 
@@ -64,6 +70,77 @@ def add_sizebar(ax, xlocs, ylocs, bcolor, text, textx, texty, fsize, rot, ha, va
         ax.text(x=textx, y=texty, s=text, rotation=rot, fontsize=fsize, va=va, ha=ha, clip_on=False)
 
 # main program
+def quantify_run(stim_dir, duration, dt, winsize_FR, overlap_FR, td, N_tot):
+    """ Panel C quantification of a run: number of bursts, burst duration and spike counts after the stimulation onset """
+    ms = 1e-3
+
+    # go over the sub-directories
+    t_stim_dir = os.listdir(stim_dir)[0]
+    stim_onset_dir = os.path.join(stim_dir, t_stim_dir)
+    curr_path = os.path.join(stim_onset_dir, os.listdir(stim_onset_dir)[0])
+
+    # load the data for the current simulation
+    run = open_run(curr_path)
+
+    # rasters
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", category=UserWarning, append=1)
+        CA1_E_i, CA1_E_t = run.spikes('CA1_pyCAN')
+        CA1_I_i, CA1_I_t = run.spikes('CA1_inh')
+
+    i_exc = CA1_E_i.astype(int)
+    t_exc = CA1_E_t*ms
+    i_inh = CA1_I_i.astype(int)
+    t_inh = CA1_I_t*ms
+
+    # calculate FRs
+    tv_inh_FR, FR_inh = my_FR(spikes=t_inh, duration=duration, window_size=winsize_FR, overlap=overlap_FR)
+    tv_exc_FR, FR_exc = my_FR(spikes=t_exc, duration=duration, window_size=winsize_FR, overlap=overlap_FR)
+
+    FR_inh_norm = (FR_inh/winsize_FR)/N_tot[3][1]
+    FR_exc_norm = (FR_exc/winsize_FR)/N_tot[3][0]
+
+    # envelope of bursts
+    FR_exc_envelope = (FR_exc_norm > 10)
+
+    # get number of bursts
+    N_exc = N_tot[3][0]
+    N_inh = N_tot[3][1]
+    tn_exc = int(N_exc*0.1)
+    tn_inh = int(N_inh*0.1)
+    bnum = 0
+    spk_cnt_per_burst = 0
+    flag = False
+    if t_exc.size > 0:
+        tval_p = t_exc[0]
+        spk_cnt_per_burst += 1
+        for tval_c in t_exc[1:]:
+            if tval_c - tval_p <= td:   # spikes are close, is it a burst?
+                if flag:    # we already adjusted the burst counter, continue
+                    continue
+                spk_cnt_per_burst += 1
+
+                if spk_cnt_per_burst >= tn_exc:
+                    bnum += 1
+                    flag = True
+            else:   # we take a large step, the spikes are too spread out, new burst?
+                spk_cnt_per_burst = 0
+                flag = False
+            tval_p = tval_c
+    # num_bursts = (np.convolve([-10, 0, 10], FR_exc_envelope)>0).sum()//2
+
+    # get total burst duration
+    dur_burst = np.count_nonzero(FR_exc_envelope)*dt/ms
+
+    # count spikes after t_onset
+    t_stim = float(t_stim_dir.split("_")[1])*ms
+    spkcnt_exc = np.count_nonzero(t_exc >= t_stim)
+    spkcnt_inh = np.count_nonzero(t_inh >= t_stim)
+
+    return {'xval':float(os.path.basename(stim_dir).split("_")[0]), 'bnum':bnum, 'dur_burst':dur_burst,
+            'spkcnt':[spkcnt_exc, spkcnt_inh], 'last_spike':t_exc[-1] if t_exc.size > 0 else None}
+
+
 if __name__ == "__main__":
     import argparse
 
@@ -497,7 +574,7 @@ if __name__ == "__main__":
     # Load the data
     #------------------------
     dir_data = [os.path.join(parent_dir, 'results_cluster', 'results_noICAN_fig3_quantify', '10.0_nA', '0.00_1333.0_ms', '27-09-2022 18H07M53S', 'data'), os.path.join(parent_dir, 'results_cluster', 'results_ICAN_fig3_quantify', '10.0_nA', '0.00_1333.0_ms', '27-09-2022 18H42M54S', 'data')]
-    dir_spikes = [os.path.join(dir_data[0], 'spikes'), os.path.join(dir_data[1], 'spikes')]
+    runs = [open_run(os.path.dirname(dir_data[0])), open_run(os.path.dirname(dir_data[1]))]
     dir_currents = [os.path.join(dir_data[0], 'currents'), os.path.join(dir_data[1], 'currents')]
 
 
@@ -516,20 +593,16 @@ if __name__ == "__main__":
             warnings.filterwarnings("ignore", category=UserWarning, append=1)
 
             # 10nA w/ I_CAN
-            i_exc_ICAN = np.loadtxt(os.path.join(dir_spikes[1], '{0}_spikemon_i.txt'.format(areas[area_idx][0])))
-            t_exc_ICAN = np.loadtxt(os.path.join(dir_spikes[1], '{0}_spikemon_t.txt'.format(areas[area_idx][0])))
-            i_inh_ICAN = np.loadtxt(os.path.join(dir_spikes[1], '{0}_spikemon_i.txt'.format(areas[area_idx][1])))
-            t_inh_ICAN = np.loadtxt(os.path.join(dir_spikes[1], '{0}_spikemon_t.txt'.format(areas[area_idx][1])))
+            i_exc_ICAN, t_exc_ICAN = runs[1].spikes(areas[area_idx][0])
+            i_inh_ICAN, t_inh_ICAN = runs[1].spikes(areas[area_idx][1])
 
         print('[+]....ICAN OFF')
         with warnings.catch_warnings():
             warnings.filterwarnings("ignore", category=UserWarning, append=1)
 
             # 10nA w/o I_CAN
-            i_exc_noICAN = np.loadtxt(os.path.join(dir_spikes[0], '{0}_spikemon_i.txt'.format(areas[area_idx][0])))
-            t_exc_noICAN = np.loadtxt(os.path.join(dir_spikes[0], '{0}_spikemon_t.txt'.format(areas[area_idx][0])))
-            i_inh_noICAN = np.loadtxt(os.path.join(dir_spikes[0], '{0}_spikemon_i.txt'.format(areas[area_idx][1])))
-            t_inh_noICAN = np.loadtxt(os.path.join(dir_spikes[0], '{0}_spikemon_t.txt'.format(areas[area_idx][1])))
+            i_exc_noICAN, t_exc_noICAN = runs[0].spikes(areas[area_idx][0])
+            i_inh_noICAN, t_inh_noICAN = runs[0].spikes(areas[area_idx][1])
 
         # CA1_E_ICAN_t = np.loadtxt(os.path.join(dir_spikes[1], 'CA1_pyCAN_spikemon_t.txt'))
         # CA1_E_ICAN_i = np.loadtxt(os.path.join(dir_spikes[1], 'CA1_pyCAN_spikemon_i.txt'))
@@ -661,7 +734,7 @@ if __name__ == "__main__":
     print('[+] Loading CA1-E I_CAN / I_M currents...')
     with warnings.catch_warnings():
         warnings.filterwarnings("ignore", category=UserWarning, append=1)
-        CA1_E_I_CAN = np.loadtxt(os.path.join(dir_currents[1], 'CA1_E_currents_I_CAN.txt'))
+        CA1_E_I_CAN = np.loadtxt(os.path.join(dir_currents[1], 'CA1_E_currents_I_CAN.txt')) # not part of the run file
         CA1_E_I_M = np.loadtxt(os.path.join(dir_currents[1], 'CA1_E_currents_I_M.txt'))
 
 
@@ -729,197 +802,31 @@ if __name__ == "__main__":
     dir_ICAN = os.path.join(dir_cluster, 'results_ICAN_fig3_quantify')
     dir_noICAN = os.path.join(dir_cluster, 'results_noICAN_fig3_quantify')
 
-    # w/ ICAN
-    print('[!+] Working on +I_CAN data')
-    print('-'*32)
-
-    duration_ICAN = []
-    spikes_cnt_ICAN = []
-    xarr_ICAN = []
-    bnums_ICAN = []
-
-    for item in os.listdir(dir_ICAN):
-        print('[>] ', item)
-
-        # get the stim amplitude - xval
-        tmp = item.split("_")
-        xval = float(tmp[0])
-        xarr_ICAN.append(xval)
-
-        # go over the sub-directories
-        stim_dir = os.path.join(dir_ICAN, item)
-        t_stim_dir = os.listdir(stim_dir)[0]
-        stim_onset_dir = os.path.join(stim_dir, t_stim_dir)
-        curr_path = os.path.join(stim_onset_dir, os.listdir(stim_onset_dir)[0])
-
-        # load the data for the current simulation
-        dir_data_curr = os.path.join(curr_path, 'data')
-        dir_spikes_curr = os.path.join(dir_data_curr, 'spikes')
-
-        # rasters
-        with warnings.catch_warnings():
-            warnings.filterwarnings("ignore", category=UserWarning, append=1)
-            CA1_E_t = np.loadtxt(os.path.join(dir_spikes_curr, 'CA1_pyCAN_spikemon_t.txt'))
-            CA1_E_i = np.loadtxt(os.path.join(dir_spikes_curr, 'CA1_pyCAN_spikemon_i.txt'))
-            CA1_I_t = np.loadtxt(os.path.join(dir_spikes_curr, 'CA1_inh_spikemon_t.txt'))
-            CA1_I_i = np.loadtxt(os.path.join(dir_spikes_curr, 'CA1_inh_spikemon_i.txt'))
-
-        i_exc = CA1_E_i.astype(int)
-        t_exc = CA1_E_t*ms
-        i_inh = CA1_I_i.astype(int)
-        t_inh = CA1_I_t*ms
-
-        # calculate FRs
-        tv_inh_FR, FR_inh = my_FR(spikes=t_inh, duration=duration, window_size=winsize_FR, overlap=overlap_FR)
-        tv_exc_FR, FR_exc = my_FR(spikes=t_exc, duration=duration, window_size=winsize_FR, overlap=overlap_FR)
-
-        FR_inh_norm = (FR_inh/winsize_FR)/N_tot[3][1]
-        FR_exc_norm = (FR_exc/winsize_FR)/N_tot[3][0]
-
-        # envelope of bursts
-        FR_exc_envelope = (FR_exc_norm > 10)
-
-        # get number of bursts
-        N_exc = N_tot[3][0]
-        N_inh = N_tot[3][1]
-        tn_exc = int(N_exc*0.1)
-        tn_inh = int(N_inh*0.1)
-        bnum = 0
-        spk_cnt_per_burst = 0
-        flag = False
-        if t_exc.size > 0:
-            tval_p = t_exc[0]
-            spk_cnt_per_burst += 1
-            for tval_c in t_exc[1:]:
-                if tval_c - tval_p <= td:   # spikes are close, is it a burst?
-                    if flag:    # we already adjusted the burst counter, continue
-                        continue
-                    spk_cnt_per_burst += 1
-
-                    if spk_cnt_per_burst >= tn_exc:
-                        bnum += 1
-                        flag = True
-                else:   # we take a large step, the spikes are too spread out, new burst?
-                    spk_cnt_per_burst = 0
-                    flag = False
-                tval_p = tval_c
-        bnums_ICAN.append(bnum)
-        # num_bursts = (np.convolve([-10, 0, 10], FR_exc_envelope)>0).sum()//2
-
-        # get total burst duration
-        dur_burst = np.count_nonzero(FR_exc_envelope)*dt/ms
-
-        # append both values
-        duration_ICAN.append([bnums_ICAN, dur_burst])
-
-        # count spikes after t_onset
-        t_stim = float(t_stim_dir.split("_")[1])*ms
-        spkcnt_exc = np.count_nonzero(t_exc >= t_stim)
-        spkcnt_inh = np.count_nonzero(t_inh >= t_stim)
-        spikes_cnt_ICAN.append([spkcnt_exc, spkcnt_inh])
-
-        print('[+]....Spikes exc: ', spkcnt_exc)
-        print('[+]....Spikes inh: ', spkcnt_inh)
-        if (t_exc.size>0):
-            print('[+]....Last spike: ', np.round(t_exc[-1],4))
+    # quantify the runs of both sets in parallel (one task per stimulation amplitude)
+    quantify_kwargs = {'duration':duration, 'dt':dt, 'winsize_FR':winsize_FR, 'overlap_FR':overlap_FR, 'td':td, 'N_tot':N_tot}
+    quantified = {}
+    for label, dir_set in [('ICAN', dir_ICAN), ('noICAN', dir_noICAN)]:
+        print('[!{0}] Working on {1}I_CAN data'.format('+' if label == 'ICAN' else '-', '+' if label == 'ICAN' else '-'))
+        print('-'*32)
+
+        stim_dirs = [os.path.join(dir_set, item) for item in sorted(os.listdir(dir_set))]
+        quantified[label] = []
+        for stim_dir, res in map_runs(quantify_run, stim_dirs, desc=label, **quantify_kwargs):
+            if isinstance(res, Exception):
+                continue
+            quantified[label].append(res)
+            tqdm.write('[>] {0} | spikes exc: {1} | spikes inh: {2} | last spike: {3}'.format(os.path.basename(stim_dir), *res['spkcnt'], None if res['last_spike'] is None else np.round(res['last_spike'], 4)))
         print()
 
+    xarr_ICAN = [res['xval'] for res in quantified['ICAN']]
+    bnums_ICAN = [res['bnum'] for res in quantified['ICAN']]
+    duration_ICAN = [[res['bnum'], res['dur_burst']] for res in quantified['ICAN']]
+    spikes_cnt_ICAN = [res['spkcnt'] for res in quantified['ICAN']]
 
-    # w/o ICAN
-    print()
-    print('[!-] Working on -I_CAN data')
-    print('-'*32)
-
-    duration_noICAN = []
-    spikes_cnt_noICAN = []
-    xarr_noICAN = []
-    bnums_noICAN = []
-
-    for item in os.listdir(dir_noICAN):
-        print('[>] ', item)
-
-        # get the stim amplitude - xval
-        tmp = item.split("_")
-        xval = float(tmp[0])
-        xarr_noICAN.append(xval)
-
-        # go over the sub-directories
-        stim_dir = os.path.join(dir_noICAN, item)
-        t_stim_dir = os.listdir(stim_dir)[0]
-        stim_onset_dir = os.path.join(stim_dir, t_stim_dir)
-        curr_path = os.path.join(stim_onset_dir, os.listdir(stim_onset_dir)[0])
-
-        # load the data for the current simulation
-        dir_data_curr = os.path.join(curr_path, 'data')
-        dir_spikes_curr = os.path.join(dir_data_curr, 'spikes')
-
-        # rasters
-        with warnings.catch_warnings():
-            warnings.filterwarnings("ignore", category=UserWarning, append=1)
-            CA1_E_t = np.loadtxt(os.path.join(dir_spikes_curr, 'CA1_pyCAN_spikemon_t.txt'))
-            CA1_E_i = np.loadtxt(os.path.join(dir_spikes_curr, 'CA1_pyCAN_spikemon_i.txt'))
-            CA1_I_t = np.loadtxt(os.path.join(dir_spikes_curr, 'CA1_inh_spikemon_t.txt'))
-            CA1_I_i = np.loadtxt(os.path.join(dir_spikes_curr, 'CA1_inh_spikemon_i.txt'))
-
-        i_exc = CA1_E_i.astype(int)
-        t_exc = CA1_E_t*ms
-        i_inh = CA1_I_i.astype(int)
-        t_inh = CA1_I_t*ms
-
-        # calculate FRs
-        tv_inh_FR, FR_inh = my_FR(spikes=t_inh, duration=duration, window_size=winsize_FR, overlap=overlap_FR)
-        tv_exc_FR, FR_exc = my_FR(spikes=t_exc, duration=duration, window_size=winsize_FR, overlap=overlap_FR)
-
-        FR_inh_norm = (FR_inh/winsize_FR)/N_tot[3][1]
-        FR_exc_norm = (FR_exc/winsize_FR)/N_tot[3][0]
-
-        # envelope of bursts
-        FR_exc_envelope = (FR_exc_norm > 10)
-
-        # get number of bursts
-        N_exc = N_tot[3][0]
-        N_inh = N_tot[3][1]
-        tn_exc = int(N_exc*0.1)
-        tn_inh = int(N_inh*0.1)
-        bnum = 0
-        spk_cnt_per_burst = 0
-        flag = False
-        if t_exc.size > 0:
-            tval_p = t_exc[0]
-            spk_cnt_per_burst += 1
-            for tval_c in t_exc[1:]:
-                if tval_c - tval_p <= td:   # spikes are close, is it a burst?
-                    if flag:    # we already adjusted the burst counter, continue
-                        continue
-                    spk_cnt_per_burst += 1
-
-                    if spk_cnt_per_burst >= tn_exc:
-                        bnum += 1
-                        flag = True
-                else:   # we take a large step, the spikes are too spread out, new burst?
-                    spk_cnt_per_burst = 0
-                    flag = False
-                tval_p = tval_c
-        bnums_noICAN.append(bnum)
-        # num_bursts = (np.convolve([-10, 0, 10], FR_exc_envelope)>0).sum()//2
-
-        # get total burst duration
-        dur_burst = np.count_nonzero(FR_exc_envelope)*dt/ms
-
-        # append both values
-        duration_noICAN.append([bnums_noICAN, dur_burst])
-
-        # count spikes after t_onset
-        t_stim = float(t_stim_dir.split("_")[1])*ms
-        spkcnt_exc = np.count_nonzero(t_exc >= t_stim)
-        spkcnt_inh = np.count_nonzero(t_inh >= t_stim)
-        spikes_cnt_noICAN.append([spkcnt_exc, spkcnt_inh])
-
-        print('[-]....Spikes exc: ', spkcnt_exc)
-        print('[-]....Spikes inh: ', spkcnt_inh)
-        if (t_exc.size>0):
-            print('[+]....Last spike: ', t_exc[-1].round(4), 'ms')
-        print()
+    xarr_noICAN = [res['xval'] for res in quantified['noICAN']]
+    bnums_noICAN = [res['bnum'] for res in quantified['noICAN']]
+    duration_noICAN = [[res['bnum'], res['dur_burst']] for res in quantified['noICAN']]
+    spikes_cnt_noICAN = [res['spkcnt'] for res in quantified['noICAN']]
 
     # sort the arrays
     idx_ICAN = np.argsort(xarr_ICAN)
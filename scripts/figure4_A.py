@@ -25,6 +25,10 @@ sys.path.insert(0, os.path.abspath(parent_dir))
 
 from src.freq_analysis import *
 from src.figure_plots_parameters import *
+from src.runfile import open_run
+
+# cached analysis stages; `python -m src.memo clear` invalidates them
+from src.memo import my_FR
 
 # ILLUSTRATOR STUFF
 mplb.rcParams['pdf.fonttype'] = 42
@@ -115,7 +119,7 @@ if __name__ == "__main__":
     fig4_dir = os.path.join(parent_dir, 'res_test_fig4', '10.0_nA', '0.00_1800.0_ms', '11-10-2022 15H02M22S')
     fig4_data = os.path.join(fig4_dir, 'data')
     fig4_currents = os.path.join(fig4_data, 'currents')
-    fig4_spikes = os.path.join(fig4_data, 'spikes')
+    fig4_run = open_run(fig4_dir)
 
     # Area names and sizes
     areas = [['EC_pyCAN', 'EC_inh'], ['DG_py', 'DG_inh'], ['CA3_pyCAN', 'CA3_inh'], ['CA1_pyCAN', 'CA1_inh']]
@@ -342,7 +346,7 @@ if __name__ == "__main__":
     # Load and plot the data (panel A)
     #------------------------
     print('[+] Loading theta rhythm...')
-    rhythm = np.loadtxt(os.path.join(fig4_data, 'order_param_mon_rhythm.txt'))
+    rhythm = fig4_run['order_param/rhythm']
 
     print('[>]....Plotting panel A - theta rhythm')
     ax_rhythm.plot(tv, rhythm/(np.max(rhythm)), ls='-', c='k', linewidth=1.2, rasterized=False, zorder=1)
@@ -368,10 +372,8 @@ if __name__ == "__main__":
             warnings.filterwarnings("ignore", category=UserWarning, append=1)
 
             # 10nA
-            i_exc = np.loadtxt(os.path.join(fig4_spikes, '{0}_spikemon_i.txt'.format(areas[area_idx][0])))
-            t_exc = np.loadtxt(os.path.join(fig4_spikes, '{0}_spikemon_t.txt'.format(areas[area_idx][0])))
-            i_inh = np.loadtxt(os.path.join(fig4_spikes, '{0}_spikemon_i.txt'.format(areas[area_idx][1])))
-            t_inh = np.loadtxt(os.path.join(fig4_spikes, '{0}_spikemon_t.txt'.format(areas[area_idx][1])))
+            i_exc, t_exc = fig4_run.spikes(areas[area_idx][0])
+            i_inh, t_inh = fig4_run.spikes(areas[area_idx][1])
 
         # fix the data
         i_exc = i_exc.astype(int)
@@ -23,6 +23,10 @@ sys.path.insert(0, os.path.abspath(parent_dir))
 
 from src.freq_analysis import *
 from src.figure_plots_parameters import *
+from src.runfile import open_run
+
+# cached analysis stages; `python -m src.memo clear` invalidates them
+from src.memo import my_FR, bandpower, PSD
 
 # get the root directory for the simulations
 root_cluster = os.path.join(parent_dir, 'results_cluster', 'results_fig4')
@@ -154,18 +158,15 @@ for osc_amp_dir in tqdm(osc_amplitude_dirs, desc='Computing the modulation index
 
         # load the data (spikes) for the CA1 E-group
         curr_data_dir = os.path.join(curr_sim_dir, 'data')
-        curr_spikes_dir = os.path.join(curr_data_dir, 'spikes')
+        curr_run = open_run(curr_sim_dir)
         # print('[L5]-----data: ', curr_data_dir)
-        # print('[L6]------spikes: ', curr_spikes_dir)
 
         with warnings.catch_warnings():
             warnings.filterwarnings("ignore", category=UserWarning, append=1)
 
-            if len([entry for entry in os.listdir(curr_spikes_dir) if os.path.isfile(os.path.join(curr_spikes_dir, entry))]) == 16:
-                i_exc = np.loadtxt(os.path.join(curr_spikes_dir, 'CA1_pyCAN_spikemon_i.txt'))
-                t_exc = np.loadtxt(os.path.join(curr_spikes_dir, 'CA1_pyCAN_spikemon_t.txt'))
-                i_inh = np.loadtxt(os.path.join(curr_spikes_dir, 'CA1_inh_spikemon_i.txt'))
-                t_inh = np.loadtxt(os.path.join(curr_spikes_dir, 'CA1_inh_spikemon_t.txt'))
+            if len([name for name in curr_run.keys() if name.startswith('spikes/')]) == 16:
+                i_exc, t_exc = curr_run.spikes('CA1_pyCAN')
+                i_inh, t_inh = curr_run.spikes('CA1_inh')
             else:
                 print("[!] Warning: files missing!", "osc_amp: ", curr_osc_amp, " stim_amp: ", curr_stim_amp)
                 continue
@@ -3,26 +3,28 @@
 # OS stuff
 import os
 import sys
-import warnings
+import argparse
 from pathlib import Path
-from tqdm import tqdm
 
 # Computational stuff
 import numpy as np
-import matplotlib as mplb
-import matplotlib.pyplot as plt
-from matplotlib.gridspec import GridSpecFromSubplotSpec
-
-# TensorPAC
-from tensorpac import Pac
-from tensorpac.utils import PSD
 
 # Other scripts and my stuff
 script_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = Path(script_dir).parent
 sys.path.insert(0, os.path.abspath(parent_dir))
 
-from src.freq_analysis import *
+from src import pac_sweep
+
+parser = argparse.ArgumentParser(description='Precompute the figure 4 heatmaps (MI, theta/gamma power)')
+
+parser.add_argument('-w', '--workers',
+                    nargs='?',
+                    type=int,
+                    default=None,
+                    help='Number of worker processes (default: all cores)')
+
+args = parser.parse_args()
 
 # get the root directory for the simulations
 root_cluster = os.path.join(parent_dir, 'results_cluster', 'results_fig4_ext')
@@ -68,22 +70,10 @@ stim_amps = np.array(stim_amps)
 
 # make a meshgrid for plotting heatmaps
 X, Y = np.meshgrid(osc_amps, stim_amps)
-# MI_heatmap_E = np.zeros(X.shape)
-# MI_heatmap_I = np.zeros(X.shape)
-MI_heatmap_E = np.zeros((len(osc_amps), len(stim_amps)))
-MI_heatmap_I = np.zeros((len(osc_amps), len(stim_amps)))
-
-# peak frequencies
-peak_freqs_inh = []
-peak_freqs_exc = []
 
-# theta / gamma power matrices
+# theta / gamma bands
 theta_band = [3, 9]
 gamma_band = [40, 80]
-theta_heatmap_E = np.zeros((len(osc_amps), len(stim_amps)))
-theta_heatmap_I = np.zeros((len(osc_amps), len(stim_amps)))
-gamma_heatmap_E = np.zeros((len(osc_amps), len(stim_amps)))
-gamma_heatmap_I = np.zeros((len(osc_amps), len(stim_amps)))
 
 # noise - uniform function instead [min/max]
 curr_state = np.random.get_state() # get current state
@@ -91,22 +81,14 @@ np.random.seed(42) # fix the noise - reproducibility
 noise = np.random.uniform(0, 10, int((duration-winsize_FR)*fs_FR)+2) # change max noise value
 np.random.set_state(curr_state) # resume state
 
-# Make a PAC object
-f_pha_PAC = theta_band
-f_amp_PAC = gamma_band
-pac_obj = Pac(idpac=(2, 0, 0), f_pha=f_pha_PAC, f_amp=f_amp_PAC)
-
-# iterate over oscillator amplitudes
-for osc_amp_dir in tqdm(osc_amplitude_dirs, desc='Computing the modulation index...'):
+# gather the runs of the sweep: osc_<amp>/<stim>_nA/<phase>_<t_stim>_ms/<sim>
+runs = []
+for osc_amp_dir in osc_amplitude_dirs:
     curr_osc_amp = float(osc_amp_dir.split('_')[1])
-    idx_osc_amp = np.where(osc_amps == curr_osc_amp) # index for heatmap
-
-    # if curr_osc_amp < 0.17:
-    #     continue
+    idx_osc_amp = np.where(osc_amps == curr_osc_amp)[0][0] # index for heatmap
 
     # one step in
     curr_osc_dir = os.path.join(root_cluster, osc_amp_dir)
-    print('osc: ', osc_amp_dir)
 
     # iterate over stimulation amplitudes
     stim_amp_dirs = [dirname for dirname in sorted(os.listdir(curr_osc_dir)) if os.path.isdir(os.path.join(curr_osc_dir, dirname))]
@@ -116,147 +98,35 @@ for osc_amp_dir in tqdm(osc_amplitude_dirs, desc='Computing the modulation index
             continue
 
         curr_stim_amp = float(stim_amp_dir.split('_')[0])
-        idx_stim_amp = np.where(stim_amps == curr_stim_amp) # index for heatmap
-
-        # one step in
-        curr_stim_dir = os.path.join(curr_osc_dir, stim_amp_dir)
+        idx_stim_amp = np.where(stim_amps == curr_stim_amp)[0][0] # index for heatmap
 
         # go through the stimulation directory
+        curr_stim_dir = os.path.join(curr_osc_dir, stim_amp_dir)
         stim_time_dir = next(os.walk(curr_stim_dir))[1][0]
         t_stim = float(stim_time_dir.split('_')[1]) # in ms
 
         # traverse the next directory too (simulation)
         curr_stim_time_dir = os.path.join(curr_stim_dir, stim_time_dir)
         sim_dir = next(os.walk(curr_stim_time_dir))[1][0]
-        curr_sim_dir = os.path.join(curr_stim_time_dir, sim_dir)
-
-        # load the data (spikes) for the CA1 E-group
-        curr_data_dir = os.path.join(curr_sim_dir, 'data')
-        curr_spikes_dir = os.path.join(curr_data_dir, 'spikes')
-        with warnings.catch_warnings():
-            warnings.filterwarnings("ignore", category=UserWarning, append=1)
-
-            if len([entry for entry in os.listdir(curr_spikes_dir) if os.path.isfile(os.path.join(curr_spikes_dir, entry))]) == 16:
-                i_exc = np.loadtxt(os.path.join(curr_spikes_dir, 'CA1_pyCAN_spikemon_i.txt'))
-                t_exc = np.loadtxt(os.path.join(curr_spikes_dir, 'CA1_pyCAN_spikemon_t.txt'))
-                i_inh = np.loadtxt(os.path.join(curr_spikes_dir, 'CA1_inh_spikemon_i.txt'))
-                t_inh = np.loadtxt(os.path.join(curr_spikes_dir, 'CA1_inh_spikemon_t.txt'))
-            else:
-                print("[!] Warning: files missing!", "osc_amp: ", curr_osc_amp, " stim_amp: ", curr_stim_amp)
-                continue
-
-        # Fix the timings -> from ms to sec
-        i_exc = i_exc.astype(int)
-        t_exc = t_exc*ms
-        i_inh = i_inh.astype(int)
-        t_inh = t_inh*ms
-
-        # get the firing rate (spikes-to-rates)
-        tv_inh_FR, FR_inh = my_FR(spikes=t_inh, duration=duration, window_size=winsize_FR, overlap=overlap_FR)
-        tv_exc_FR, FR_exc = my_FR(spikes=t_exc, duration=duration, window_size=winsize_FR, overlap=overlap_FR)
-
-        # Normalize the FRs
-        FR_inh_norm = (FR_inh/winsize_FR)/N_tot[3][1]
-        FR_exc_norm = (FR_exc/winsize_FR)/N_tot[3][0]
-
-        # Add noise
-        FR_inh_norm_noise = FR_inh_norm + noise
-        FR_exc_norm_noise = FR_exc_norm + noise
-
-        # get the post-stim indices
-        tlims_post = np.array([500, 5500]) + t_stim # avoid stim artifact | 5s window
-        tidx_post = np.logical_and(np.round(tv_exc_FR/ms,4)>tlims_post[0], np.round(tv_exc_FR/ms,4)<=tlims_post[1])
-
-        # Use the TensorPAC module to calculate the PSDs
-        psd_pac_inh = PSD(FR_inh_norm[np.newaxis,tidx_post], fs_FR)
-        psd_pac_exc = PSD(FR_exc_norm[np.newaxis,tidx_post], fs_FR)
-
-        # Theta band indices
-        f_theta_idxs = np.logical_and(psd_pac_inh.freqs>=theta_band[0], psd_pac_inh.freqs<=theta_band[1])
-        f_gamma_idxs = np.logical_and(psd_pac_inh.freqs>=gamma_band[0], psd_pac_inh.freqs<=gamma_band[1])
-
-        # Calculate peaks - can use argmax or np.argwhere(np.abs(x-x.max())<1e-6)
-        peaks_inh, props_inh = sig.find_peaks(psd_pac_inh.psd[0], prominence=1)
-        peaks_exc, props_exc = sig.find_peaks(psd_pac_exc.psd[0], prominence=1)
-
-        # Check if we have ~any~ peaks
-        if peaks_inh.size > 0:
-            # Filter out peaks lower than 10% of signal max
-            threshold_inh = psd_pac_inh.psd[0].max()*0.1
-            idx_peaks_inh_filt = psd_pac_inh.psd[0][peaks_inh] > threshold_inh
-            peaks_inh = peaks_inh[idx_peaks_inh_filt]
-
-            # All peaks to theta peaks
-            idx_theta_peaks = np.argwhere(np.logical_and(psd_pac_inh.freqs[peaks_inh]>=theta_band[0], psd_pac_inh.freqs[peaks_inh]<=theta_band[1]))
-
-            # Idx of max theta power
-            idx_max_theta_peak = np.argmax(psd_pac_inh.psd[0][peaks_inh[idx_theta_peaks]])
-
-            # Which frequency is the max?
-            peak_theta_freq_inh = psd_pac_inh.freqs[peaks_inh[idx_theta_peaks[idx_max_theta_peak]]].tolist()
-
-            # Find peak frequency
-            # peak_freq_inh = psd_pac_inh.freqs[peaks_inh][np.argwhere(psd_pac_inh.psd[0][peaks_inh] == psd_pac_inh.psd[0][peaks_inh].max())].squeeze().tolist()
-
-            # Add to the list for later (hist calc)
-            peak_freqs_inh.extend(peak_theta_freq_inh)
-
-        if peaks_exc.size > 0:
-            # Filter out peaks lower than 10% of signal max
-            threshold_exc = psd_pac_exc.psd[0].max()*0.1
-            idx_peaks_exc_filt = psd_pac_exc.psd[0][peaks_exc] > threshold_exc
-            peaks_exc = peaks_exc[idx_peaks_exc_filt]
-
-            # All peaks to theta peaks
-            idx_theta_peaks = np.argwhere(np.logical_and(psd_pac_exc.freqs[peaks_exc]>=theta_band[0], psd_pac_exc.freqs[peaks_exc]<=theta_band[1]))
-
-            # Idx of max theta power
-            idx_max_theta_peak = np.argmax(psd_pac_exc.psd[0][peaks_exc[idx_theta_peaks]])
-
-            # Which frequency is the max?
-            peak_theta_freq_exc = psd_pac_exc.freqs[peaks_exc[idx_theta_peaks[idx_max_theta_peak]]].tolist()
-
-            # Find peak frequency
-            # peak_freq_exc = psd_pac_exc.freqs[peaks_exc][np.argwhere(psd_pac_exc.psd[0][peaks_exc] == psd_pac_exc.psd[0][peaks_exc].max())].squeeze().tolist()
-
-            # Add to the list for later (hist calc)
-            peak_freqs_exc.extend(peak_theta_freq_exc)
-
-        # Print peak frequencies
-        print("="*24)
-        if (peaks_inh.size > 0):
-            print("Inh. Peak Freqs: [", psd_pac_inh.freqs[peaks_inh], "] Hz")
-
-        if (peaks_inh.size > 0):
-            print("Exc. Peak Freqs: [", psd_pac_exc.freqs[peaks_exc], "] Hz")
-        print("="*24, "\n")
-
-        # if there is theta activity
-        theta_flag_inh = np.any(np.isin(psd_pac_inh.freqs[peaks_inh], psd_pac_inh.freqs[f_theta_idxs], assume_unique=True))
-        theta_flag_exc = np.any(np.isin(psd_pac_exc.freqs[peaks_exc], psd_pac_exc.freqs[f_theta_idxs], assume_unique=True))
-
-        # if there is gamma activity
-        gamma_flag_inh = np.any(np.isin(psd_pac_inh.freqs[peaks_inh], psd_pac_inh.freqs[f_gamma_idxs], assume_unique=True))
-        gamma_flag_exc = np.any(np.isin(psd_pac_exc.freqs[peaks_exc], psd_pac_exc.freqs[f_gamma_idxs], assume_unique=True))
-
-        # Calculate modulation index
-        MI_I = pac_obj.filterfit(fs_FR, FR_inh_norm_noise[np.newaxis, tidx_post])
-        MI_E = pac_obj.filterfit(fs_FR, FR_exc_norm_noise[np.newaxis, tidx_post])
 
-        # Calculate theta/gamma power (post-stim)
-        theta_band_pow_inh = bandpower(FR_inh_norm[np.newaxis, tidx_post], fs_FR, theta_band, window_sec=1., overlap=0.9, relative=False)
-        theta_band_pow_exc = bandpower(FR_exc_norm[np.newaxis, tidx_post], fs_FR, theta_band, window_sec=1., overlap=0.9, relative=False)
-        gamma_band_pow_inh = bandpower(FR_inh_norm[np.newaxis, tidx_post], fs_FR, gamma_band, window_sec=1., overlap=0.9, relative=False)
-        gamma_band_pow_exc = bandpower(FR_exc_norm[np.newaxis, tidx_post], fs_FR, gamma_band, window_sec=1., overlap=0.9, relative=False)
+        runs.append({'dir':os.path.join(curr_stim_time_dir, sim_dir), 'index':(idx_osc_amp, idx_stim_amp), 't_stim':t_stim*ms})
+
+# compute the MI / theta / gamma heatmaps of the CA1 E-I populations in one pass
+res = pac_sweep.precompute(runs, grid_shape=(len(osc_amps), len(stim_amps)),
+                           groups=areas[3], N=N_tot[3], duration=duration,
+                           t_post=(500*ms, 5500*ms), # avoid stim artifact | 5s window
+                           window_size=winsize_FR, overlap=overlap_FR,
+                           theta_band=theta_band, gamma_band=gamma_band, noise=noise,
+                           workers=args.workers,
+                           cache=os.path.join(parent_dir, 'figures', 'fig4', 'data_ext', 'pac_sweep.npz'))
 
-        # Add the values to the heatmaps
-        MI_heatmap_I[idx_osc_amp, idx_stim_amp] = MI_I
-        MI_heatmap_E[idx_osc_amp, idx_stim_amp] = MI_E
+MI_heatmap_E, MI_heatmap_I = res['MI'][..., 0], res['MI'][..., 1]
+theta_heatmap_E, theta_heatmap_I = res['theta'][..., 0], res['theta'][..., 1]
+gamma_heatmap_E, gamma_heatmap_I = res['gamma'][..., 0], res['gamma'][..., 1]
 
-        theta_heatmap_I[idx_osc_amp, idx_stim_amp] = theta_band_pow_inh
-        gamma_heatmap_I[idx_osc_amp, idx_stim_amp] = gamma_band_pow_inh
-        theta_heatmap_E[idx_osc_amp, idx_stim_amp] = theta_band_pow_exc
-        gamma_heatmap_E[idx_osc_amp, idx_stim_amp] = gamma_band_pow_exc
+# peak frequencies (theta)
+peak_freqs_exc = res['theta_peak'][:, 0][~np.isnan(res['theta_peak'][:, 0])]
+peak_freqs_inh = res['theta_peak'][:, 1][~np.isnan(res['theta_peak'][:, 1])]
 
 
 # Done with the iterations
@@ -22,6 +22,10 @@ sys.path.insert(0, os.path.abspath(parent_dir))
 
 from src.freq_analysis import *
 from src.figure_plots_parameters import *
+from src.runfile import open_run
+
+# cached analysis stages; `python -m src.memo clear` invalidates them
+from src.memo import my_FR, PSD
 
 # Set font to Arial -- is this working?
 plt.rcParams['font.family'] = 'sans-serif'
@@ -219,6 +223,7 @@ if __name__ == "__main__":
 
     for G_curr, panel_label, results_dir_curr, t_stim in zip(G_outer_figure, ['A.', 'B.', 'C.', 'D.'], analysis_dirs, [1850.3*ms, 1850.3*ms, 1934.4*ms, 1934.4*ms]):
         print('[*] Panel', panel_label)
+        run_curr = open_run(results_dir_curr)
 
         # Adjust limits
         t_lims_adj = [t_stim + 2050*ms, t_stim+4050*ms] # ms : calculate mean FRs in a 2-sec window
@@ -393,7 +398,7 @@ if __name__ == "__main__":
 
         print('[+] Plotting rhythm...')
 
-        rhythm = np.loadtxt(os.path.join(results_dir_curr, 'data', 'order_param_mon_rhythm.txt'))
+        rhythm = run_curr['order_param/rhythm']
         ax_rhythm.plot(tv, rhythm/(np.max(rhythm)), ls='-', c='k', linewidth=1., rasterized=False, zorder=1)
 
         # vertical lines at x-points
@@ -431,7 +436,7 @@ if __name__ == "__main__":
 
         if args.order_parameter:
             print('[+] Plotting order parameter...')
-            data = np.loadtxt(os.path.join(results_dir_curr, 'data', 'order_param_mon_coherence.txt'))
+            data = run_curr['order_param/coherence']
 
             # asymptote
             ax_common.hlines(y=1., xmin=0., xmax=duration, color='k', ls='--', linewidth=0.5, zorder=11)
@@ -441,7 +446,7 @@ if __name__ == "__main__":
 
         else:
             print('[+] Plotting phase...')
-            data = np.loadtxt(os.path.join(results_dir_curr, 'data', 'order_param_mon_phase.txt'))
+            data = np.array(run_curr['order_param/phase']) # modified below
 
             # data = (data + np.pi) % (2 * np.pi)
             data += (1.*(data<0)*2*np.pi)
@@ -466,10 +471,8 @@ if __name__ == "__main__":
 
                 # load t-i arrays for this area
                 print('[+] Loading the spikes for area:', area_name)
-                i_exc = np.loadtxt(os.path.join(results_dir_curr, 'data', 'spikes', '{0}_spikemon_i.txt'.format(fname[0])))
-                t_exc = np.loadtxt(os.path.join(results_dir_curr, 'data', 'spikes', '{0}_spikemon_t.txt'.format(fname[0])))
-                i_inh = np.loadtxt(os.path.join(results_dir_curr, 'data', 'spikes', '{0}_spikemon_i.txt'.format(fname[1])))
-                t_inh = np.loadtxt(os.path.join(results_dir_curr, 'data', 'spikes', '{0}_spikemon_t.txt'.format(fname[1])))
+                i_exc, t_exc = run_curr.spikes(fname[0])
+                i_inh, t_inh = run_curr.spikes(fname[1])
 
             i_exc = i_exc.astype(int)
             t_exc = t_exc*ms
@@ -588,7 +591,7 @@ if __name__ == "__main__":
 
             # load t-i arrays for this area
             print('[+] Loading the stimulation waveform:')
-            xstim = np.loadtxt(os.path.join(results_dir_curr, 'data', 'stim_input.txt'))
+            xstim = run_curr['stim_input']
 
         # stim onset
         ax_rhythm.scatter(x=t_stim, y=1.5, s=75, marker='v', edgecolors='white', facecolors='gray', rasterized=False, clip_on=False)
@@ -22,6 +22,11 @@ sys.path.insert(0, os.path.abspath(parent_dir))
 
 from src.freq_analysis import *
 from src.figure_plots_parameters import *
+from src.runfile import open_run
+from src import pac_sweep
+
+# cached analysis stages; `python -m src.memo clear` invalidates them
+from src.memo import PSD
 
 # ILLUSTRATOR STUFF
 plt.rcParams['pdf.fonttype'] = 42
@@ -245,18 +250,21 @@ if __name__ == "__main__":
     analysis_dirs.extend(results_trains_in_phase_B_dirs)
     analysis_dirs.extend(results_trains_out_of_phase_B_dirs)
 
-    # Theta power
-    theta_band_power = []
-
-    # Gamma power
-    gamma_band_power = []
-
-    # PAC
-    pac_obj = Pac(idpac=(2,0,0), f_pha=theta_band, f_amp=gamma_band)
-    PAC_metric = []
-
-    for G_curr, panel_label, results_dir_curr, t_stim in zip(G_outer_figure_nb, ['A.', 'B.', 'C.', 'D.'], analysis_dirs, [1850.3*ms, 1850.3*ms, 1934.4*ms, 1934.4*ms]):
+    # CA1 theta/gamma band power and PAC of the post-stim windows (t_stim, t_stim+2000 ms] (t_lims2 below) of all panels, in one pass
+    t_stims = [1850.3*ms, 1850.3*ms, 1934.4*ms, 1934.4*ms]
+    runs = [{'dir':results_dir, 'index':(cnt,), 't_stim':t_stim} for cnt, (results_dir, t_stim) in enumerate(zip(analysis_dirs, t_stims))]
+    res = pac_sweep.precompute(runs, grid_shape=(len(runs),),
+                               groups=areas[3], N=N_tot[3], duration=duration,
+                               t_post=(0*ms, 2000*ms),
+                               window_size=winsize_FR, overlap=overlap_FR,
+                               theta_band=theta_band, gamma_band=gamma_band, noise=noise)
+    theta_band_power = res['theta']
+    gamma_band_power = res['gamma']
+    PAC_metric = res['MI']
+
+    for G_curr, panel_label, results_dir_curr, t_stim in zip(G_outer_figure_nb, ['A.', 'B.', 'C.', 'D.'], analysis_dirs, t_stims):
         print('[*] Panel', panel_label)
+        run_curr = open_run(results_dir_curr)
 
         # Adjust limits
         t_lims_pre = [t_stim-2050*ms, t_stim-50*ms] # ms : pre-stim window [2s]
@@ -434,7 +442,7 @@ if __name__ == "__main__":
 
         print('[+] Plotting rhythm...')
 
-        rhythm = np.loadtxt(os.path.join(results_dir_curr, 'data', 'order_param_mon_rhythm.txt'))
+        rhythm = run_curr['order_param/rhythm']
         ax_rhythm.plot(tv, rhythm/(np.max(rhythm)), ls='-', c='k', linewidth=1., rasterized=False, zorder=1)
 
         # vertical lines at x-points
@@ -472,7 +480,7 @@ if __name__ == "__main__":
 
         if args.order_parameter:
             print('[+] Plotting order parameter...')
-            data = np.loadtxt(os.path.join(results_dir_curr, 'data', 'order_param_mon_coherence.txt'))
+            data = run_curr['order_param/coherence']
 
             # asymptote
             ax_common.hlines(y=1., xmin=0., xmax=duration, color='k', ls='--', linewidth=0.5, zorder=11)
@@ -482,7 +490,7 @@ if __name__ == "__main__":
 
         else:
             print('[+] Plotting phase...')
-            data = np.loadtxt(os.path.join(results_dir_curr, 'data', 'order_param_mon_phase.txt'))
+            data = np.array(run_curr['order_param/phase']) # modified below
 
             # data = (data + np.pi) % (2 * np.pi)
             data += (1.*(data<0)*2*np.pi)
@@ -507,10 +515,8 @@ if __name__ == "__main__":
 
                 # load t-i arrays for this area
                 print('[+] Loading the spikes for area:', area_name)
-                i_exc = np.loadtxt(os.path.join(results_dir_curr, 'data', 'spikes', '{0}_spikemon_i.txt'.format(fname[0])))
-                t_exc = np.loadtxt(os.path.join(results_dir_curr, 'data', 'spikes', '{0}_spikemon_t.txt'.format(fname[0])))
-                i_inh = np.loadtxt(os.path.join(results_dir_curr, 'data', 'spikes', '{0}_spikemon_i.txt'.format(fname[1])))
-                t_inh = np.loadtxt(os.path.join(results_dir_curr, 'data', 'spikes', '{0}_spikemon_t.txt'.format(fname[1])))
+                i_exc, t_exc = run_curr.spikes(fname[0])
+                i_inh, t_inh = run_curr.spikes(fname[1])
 
             i_exc = i_exc.astype(int)
             t_exc = t_exc*ms
@@ -578,51 +584,6 @@ if __name__ == "__main__":
             # curr_ax_rasters.text(x=xlims_rates[1]+50*ms, y=1.75*N_scaling+N_gap, s=r'$\mu_I$: {0:.1f} Hz'.format(FR_inh_mean), fontsize=fsize_xylabels, ha='left', color=c_inh, clip_on=False)
             # curr_ax_rasters.text(x=xlims_rates[1]+50*ms, y=N_scaling//2, s=r'$\mu_E$: {0:.1f} Hz'.format(FR_exc_mean), fontsize=fsize_xylabels, ha='left', color=c_exc, clip_on=False)
 
-            # calculate firing rates
-            print('[>] Computing firing rates...')
-            tv_inh_FR, FR_inh = my_FR(spikes=t_inh, duration=duration, window_size=winsize_FR, overlap=overlap_FR)
-            tv_exc_FR, FR_exc = my_FR(spikes=t_exc, duration=duration, window_size=winsize_FR, overlap=overlap_FR)
-
-            # # SAVE THE NON-NORMALIZED FR SIGNALS
-            # np.savetxt(os.path.join(results_dir_curr, 'data', 'FR_inh.txt'), FR_inh, fmt='%.8f')
-            # np.savetxt(os.path.join(results_dir_curr, 'data', 'tv_inh.txt'), tv_inh_FR, fmt='%.8f')
-            # np.savetxt(os.path.join(results_dir_curr, 'data', 'FR_exc.txt'), FR_exc, fmt='%.8f')
-            # np.savetxt(os.path.join(results_dir_curr, 'data', 'tv_exc.txt'), tv_exc_FR, fmt='%.8f')
-
-            # Normalize the FRs
-            FR_inh_norm = (FR_inh/winsize_FR)/N_inh
-            FR_exc_norm = (FR_exc/winsize_FR)/N_exc
-
-            # Add noise
-            FR_inh_norm_noise = FR_inh_norm + noise
-            FR_exc_norm_noise = FR_exc_norm + noise
-
-            # # Plot the FRs
-            # curr_ax_rates.plot(tv_inh_FR, FR_inh_norm+FR_exc_norm.max()+rates_gap, ls='-', linewidth=1.2, c=c_inh, label='inh', zorder=10, rasterized=False)
-            # curr_ax_rates.plot(tv_exc_FR, FR_exc_norm, ls='-', linewidth=1.2, c=c_exc, label='exc', zorder=10, rasterized=False)
-
-            # Analysis of FRs
-            print('[>] Analysis of FRs...')
-
-            # Calculate FR analysis windows
-            window_FR_exc_idx = np.logical_and(np.round(tv_exc_FR,4)>t_lims_post[0], np.round(tv_exc_FR,4)<=t_lims_post[1])
-            window_FR_inh_idx = np.logical_and(np.round(tv_inh_FR,4)>t_lims_post[0], np.round(tv_inh_FR,4)<=t_lims_post[1])
-
-            # Calculate theta/gamma band power (post-stim)
-            theta_band_pow_inh = bandpower(FR_inh_norm[np.newaxis, window_FR_inh_idx], fs_FR, theta_band, window_sec=1., overlap=overlap_FR, relative=False)
-            theta_band_pow_exc = bandpower(FR_exc_norm[np.newaxis, window_FR_exc_idx], fs_FR, theta_band, window_sec=1., overlap=overlap_FR, relative=False)
-            gamma_band_pow_inh = bandpower(FR_inh_norm[np.newaxis, window_FR_inh_idx], fs_FR, gamma_band, window_sec=1., overlap=overlap_FR, relative=False)
-            gamma_band_pow_exc = bandpower(FR_exc_norm[np.newaxis, window_FR_exc_idx], fs_FR, gamma_band, window_sec=1., overlap=overlap_FR, relative=False)
-
-            # Calculate modulation index
-            MI_I = pac_obj.filterfit(fs_FR, FR_inh_norm_noise[np.newaxis, window_FR_inh_idx]).squeeze()
-            MI_E = pac_obj.filterfit(fs_FR, FR_exc_norm_noise[np.newaxis, window_FR_exc_idx]).squeeze()
-
-            # Append to the lists
-            theta_band_power.append([theta_band_pow_exc, theta_band_pow_inh])
-            gamma_band_power.append([gamma_band_pow_exc, gamma_band_pow_inh])
-            PAC_metric.append([MI_E, MI_I])
-
 
 
         # axs[3][0].text(x=xlims_rates[1]+50*ms, y=ylims_rates[0]+150+FR_exc_norm.max()+rates_gap, s='Inhibitory', fontsize=fsize_legends, ha='left', color=c_inh, clip_on=False)
@@ -657,7 +618,7 @@ if __name__ == "__main__":
 
             # load t-i arrays for this area
             print('[+] Loading the stimulation waveform:')
-            xstim = np.loadtxt(os.path.join(results_dir_curr, 'data', 'stim_input.txt'))
+            xstim = run_curr['stim_input']
 
         # stim onset
         ax_rhythm.scatter(x=t_stim, y=1.5, s=75, marker='v', edgecolors='white', facecolors='gray', rasterized=False, clip_on=False)
@@ -700,8 +661,8 @@ if __name__ == "__main__":
         bar_axs.append(ax)
 
         # Barplot
-        bars_E = ax.bar(X*3, data_arr[3::4,0], color=c_exc)
-        bars_I = ax.bar(X*3+1, data_arr[3::4,1], color=c_inh)
+        bars_E = ax.bar(X*3, data_arr[:,0], color=c_exc)
+        bars_I = ax.bar(X*3+1, data_arr[:,1], color=c_inh)
 
         # # Add values on top of each bar
         # for bars in ax.containers:
@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import os
+import sys
 import json
+from pathlib import Path
 
 import numpy as np
 import matplotlib.pyplot as plt
@@ -14,56 +17,13 @@ from matplotlib.lines import Line2D
 from matplotlib import font_manager as fm
 from matplotlib.colors import ListedColormap, LinearSegmentedColormap
 
-fontprops = fm.FontProperties(size=12, family='monospace')
-
-
-def my_FR(spikes: np.ndarray,
-            duration: int,
-            window_size: float,
-            overlap: float) -> (np.ndarray, np.ndarray):
-    """
-    Compute the firing rate using a windowed moving average.
-
-    Parameters
-    ----------
-    spikes: numpy.ndarray
-        The spike times (Brian2 format, in ms)
-    duration: int
-        The duration of the recording (in seconds)
-    window_size: float
-        Width of the moving average window (in seconds)
-    overlap: float
-        Desired overlap between the windows (percentage, in [0., 1.))
-
-    Returns
-    -------
-    t: numpy.ndarray
-        Array of time values for the computed firing rate. These are the window centers.
-    FR: numpy.ndarray
-        Spikes per window (needs to be normalized)
-    """
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = Path(script_dir).parent
+sys.path.insert(0, os.path.abspath(parent_dir))
 
-    # Calculate new sampling times
-    win_step = window_size * round(1. - overlap, 4)
-    # fs_n = int(1/win_step)
+from src.freq_analysis import my_FR
 
-    # First center is at the middle of the first window
-    c0 = window_size/2
-    cN = duration-c0
-
-    # centers
-    centers = np.arange(c0, cN+win_step, win_step)
-
-    # Calculate windowed FR
-    counts = []
-    for center in centers:
-        cl = center - c0
-        ch = center + c0
-        spike_cnt = np.count_nonzero(np.where((spikes >= cl) & (spikes < ch)))
-        counts.append(spike_cnt)
-
-    # return centers and spike counts per window
-    return centers, np.array(counts)
+fontprops = fm.FontProperties(size=12, family='monospace')
 
 
 def my_specgram(signal: np.ndarray,
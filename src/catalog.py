@@ -0,0 +1,272 @@
+"""
+Implementation Notes
+--------------------------------------------------------------------------------
+    | 1: The catalog is a SQLite database that indexes results directories (the ones holding parameters_bak.json). Indexing is incremental: a run is only (re)read when its parameters or results file changed since it was indexed.
+    | 2: Parameters are flattened to dotted keys ("Kuramoto.gain_rhythm", "stimulation.I") and stored one row per value; lists of scalars get one row per element under the same key, so a query on a list matches if any element matches.
+    | 3: Summary metrics are computed once, at indexing time: the mean rate of every population (spikes / neurons / duration; from the spike counts of the run information for runs without rasters), the dominant frequency of the CA1 excitatory population rate and the run time (run files only). The duration is the simulated time, which is shorter than the configured one for runs aborted by the watchdog; the abort reason is stored as well.
+    | 4: Queries are {key: value} or {key: (low, high)} conditions, combined with AND; keys are parameter keys or metric columns (duration, run_time, rhythm_freq, aborted, rate.<group>).
+"""
+
+import os
+import sys
+import json
+import sqlite3
+import argparse
+import numpy as np
+
+from src.runfile import open_run, RUN_FNAME
+
+CATALOG_FNAME = 'catalog.sqlite'
+METRICS = ['duration', 'run_time', 'rhythm_freq', 'aborted']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE,
+    mtime REAL,
+    duration REAL,
+    run_time REAL,
+    rhythm_freq REAL,
+    aborted TEXT,
+    parameters TEXT
+);
+CREATE TABLE IF NOT EXISTS params (run_id INTEGER, key TEXT, value REAL, text TEXT);
+CREATE TABLE IF NOT EXISTS rates (run_id INTEGER, grp TEXT, rate REAL);
+CREATE INDEX IF NOT EXISTS params_key ON params (key, value);
+CREATE INDEX IF NOT EXISTS params_key_text ON params (key, text);
+CREATE INDEX IF NOT EXISTS rates_grp ON rates (grp, rate);
+"""
+
+
+def flatten(data, prefix=''):
+    """ Yields the (dotted key, scalar value) pairs of a nested parameters dictionary (see note #2) """
+    for key, val in data.items():
+        name = prefix + str(key)
+        if isinstance(val, dict):
+            yield from flatten(val, name+'.')
+        elif isinstance(val, (list, tuple)):
+            for item in val:
+                if not isinstance(item, (dict, list, tuple)):
+                    yield name, item
+        else:
+            yield name, val
+
+
+def dominant_frequency(x, fs, band=(1., 100.)):
+    """ Frequency [Hz] of the largest spectral peak of signal x within `band` """
+    x = np.asarray(x, dtype=float)
+    if len(x) < 2:
+        return None
+    freqs = np.fft.rfftfreq(len(x), 1./fs)
+    power = np.abs(np.fft.rfft(x - x.mean()))**2
+    sel = (freqs >= band[0]) & (freqs <= band[1])
+    if not sel.any():
+        return None
+    return float(freqs[sel][np.argmax(power[sel])])
+
+
+def run_metrics(dirname):
+    """ Summary metrics of a run directory (see note #3) """
+    run = open_run(dirname)
+    sim = run.parameters.get('simulation', {})
+    duration = run.info.get('t_end', sim.get('duration', None)) # shorter if aborted by the watchdog
+    metrics = {'duration':duration, 'run_time':run.info.get('run_time', None), 'rhythm_freq':None, 'rates':{},
+               'aborted':run.info.get('watchdog', {}).get('reason', None)}
+
+    for name in run.keys():
+        if name.startswith('spikes/') and name.endswith('/t'):
+            group = name.split('/')[1]
+            if 'positions/'+group in run and duration:
+                N = len(run['positions/'+group])
+                metrics['rates'][group] = len(run[name])/N/duration if N else 0.
+
+    # runs without spike rasters only store the spike counts
+    for name, count in run.info.get('n_spikes', {}).items():
+        group = name.replace('_spikemon', '')
+        if group not in metrics['rates'] and 'positions/'+group in run and duration:
+            N = len(run['positions/'+group])
+            metrics['rates'][group] = count/N/duration if N else 0.
+
+    if 'rate_CA1_E' in run and 'dt' in sim:
+        metrics['rhythm_freq'] = dominant_frequency(run['rate_CA1_E'], 1./sim['dt'])
+
+    return metrics
+
+
+def run_mtime(dirname):
+    """ Latest modification time of the files describing a run """
+    fnames = [os.path.join(dirname, 'parameters_bak.json'), os.path.join(dirname, 'data', RUN_FNAME)]
+    return max(os.path.getmtime(fname) for fname in fnames if os.path.isfile(fname))
+
+
+class Catalog:
+    """ SQLite index of simulation runs (see notes #1-#4) """
+
+    def __init__(self, fname):
+        self.fname = fname
+        self.db = sqlite3.connect(fname)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, dirname):
+        """ Indexes a single run directory, replacing an older entry of the same path """
+        dirname = os.path.abspath(dirname)
+        with open(os.path.join(dirname, 'parameters_bak.json')) as fin:
+            parameters = json.load(fin)
+        metrics = run_metrics(dirname)
+
+        with self.db:
+            self.remove(dirname)
+            cur = self.db.execute('INSERT INTO runs (path, mtime, duration, run_time, rhythm_freq, aborted, parameters) VALUES (?,?,?,?,?,?,?)',
+                                  (dirname, run_mtime(dirname), metrics['duration'], metrics['run_time'], metrics['rhythm_freq'], metrics['aborted'], json.dumps(parameters)))
+            run_id = cur.lastrowid
+
+            rows = []
+            for key, val in flatten(parameters):
+                if isinstance(val, (bool, int, float)):
+                    rows.append((run_id, key, float(val), None))
+                elif val is not None:
+                    rows.append((run_id, key, None, str(val)))
+            self.db.executemany('INSERT INTO params VALUES (?,?,?,?)', rows)
+            self.db.executemany('INSERT INTO rates VALUES (?,?,?)', [(run_id, grp, rate) for grp, rate in metrics['rates'].items()])
+
+    def remove(self, dirname):
+        """ Drops a run from the catalog """
+        row = self.db.execute('SELECT id FROM runs WHERE path=?', (os.path.abspath(dirname),)).fetchone()
+        if row is not None:
+            for table, col in [('params', 'run_id'), ('rates', 'run_id'), ('runs', 'id')]:
+                self.db.execute('DELETE FROM {0} WHERE {1}=?'.format(table, col), row)
+
+    def index(self, root, verbose=True):
+        """ Walks `root` and indexes new or modified runs; entries of deleted runs are dropped. Returns the number of (re)indexed runs """
+        known = dict(self.db.execute('SELECT path, mtime FROM runs'))
+        found, cnt = set(), 0
+        for dirname, dirs, files in os.walk(root):
+            if 'parameters_bak.json' not in files:
+                continue
+            dirname = os.path.abspath(dirname)
+            found.add(dirname)
+            if known.get(dirname, None) == run_mtime(dirname):
+                continue
+            try:
+                self.add(dirname)
+                cnt += 1
+                if verbose:
+                    print('[+] Indexed', dirname)
+            except Exception as e:
+                print('[-] Skipping {0}: {1}'.format(dirname, e))
+
+        root = os.path.abspath(root)
+        with self.db:
+            for dirname in known:
+                if os.path.commonpath([dirname, root]) == root and dirname not in found: # under root, not a sibling with the same prefix
+                    self.remove(dirname)
+
+        return cnt
+
+    def query(self, conditions=None, order_by=None):
+        """ Returns the runs that satisfy all `conditions` as a list of dictionaries (path, metrics, rates, parameters) """
+        where, args = [], []
+        for key, val in (conditions or {}).items():
+            if key in METRICS:
+                column, sub = key, None
+            elif key.startswith('rate.'):
+                column, sub = 'rate', 'SELECT run_id FROM rates WHERE grp=? AND '
+                args.append(key[len('rate.'):])
+            else:
+                column = 'text' if isinstance(val, str) else 'value'
+                sub = 'SELECT run_id FROM params WHERE key=? AND '
+                args.append(key)
+
+            if isinstance(val, (tuple, list)):
+                cond = column + ' BETWEEN ? AND ?'
+                args.extend(val)
+            else:
+                cond = column + '=?'
+                args.append(val)
+
+            where.append(cond if sub is None else 'id IN (' + sub + cond + ')')
+
+        sql = 'SELECT id, path, duration, run_time, rhythm_freq, aborted, parameters FROM runs'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        if order_by in METRICS:
+            sql += ' ORDER BY ' + order_by
+        else:
+            sql += ' ORDER BY path'
+
+        runs = []
+        for run_id, path, duration, run_time, rhythm_freq, aborted, parameters in self.db.execute(sql, args).fetchall():
+            rates = dict(self.db.execute('SELECT grp, rate FROM rates WHERE run_id=?', (run_id,)))
+            runs.append({'path':path, 'duration':duration, 'run_time':run_time, 'rhythm_freq':rhythm_freq, 'aborted':aborted,
+                         'rates':rates, 'parameters':json.loads(parameters)})
+        return runs
+
+
+def parse_condition(cond):
+    """ Parses 'key=value' or 'key=low:high' command-line conditions """
+    key, val = cond.split('=', 1)
+
+    def number(s):
+        try:
+            return float(s)
+        except ValueError:
+            return s
+
+    if ':' in val:
+        low, high = val.split(':', 1)
+        return key, (number(low), number(high))
+    return key, number(val)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Index and query simulation results')
+
+    parser.add_argument('command', choices=['index', 'query'],
+                        help='index a results directory or query the catalog')
+
+    parser.add_argument('-rd', '--results_dir',
+                        nargs='?',
+                        type=str,
+                        default='results',
+                        help='Results directory to index')
+
+    parser.add_argument('-db', '--database',
+                        nargs='?',
+                        type=str,
+                        default=None,
+                        help='Catalog file; defaults to <results_dir>/' + CATALOG_FNAME)
+
+    parser.add_argument('-w', '--where',
+                        nargs='*',
+                        default=[],
+                        help='Conditions key=value or key=low:high, e.g. Kuramoto.gain_rhythm=0.1:0.3 stimulation.I=10')
+
+    parser.add_argument('-o', '--order_by',
+                        nargs='?',
+                        type=str,
+                        default=None,
+                        help='Sort by a metric (duration, run_time, rhythm_freq)')
+
+    args = parser.parse_args()
+    dbname = args.database or os.path.join(args.results_dir, CATALOG_FNAME)
+
+    with Catalog(dbname) as cat:
+        if args.command == 'index':
+            cnt = cat.index(args.results_dir)
+            print('[+] Indexed {0} runs in {1}'.format(cnt, dbname))
+        else:
+            runs = cat.query(dict(parse_condition(cond) for cond in args.where), args.order_by)
+            for run in runs:
+                rates = ' '.join('{0}: {1:.2f}'.format(grp, rate) for grp, rate in sorted(run['rates'].items()))
+                freq = '{0:.2f} Hz'.format(run['rhythm_freq']) if run['rhythm_freq'] is not None else '-'
+                print(run['path'], '|', freq, '|', rates)
+            print('[+] {0} runs'.format(len(runs)), file=sys.stderr)
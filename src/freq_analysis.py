@@ -150,6 +150,142 @@ def power_to_db(spectrum: np.ndarray,
     return sxx
 
 
+def window_centers(duration: float,
+                   window_size: float,
+                   overlap: float) -> np.ndarray:
+    """
+    Centers of the sliding windows used by my_FR().
+
+    Parameters
+    ----------
+    duration: float
+        The duration of the recording (in -unitless- seconds)
+    window_size: float
+        Width of the moving average window (in -unitless- seconds)
+    overlap: float
+        Desired overlap between the windows (percentage in [0., 1.))
+
+    Returns
+    -------
+    centers: numpy.ndarray
+        Window centers; window k spans [centers[k]-window_size/2, centers[k]+window_size/2)
+    """
+    # Calculate new sampling times
+    win_step = window_size * round(1. - overlap, 4)
+
+    # First center is at the middle of the first window
+    c0 = window_size/2
+    cN = duration-c0
+
+    return np.arange(c0, cN+win_step, win_step)
+
+
+def sliding_spike_counts(spikes: np.ndarray,
+                         duration: float,
+                         window_size: float,
+                         overlap: float,
+                         labels: np.ndarray = None,
+                         n_labels: int = None) -> (np.ndarray, np.ndarray):
+    """
+    Spike counts in sliding windows for one or many spike trains in a single pass.
+
+    Every spike is mapped to the contiguous range of windows that contain it
+    (two binary searches on the window edges); the counts are the cumulative
+    sum of a difference array. The cost is O(spikes * log(windows) + labels * windows)
+    instead of O(spikes * windows) for a loop over the windows, and the edges
+    are compared exactly as in the loop (left <= t < right).
+
+    Parameters
+    ----------
+    spikes: numpy.ndarray
+        The spike times (in -unitless- seconds), in any order
+    duration: float
+        The duration of the recording (in -unitless- seconds)
+    window_size: float
+        Width of the moving average window (in -unitless- seconds)
+    overlap: float
+        Desired overlap between the windows (percentage in [0., 1.))
+    labels: numpy.ndarray
+        Optional train of every spike (e.g. population or neuron index, in [0, n_labels))
+    n_labels: int
+        Number of trains (default: labels.max()+1)
+
+    Returns
+    -------
+    t: numpy.ndarray
+        Array of time values for the computed firing rate. These are the window centers.
+    counts: numpy.ndarray
+        Spikes per window; shape (windows,) without labels, (n_labels, windows) with labels
+    """
+    spikes = np.asarray(spikes, dtype=float).ravel()
+    duration = np.asarray(duration, dtype=float).item()
+    window_size = np.asarray(window_size, dtype=float).item()
+
+    centers = window_centers(duration, window_size, overlap)
+    c0 = window_size/2
+    left = centers - c0
+    right = centers + c0
+    N_win = len(centers)
+
+    # windows [first, last] containing every spike
+    first = np.searchsorted(right, spikes, side='right')
+    last = np.searchsorted(left, spikes, side='right')
+    valid = first < last
+
+    if labels is None:
+        diff = np.bincount(first[valid], minlength=N_win+1) - np.bincount(last[valid], minlength=N_win+1)
+        return centers, np.cumsum(diff)[:N_win]
+
+    labels = np.asarray(labels, dtype=int).ravel()
+    if n_labels is None:
+        n_labels = int(labels.max(initial=-1))+1
+    base = labels[valid]*(N_win+1)
+    size = n_labels*(N_win+1)
+    diff = np.bincount(base+first[valid], minlength=size) - np.bincount(base+last[valid], minlength=size)
+    return centers, np.cumsum(diff.reshape(n_labels, N_win+1), axis=1)[:, :N_win]
+
+
+def binned_spike_counts(counts: np.ndarray,
+                        bin_size: float,
+                        window_size: float,
+                        overlap: float) -> (np.ndarray, np.ndarray):
+    """
+    Spike counts in sliding windows from spike counts recorded in fixed time bins
+    (model/rate_bins.py), with the same windows as sliding_spike_counts().
+
+    Every window sums the bins that start inside it; the result is exact when the
+    window edges are multiples of the bin size (e.g. 0.5 ms bins, 5 ms windows, 90% overlap).
+
+    Parameters
+    ----------
+    counts: numpy.ndarray
+        Spike counts per bin; time bins on the last axis
+    bin_size: float
+        Width of the time bins (in -unitless- seconds)
+    window_size: float
+        Width of the moving average window (in -unitless- seconds)
+    overlap: float
+        Desired overlap between the windows (percentage in [0., 1.))
+
+    Returns
+    -------
+    t: numpy.ndarray
+        Array of time values for the computed firing rate. These are the window centers.
+    counts: numpy.ndarray
+        Spikes per window; same leading axes as the input counts
+    """
+    counts = np.asarray(counts)
+    N_bins = counts.shape[-1]
+    centers = window_centers(N_bins*bin_size, window_size, overlap)
+
+    # bins [left, right) of every window
+    left = np.clip(np.round((centers - window_size/2)/bin_size).astype(int), 0, N_bins)
+    right = np.clip(np.round((centers + window_size/2)/bin_size).astype(int), 0, N_bins)
+
+    cumulative = np.concatenate((np.zeros(counts.shape[:-1]+(1,), dtype=np.int64), np.cumsum(counts, axis=-1, dtype=np.int64)), axis=-1)
+    return centers, cumulative[..., right] - cumulative[..., left]
+
+
 def my_FR(spikes: np.ndarray,
             duration: int,
             window_size: float,
@@ -175,28 +311,7 @@ def my_FR(spikes: np.ndarray,
     FR: numpy.ndarray
         Spikes per window (needs to be normalized)
     """
-
-    # Calculate new sampling times
-    win_step = window_size * round(1. - overlap, 4)
-    # fs_n = int(1/win_step)
-
-    # First center is at the middle of the first window
-    c0 = window_size/2
-    cN = duration-c0
-
-    # centers
-    centers = np.arange(c0, cN+win_step, win_step)
-
-    # Calculate windowed FR
-    counts = []
-    for center in centers:
-        cl = center - c0
-        ch = center + c0
-        spike_cnt = np.count_nonzero(np.where((spikes >= cl) & (spikes < ch)))
-        counts.append(spike_cnt)
-
-    # return centers and spike counts per window
-    return centers, np.array(counts)
+    return sliding_spike_counts(spikes, duration, window_size, overlap)
 
 
 def my_specgram(signal: np.ndarray,
@@ -324,36 +439,133 @@ def my_modulation_index(sig_phase: np.ndarray,
         Kullback-Leibler distance.
     """
 
-    # Make the bins
+    MI, dist_KL = modulation_index(sig_phase, sig_amp, nbins)
+
+    return float(MI), float(dist_KL)
+
+
+def phase_bins(sig_phase: np.ndarray,
+               nbins: int=18) -> np.ndarray:
+    """ Index of the phase bin ([-pi, pi) in nbins equal bins) of every sample; pi falls in the last bin """
     bin_edges = np.linspace(-np.pi, np.pi, nbins+1)
-    bin_centers = bin_edges[1:] - np.diff(bin_edges)/2
+    return np.clip(np.digitize(sig_phase, bin_edges)-1, 0, nbins-1)
 
-    # Allocate to bins using their indices
-    idx_bin = np.digitize(sig_phase, bin_edges)
-    bin_amp = np.zeros(nbins)
-    for bin in np.arange(nbins):
-        if np.any(idx_bin == bin):
-            bin_amp[bin] = np.mean(sig_amp[idx_bin == bin])
 
+def _kl_distance(bin_amp: np.ndarray,
+                 nbins: int) -> (np.ndarray, np.ndarray):
+    """ MI and KL distance from the mean amplitude per phase bin (last axis) """
     # Hist. normalization step - get P(j) vals
-    P_amp = bin_amp / np.sum(bin_amp)
-
-    # Kullback-Leibler distance & modulation index (MI)
-    Q_amp = np.ones(nbins) / nbins
+    with np.errstate(invalid='ignore', divide='ignore'):
+        P_amp = bin_amp / np.sum(bin_amp, axis=-1, keepdims=True)
 
     # In the special case where observed probability in a bin is 0, this tweak
     # allows computing a meaningful KL distance nonetheless
-    P_amp[np.where(P_amp == 0)] = 1e-12
+    P_amp = np.where(P_amp > 0, P_amp, 1e-12)
 
-    # Kullback-Leibler distance
-    dist_KL = np.sum(P_amp * np.log(P_amp / Q_amp))
-
-    # Modulation Index
+    # Kullback-Leibler distance to the uniform distribution Q(j) = 1/nbins & modulation index (MI)
+    dist_KL = np.sum(P_amp * np.log(P_amp * nbins), axis=-1)
     MI = dist_KL / np.log(nbins)
 
     return MI, dist_KL
 
 
+def modulation_index(sig_phase: np.ndarray,
+                     sig_amp: np.ndarray,
+                     nbins: int=18) -> (np.ndarray, np.ndarray):
+    """
+    Batched Modulation Index (Tort et al., 2010) over stacked signals.
+
+    The samples are on the last axis; any leading axes (e.g. runs x populations
+    x windows) are computed in a single pass: the mean amplitude per phase bin
+    of every signal comes from one np.bincount over (signal, bin) indices.
+
+    Parameters
+    ----------
+    sig_phase: numpy.ndarray
+        The phase signals xfp(t), shape (..., samples)
+    sig_amp: numpy.ndarray
+        The amplitude signals xfA(t), same shape as sig_phase
+    nbins: int
+        Number of phase bins
+
+    Returns
+    -------
+    MI: numpy.ndarray
+        Modulation Index per signal, shape (...)
+    dist_KL: numpy.ndarray
+        Kullback-Leibler distance per signal, shape (...)
+    """
+    sig_phase, sig_amp = np.broadcast_arrays(sig_phase, sig_amp)
+    shape = sig_phase.shape[:-1]
+    N_sig = int(np.prod(shape))
+
+    idx = phase_bins(sig_phase, nbins).reshape(N_sig, -1)
+    idx += np.arange(N_sig)[:, np.newaxis]*nbins
+
+    amp_sum = np.bincount(idx.ravel(), weights=sig_amp.reshape(N_sig, -1).ravel(), minlength=N_sig*nbins)
+    counts = np.bincount(idx.ravel(), minlength=N_sig*nbins)
+    bin_amp = np.divide(amp_sum, counts, out=np.zeros(N_sig*nbins), where=counts > 0).reshape(N_sig, nbins)
+
+    MI, dist_KL = _kl_distance(bin_amp, nbins)
+    return MI.reshape(shape), dist_KL.reshape(shape)
+
+
+def sliding_modulation_index(sig_phase: np.ndarray,
+                             sig_amp: np.ndarray,
+                             window: int,
+                             step: int,
+                             nbins: int=18) -> (np.ndarray, np.ndarray, np.ndarray):
+    """
+    Modulation Index in sliding windows, without copying the signals per window.
+
+    The phase of every sample is binned once; the amplitude sums and sample
+    counts per bin are cumulative sums along time, so every window is the
+    difference of two cumulative values. Memory is O(signals x nbins x samples)
+    regardless of the window overlap.
+
+    Parameters
+    ----------
+    sig_phase: numpy.ndarray
+        The phase signals xfp(t), shape (..., samples)
+    sig_amp: numpy.ndarray
+        The amplitude signals xfA(t), same shape as sig_phase
+    window: int
+        Window length (samples)
+    step: int
+        Step between consecutive windows (samples)
+    nbins: int
+        Number of phase bins
+
+    Returns
+    -------
+    MI: numpy.ndarray
+        Modulation Index per signal and window, shape (..., windows)
+    dist_KL: numpy.ndarray
+        Kullback-Leibler distance per signal and window, shape (..., windows)
+    starts: numpy.ndarray
+        First sample of every window
+    """
+    sig_phase, sig_amp = np.broadcast_arrays(sig_phase, sig_amp)
+    shape = sig_phase.shape[:-1]
+    N_samples = sig_phase.shape[-1]
+    starts = np.arange(0, N_samples-window+1, step)
+
+    MI = np.zeros(shape + (len(starts),))
+    dist_KL = np.zeros(shape + (len(starts),))
+    for sig_idx in np.ndindex(*shape):
+        idx = phase_bins(sig_phase[sig_idx], nbins)
+        onehot = idx[np.newaxis, :] == np.arange(nbins)[:, np.newaxis]
+        amp_cs = np.concatenate((np.zeros((nbins, 1)), np.cumsum(onehot*sig_amp[sig_idx], axis=1)), axis=1)
+        cnt_cs = np.concatenate((np.zeros((nbins, 1), dtype=int), np.cumsum(onehot, axis=1)), axis=1)
+
+        amp_sum = (amp_cs[:, starts+window] - amp_cs[:, starts]).T
+        counts = (cnt_cs[:, starts+window] - cnt_cs[:, starts]).T
+        bin_amp = np.divide(amp_sum, counts, out=np.zeros(amp_sum.shape), where=counts > 0)
+        MI[sig_idx], dist_KL[sig_idx] = _kl_distance(bin_amp, nbins)
+
+    return MI, dist_KL, starts
+
+
 def bandpower(data, fs, band, window_sec=None, overlap=0.9, relative=False, return_PSD=False, **kwargs):
     """
     Compute the average power of the signal x in a specific frequency band.
@@ -361,8 +573,9 @@ def bandpower(data, fs, band, window_sec=None, overlap=0.9, relative=False, retu
 
     Parameters
     ----------
-    data: 1d-array
-        Input signal in the time-domain.
+    data: nd-array
+        Input signal(s) in the time-domain (time on the last axis).
+        Several signals (e.g. runs x populations) are computed in one call.
     fs: float
         Sampling frequency of the data.
     band: list
@@ -376,8 +589,8 @@ def bandpower(data, fs, band, window_sec=None, overlap=0.9, relative=False, retu
 
     Return
     ------
-    bp : float
-        Absolute or relative band power.
+    bp : float or nd-array
+        Absolute or relative band power, per signal.
     """
     from scipy.signal import welch
     from scipy.integrate import simps
@@ -413,10 +626,10 @@ def bandpower(data, fs, band, window_sec=None, overlap=0.9, relative=False, retu
     # Integral approximation of the spectrum using Simpson's rule.
     if psd.size > 1:
         psd = psd.squeeze()
-    bp = simps(psd[idx_band], dx=freq_res)
+    bp = simps(psd[..., idx_band], dx=freq_res, axis=-1)
 
     if relative:
-        bp /= simps(psd, dx=freq_res)
+        bp /= simps(psd, dx=freq_res, axis=-1)
 
     if return_PSD:
         return bp, freqs, psd
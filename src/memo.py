@@ -0,0 +1,233 @@
+"""
+Implementation Notes
+--------------------------------------------------------------------------------
+    | 1: memoize() caches the outputs of a function on disk (pickle), one file per call under <cache dir>/<module.function>/<key>.pkl. The key is the hash of the function (name, source code and the source file of its module, so editing the function or a helper/constant of the same module, e.g. src/freq_analysis.py, invalidates its entries), its arguments and an optional version. Changes in other modules are not tracked; pass a new version for those.
+    | 2: Arguments are hashed by content: arrays (and brian2 Quantities) by dtype, shape, units and raw bytes; strings that point to existing files by the file contents (so a function that reads a file is cached until the file changes); containers recursively; anything else by its pickle.
+    | 3: The cache is bounded in size (MEMO_MAX_GB, default 2 GB). A hit touches its file, so the modification times order the entries by last use and eviction drops the least recently used ones first.
+    | 4: `python -m src.memo info` lists the cached functions and their sizes; `python -m src.memo clear [-f <function>]` invalidates all entries or those of a function. The cache directory is MEMO_DIR, default <repo>/.memo.
+    | 5: The cached analysis stages of the figure scripts (my_FR, my_specgram, bandpower, PSD) are defined once at the bottom of this module; the scripts import them after `from src.freq_analysis import *` (e.g. `from src.memo import my_FR, PSD`). The results are read through src.runfile.open_run, which is already memory-mapped, so file reads are not cached.
+"""
+
+import os
+import sys
+import pickle
+import hashlib
+import inspect
+import argparse
+import tempfile
+import functools
+import numpy as np
+
+CACHE_DIR = os.environ.get('MEMO_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.memo'))
+MAX_SIZE = float(os.environ.get('MEMO_MAX_GB', 2.))*1024**3
+
+# file hashes of this process, keyed by (path, size, mtime)
+_file_hashes = {}
+
+
+def file_hash(fname):
+    """ Hash of the contents of a file """
+    st = os.stat(fname)
+    key = (os.path.abspath(fname), st.st_size, st.st_mtime_ns)
+    if key not in _file_hashes:
+        h = hashlib.sha256()
+        with open(fname, 'rb') as fin:
+            for chunk in iter(lambda: fin.read(1 << 20), b''):
+                h.update(chunk)
+        _file_hashes[key] = h.hexdigest()
+    return _file_hashes[key]
+
+
+def _update(h, obj):
+    """ Feeds the content of an argument to hash h (see note #2) """
+    if isinstance(obj, np.ndarray):
+        arr = np.ascontiguousarray(obj)
+        h.update(b'nd' + arr.dtype.str.encode() + str(arr.shape).encode() + str(getattr(obj, 'dim', '')).encode())
+        h.update(arr.view(np.uint8).reshape(-1) if arr.size else b'')
+    elif isinstance(obj, (str, os.PathLike)) and os.path.isfile(obj):
+        h.update(b'file' + file_hash(obj).encode())
+    elif obj is None or isinstance(obj, (bool, int, float, complex, str, bytes, np.generic)):
+        h.update(b'sc' + type(obj).__name__.encode() + repr(obj).encode())
+    elif isinstance(obj, (list, tuple)):
+        h.update(b'seq' + str(len(obj)).encode())
+        for item in obj:
+            _update(h, item)
+    elif isinstance(obj, dict):
+        h.update(b'map' + str(len(obj)).encode())
+        for key in sorted(obj, key=repr):
+            _update(h, key)
+            _update(h, obj[key])
+    else:
+        try:
+            h.update(b'pkl' + pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            h.update(b'repr' + repr(obj).encode())
+
+
+def func_name(func):
+    return '{0}.{1}'.format(getattr(func, '__module__', None) or 'builtins', getattr(func, '__qualname__', repr(func)))
+
+
+def func_hash(func):
+    """ Hash of the name and source code of a function and of the source file of its module (note #1) """
+    try:
+        src = inspect.getsource(func)
+    except (OSError, TypeError):
+        src = ''
+    try:
+        src += file_hash(inspect.getsourcefile(func))
+    except (OSError, TypeError):
+        pass
+    return hashlib.sha256((func_name(func) + src).encode('utf8')).hexdigest()
+
+
+def call_key(fhash, args, kwargs, version=None):
+    h = hashlib.sha256(fhash.encode())
+    _update(h, version)
+    _update(h, list(args))
+    _update(h, kwargs)
+    return h.hexdigest()[:32]
+
+
+def entries(cache_dir=None):
+    """ (path, size, last use) of all cached entries """
+    cache_dir = cache_dir or CACHE_DIR
+    out = []
+    if not os.path.isdir(cache_dir):
+        return out
+    for sub in os.scandir(cache_dir):
+        if sub.is_dir():
+            for entry in os.scandir(sub.path):
+                if entry.name.endswith('.pkl'):
+                    st = entry.stat()
+                    out.append((entry.path, st.st_size, st.st_mtime))
+    return out
+
+
+def evict(max_size=None, cache_dir=None):
+    """ Removes the least recently used entries until the cache fits in max_size bytes (note #3); returns the number of removed entries """
+    max_size = MAX_SIZE if max_size is None else max_size
+    items = sorted(entries(cache_dir), key=lambda item: item[2])
+    total = sum(size for _, size, _ in items)
+    cnt = 0
+    for path, size, _ in items:
+        if total <= max_size:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        cnt += 1
+    return cnt
+
+
+def clear(name=None, cache_dir=None):
+    """ Invalidates all cached entries, or those of functions whose name ends with `name` (note #4); returns the number of removed entries """
+    cnt = 0
+    for path, _, _ in entries(cache_dir):
+        if name is None or os.path.basename(os.path.dirname(path)).endswith(name):
+            os.remove(path)
+            cnt += 1
+    return cnt
+
+
+def memoize(func=None, version=None, cache_dir=None, max_size=None):
+    """
+    Caches the outputs of func on disk (see notes #1-#3).
+
+    Usage: `@memoize`, `@memoize(version=2)` or `my_FR = memoize(my_FR)`; the wrapped function has a clear() method.
+    """
+    if func is None:
+        return functools.partial(memoize, version=version, cache_dir=cache_dir, max_size=max_size)
+
+    fhash = func_hash(func)
+    name = func_name(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        fdir = os.path.join(cache_dir or CACHE_DIR, name)
+        fname = os.path.join(fdir, call_key(fhash, args, kwargs, version) + '.pkl')
+
+        try:
+            with open(fname, 'rb') as fin:
+                res = pickle.load(fin)
+            os.utime(fname) # last use (note #3)
+            return res
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            pass
+
+        res = func(*args, **kwargs)
+
+        os.makedirs(fdir, exist_ok=True)
+        fd, tmpname = tempfile.mkstemp(dir=fdir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fout:
+                pickle.dump(res, fout, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmpname, fname)
+        except Exception as e:
+            os.remove(tmpname)
+            print('[!] memoize: not caching {0}: {1}'.format(name, e))
+            return res
+
+        evict(max_size, cache_dir)
+        return res
+
+    wrapper.clear = lambda: clear(name, cache_dir)
+    return wrapper
+
+
+# Cached analysis stages (note #5)
+from src import freq_analysis
+
+my_FR = memoize(freq_analysis.my_FR)
+my_specgram = memoize(freq_analysis.my_specgram)
+bandpower = memoize(freq_analysis.bandpower)
+
+
+@memoize
+def PSD(*args, **kwargs):
+    """ tensorpac.utils.PSD; tensorpac is imported on the first uncached call """
+    from tensorpac.utils import PSD as _PSD
+    return _PSD(*args, **kwargs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Inspect or invalidate the on-disk analysis cache')
+
+    parser.add_argument('command', choices=['info', 'clear', 'evict'],
+                        help='list the cache contents, invalidate entries or enforce the size bound')
+
+    parser.add_argument('-f', '--function',
+                        nargs='?',
+                        type=str,
+                        default=None,
+                        help='Only entries of this function (e.g. my_FR or src.freq_analysis.my_FR)')
+
+    parser.add_argument('-d', '--cache_dir',
+                        nargs='?',
+                        type=str,
+                        default=CACHE_DIR,
+                        help='Cache directory')
+
+    parser.add_argument('-s', '--max_size',
+                        nargs='?',
+                        type=float,
+                        default=MAX_SIZE/1024**3,
+                        help='Size bound [GB] for evict')
+
+    args = parser.parse_args()
+
+    if args.command == 'info':
+        funcs = {}
+        for path, size, _ in entries(args.cache_dir):
+            name = os.path.basename(os.path.dirname(path))
+            cnt, total = funcs.get(name, (0, 0))
+            funcs[name] = (cnt+1, total+size)
+        for name, (cnt, total) in sorted(funcs.items()):
+            print('{0:60s} {1:6d} entries {2:10.1f} MB'.format(name, cnt, total/1024**2))
+        print('[+] {0}: {1:.1f} MB'.format(args.cache_dir, sum(total for _, total in funcs.values())/1024**2), file=sys.stderr)
+    elif args.command == 'clear':
+        print('[+] Removed {0} entries'.format(clear(args.function, args.cache_dir)))
+    else:
+        print('[+] Removed {0} entries'.format(evict(args.max_size*1024**3, args.cache_dir)))
@@ -18,6 +18,7 @@ from model import settings
 from model import globals
 from model.globals import *
 from src import plot3d
+from src.freq_analysis import sliding_spike_counts
 
 # ILLUSTRATOR STUFF
 mplb.rcParams['pdf.fonttype'] = 42
@@ -474,27 +475,8 @@ def my_FR(spikes: np.ndarray,
         Spikes per window (needs to be normalized)
     """
 
-    # Calculate new sampling times
-    win_step = window_size * round(1. - overlap, 4)
-    # fs_n = int(1/win_step)
-
-    # First center is at the middle of the first window
-    c0 = window_size/2
-    cN = duration-c0
-
-    # centers
-    centers = np.arange(c0, cN+win_step, win_step)*second
-
-    # Calculate windowed FR
-    counts = []
-    for center in centers:
-        cl = center - c0
-        ch = center + c0
-        spike_cnt = np.count_nonzero(np.where((spikes >= cl) & (spikes < ch)))
-        counts.append(spike_cnt)
-
-    # return centers and spike counts per window
-    return centers, np.array(counts)
+    centers, counts = sliding_spike_counts(spikes, duration, window_size, overlap)
+    return centers*second, counts
 
 
 def my_specgram(signal: np.ndarray,
@@ -0,0 +1,167 @@
+"""
+Implementation Notes
+--------------------------------------------------------------------------------
+    | 1: Sweep-wide precompute of the PAC figures (heatmaps of MI and theta/gamma power over a parameter grid). The rates of all runs are computed in parallel processes (one run per task; reading the spikes dominates) and stacked into one (runs, populations, samples) array of post-stimulation windows.
+    | 2: Everything after that is batched over the stack: the PSDs (tensorpac PSD), the theta/gamma band powers (Welch, bandpower), and the phase/amplitude filtering (Pac.filter, parallel over n_jobs). The MI of all runs and populations comes from a single call to modulation_index.
+    | 3: The cache file (npz) keeps the heatmaps and the per-run intermediates: run directories, grid indices, stimulation onsets, post-stimulation rates, PSDs, MI, band powers and theta peak frequencies. A run that is already in the cache is not read again; re-rendering the figures only needs the cache.
+    | 4: Runs without the spike rasters (recording.spikes = False) are read from their binned spike counts (src.runfile.binned_counts, freq_analysis.binned_spike_counts); the windows are the same, exact when the window step is a multiple of the bin.
+"""
+
+import os
+import warnings
+import numpy as np
+import concurrent.futures as cf
+from scipy import signal as sig
+
+from src.runfile import open_run, binned_counts
+from src.freq_analysis import sliding_spike_counts, binned_spike_counts, modulation_index, bandpower
+
+
+def load_rates(run_dir, groups, N, duration, window_size, overlap):
+    """ Normalized sliding-window rates [Hz] of the groups of a run, shape (groups, samples), and their time vector [s] """
+    run = open_run(run_dir)
+    if all('spikes/'+group+'/t' in run for group in groups):
+        times = [np.asarray(run.spikes(group)[1], dtype=float)*1e-3 for group in groups] # ms -> s
+        labels = np.repeat(np.arange(len(groups)), [len(t) for t in times])
+        tv, counts = sliding_spike_counts(np.concatenate(times), duration, window_size, overlap, labels, len(groups))
+    else:
+        # no spike rasters: binned spike counts (note #4)
+        binned = [binned_spike_counts(*binned_counts(run, group), window_size, overlap) for group in groups]
+        tv, counts = binned[0][0], np.stack([cnt for _, cnt in binned])
+    return tv, counts/window_size/np.asarray(N, dtype=float)[:, np.newaxis]
+
+
+def _load_rates(args):
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", category=UserWarning)
+        try:
+            return load_rates(*args)
+        except Exception as e:
+            return e
+
+
+def theta_peak(freqs, psd, theta_band, prominence=1, rel_threshold=0.1):
+    """ Frequency of the largest PSD peak within the theta band (peaks below rel_threshold*max are ignored); NaN if none """
+    peaks, _ = sig.find_peaks(psd, prominence=prominence)
+    peaks = peaks[psd[peaks] > psd.max()*rel_threshold]
+    peaks = peaks[(freqs[peaks] >= theta_band[0]) & (freqs[peaks] <= theta_band[1])]
+    if not peaks.size:
+        return np.nan
+    return freqs[peaks[np.argmax(psd[peaks])]]
+
+
+def post_window(tv, t_stim, t_post):
+    """ Sample indices of the analysis window (t_stim+t_post[0], t_stim+t_post[1]] of a rate time vector [s] """
+    tv_ms = np.round(tv/1e-3, 4)
+    lims = np.round((np.array(t_post) + t_stim)/1e-3, 4)
+    return np.flatnonzero((tv_ms > lims[0]) & (tv_ms <= lims[1]))
+
+
+def precompute(runs, grid_shape, groups, N, duration, t_post=(0.5, 5.5), window_size=5e-3, overlap=0.9,
+               theta_band=(3, 9), gamma_band=(40, 80), noise=None, workers=None, cache=None):
+    """
+    Computes the MI and theta/gamma power heatmaps of a sweep (see notes #1, #2).
+
+    Parameters
+    ----------
+    runs: list of dict
+        One entry per run: {'dir': results directory, 'index': grid index (tuple), 't_stim': onset [s]}
+    grid_shape: tuple
+        Shape of the heatmaps
+    groups: list
+        Group names (e.g. ['CA1_pyCAN', 'CA1_inh']); N: their sizes
+    duration: float
+        Duration of the runs [s]
+    t_post: tuple
+        Analysis window, relative to the stimulation onset [s]
+    noise: numpy.ndarray
+        Optional noise added to the rates (full length) before the MI computation
+    workers: int
+        Number of processes for loading the runs and for filtering
+    cache: str
+        Cache file (npz); runs already in it are not read again (note #3)
+
+    Returns
+    -------
+    res: dict
+        Heatmaps (MI, theta, gamma; shape grid_shape + (groups,)) and the per-run intermediates
+    """
+    fs = 1./(window_size*round(1.-overlap, 4))
+
+    # previously computed runs
+    cached = {}
+    if cache and os.path.isfile(cache):
+        with np.load(cache) as data:
+            for cnt, run_dir in enumerate(data['run_dirs']):
+                cached[str(run_dir)] = (data['t_stim'][cnt], data['rates'][cnt])
+
+    todo = [run for run in runs if run['dir'] not in cached or cached[run['dir']][0] != run['t_stim']]
+    print('[+] {0} runs | {1} cached | {2} to load'.format(len(runs), len(runs)-len(todo), len(todo)))
+
+    # 1. rates of the post-stim windows (note #1)
+    tv = None
+    rates = {}
+    with cf.ProcessPoolExecutor(workers) as pool:
+        args = [(run['dir'], groups, N, duration, window_size, overlap) for run in todo]
+        for run, out in zip(todo, pool.map(_load_rates, args, chunksize=max(len(args)//(4*(workers or os.cpu_count())), 1))):
+            if isinstance(out, Exception):
+                print('[!] Skipping {0}: {1}'.format(run['dir'], out))
+                continue
+            tv, FR = out
+            rates[run['dir']] = FR
+
+    if tv is None:
+        tv = sliding_spike_counts(np.zeros(0), duration, window_size, overlap)[0]
+
+    runs = [run for run in runs if run['dir'] in rates or run['dir'] in cached]
+    starts = [post_window(tv, run['t_stim'], t_post) for run in runs]
+    L = min([len(idx) for idx in starts], default=0)
+    starts = [idx[0] for idx in starts]
+
+    windows = [rates[run['dir']][:, start:start+L] if run['dir'] in rates else cached[run['dir']][1][:, :L] for run, start in zip(runs, starts)]
+    X = np.stack(windows) if windows else np.zeros((0, len(groups), 0))
+    R, P, L = X.shape
+    X_flat = X.reshape(R*P, L)
+
+    # 2. batched spectra, band powers and MI (note #2)
+    from tensorpac import Pac
+    from tensorpac.utils import PSD
+
+    psd = PSD(X_flat, fs)
+    theta_pow = bandpower(X_flat, fs, theta_band, window_sec=1., overlap=0.9, relative=False).reshape(R, P)
+    gamma_pow = bandpower(X_flat, fs, gamma_band, window_sec=1., overlap=0.9, relative=False).reshape(R, P)
+    peaks = np.array([theta_peak(psd.freqs, row, theta_band) for row in psd.psd]).reshape(R, P)
+
+    # noise is defined over the full run; each window gets its own slice of it
+    X_noise = X.copy()
+    if noise is not None:
+        for cnt, start in enumerate(starts):
+            X_noise[cnt] += noise[start:start+L]
+    X_noise = X_noise.reshape(R*P, L)
+
+    pac_obj = Pac(idpac=(2, 0, 0), f_pha=list(theta_band), f_amp=list(gamma_band))
+    pha = pac_obj.filter(fs, X_noise, ftype='phase', n_jobs=workers or -1)[0]
+    amp = pac_obj.filter(fs, X_noise, ftype='amplitude', n_jobs=workers or -1)[0]
+    MI, _ = modulation_index(pha, amp)
+    MI = MI.reshape(R, P)
+
+    # heatmaps
+    res = {'MI':np.zeros(tuple(grid_shape) + (P,)), 'theta':np.zeros(tuple(grid_shape) + (P,)), 'gamma':np.zeros(tuple(grid_shape) + (P,))}
+    for cnt, run in enumerate(runs):
+        res['MI'][tuple(run['index'])] = MI[cnt]
+        res['theta'][tuple(run['index'])] = theta_pow[cnt]
+        res['gamma'][tuple(run['index'])] = gamma_pow[cnt]
+
+    res.update({'run_dirs':np.array([run['dir'] for run in runs]),
+                'index':np.array([run['index'] for run in runs]),
+                't_stim':np.array([run['t_stim'] for run in runs]),
+                'rates':X, 'fs':fs, 'groups':np.array(groups),
+                'psd_freqs':psd.freqs, 'psd':psd.psd.reshape(R, P, -1),
+                'MI_runs':MI, 'theta_runs':theta_pow, 'gamma_runs':gamma_pow, 'theta_peak':peaks})
+
+    if cache:
+        np.savez(cache, **res)
+        print('[+] Saved', cache)
+
+    return res
+
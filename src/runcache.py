@@ -0,0 +1,119 @@
+"""
+Implementation Notes
+--------------------------------------------------------------------------------
+    | 1: The identity of a run is the hash of its effective parameters: the configuration without the bookkeeping entries (timestamp, git branch/hashes), the seed it contains and the git hash of the code that runs it. The parameters are serialized canonically (sorted keys, all numbers as floats), so 10000 and 1e4 or a reordered file give the same hash.
+    | 2: The git hash is the HEAD commit; uncommitted changes are not part of the identity.
+    | 3: With run_simulation.py -rc, the run directory is named by the hash (instead of the timestamp), under the same stimulation/offset hierarchy. A run is complete once its run file exists; the file is written atomically at the very end, so interrupted runs are never mistaken for complete ones.
+    | 4: The code signature of a configuration hashes only the entries that enter the generated code; the entries that are run-time values (stimulation waveform, seed, duration) are left out, so that the configurations of a sweep share their code objects. The C++ standalone binary also holds the duration, the seed-dependent initial values and the connectivity; only the stimulation and the per-run scalars (see model/network.py) are run-time arguments.
+    | 5: `python -m src.runcache -sd <results dir> <configs>` prints the configuration files without a complete result, for the launch scripts.
+"""
+
+import os
+import sys
+import glob
+import json
+import hashlib
+import argparse
+
+import parameters
+from src.runfile import RUN_FNAME
+
+IGNORED_KEYS = ['timestamp', 'git_branch', 'git_hash', 'git_short_hash']
+HASH_LEN = 16
+
+# entries that do not change the generated code (note #4)
+RUNTIME_KEYS = IGNORED_KEYS + ['seed_val']
+RUNTIME_STIM_KEYS = ['target', 'coordinates', 'sigma', 'onset', 'I', 'pulse_width', 'stim_freq', 'pulse_freq', 'nr_of_trains', 'nr_of_pulses', 'ipi']
+RUNTIME_KURAMOTO_KEYS = ['kN', 'gain_reset', 'gain_rhythm', 'offset']
+
+_git_hash = None
+
+
+def code_version():
+    """ Git hash of the code (looked up once per process) """
+    global _git_hash
+    if _git_hash is None:
+        _git_hash = parameters.get_git_revision_hash()
+    return _git_hash
+
+
+def canonical(obj):
+    """ Canonical form of a parameters object: numbers as floats, containers recursively (see note #1) """
+    if isinstance(obj, dict):
+        return {str(key):canonical(val) for key, val in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [canonical(val) for val in obj]
+    if isinstance(obj, bool) or obj is None or isinstance(obj, str):
+        return obj
+    return float(obj)
+
+
+def run_hash(data, git_hash=None):
+    """ Identity of a run: hash of the effective parameters and of the code version (see notes #1, #2) """
+    params = {key:val for key, val in data.items() if key not in IGNORED_KEYS}
+    params['git_hash'] = git_hash if git_hash is not None else code_version()
+    text = json.dumps(canonical(params), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(text.encode('utf8')).hexdigest()[:HASH_LEN]
+
+
+def code_signature(data, standalone=False):
+    """ Hash of the configuration entries that enter the generated code (the standalone binary if `standalone`, note #4); configurations with the same signature share their code objects """
+    params = {key:val for key, val in data.items() if key not in (IGNORED_KEYS if standalone else RUNTIME_KEYS)}
+    if 'stimulation' in params:
+        params['stimulation'] = {key:val for key, val in params['stimulation'].items() if key not in RUNTIME_STIM_KEYS}
+    if standalone and 'Kuramoto' in params:
+        params['Kuramoto'] = {key:val for key, val in params['Kuramoto'].items() if key not in RUNTIME_KURAMOTO_KEYS}
+    if not standalone and 'simulation' in params:
+        params['simulation'] = {key:val for key, val in params['simulation'].items() if key != 'duration'}
+    text = json.dumps(canonical(params), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(text.encode('utf8')).hexdigest()
+
+
+def base_dir(resdir, data):
+    """ Stimulation/offset directory of a run, as created by run_simulation.py """
+    I_stim = data['stimulation']['I']
+    if I_stim[0]:
+        stim_dir = os.path.join(resdir, '{stimamp:.1f}_nA'.format(stimamp=I_stim[0]))
+        return os.path.join(stim_dir, '{phase:.2f}_{stim_on:.1f}_ms'.format(phase=data['Kuramoto']['offset'], stim_on=data['stimulation']['onset']*1e3))
+    return os.path.join(resdir, 'None')
+
+
+def run_dir(resdir, data, git_hash=None):
+    """ Directory of a run named by its hash (note #3) """
+    return os.path.join(base_dir(resdir, data), run_hash(data, git_hash))
+
+
+def is_complete(dirname):
+    """ Whether a run directory holds a complete result (note #3) """
+    return os.path.isfile(os.path.join(dirname, 'data', RUN_FNAME))
+
+
+def pending(fconfigs, resdir):
+    """ Configuration files whose run has no complete result in resdir """
+    return [fconf for fconf in fconfigs if not is_complete(run_dir(resdir, parameters.load(fconf)))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='List the configuration files of a sweep without a complete result')
+
+    parser.add_argument('configs',
+                        nargs='+',
+                        type=str,
+                        help='Configuration files (json) and/or directories containing them')
+
+    parser.add_argument('-sd', '--save_dir',
+                        nargs='?',
+                        type=str,
+                        default='results',
+                        help='Results directory of the sweep')
+
+    args = parser.parse_args()
+
+    fconfigs = []
+    for item in args.configs:
+        fconfigs += sorted(glob.glob(os.path.join(item, '*.json'))) if os.path.isdir(item) else [item]
+
+    todo = pending(fconfigs, args.save_dir)
+    print('[+] {0}/{1} configurations pending'.format(len(todo), len(fconfigs)), file=sys.stderr)
+    for fconf in todo:
+        print(fconf)
@@ -0,0 +1,223 @@
+"""
+Implementation Notes
+--------------------------------------------------------------------------------
+    | 1: A run is stored in a single binary file (data/results.run): an 8-byte magic string, the length of the header (uint64), a JSON header and the columns as raw little-endian arrays, each aligned to 64 bytes. The header holds the parameters of the run, extra run information (info) and the dtype/shape/offset of every column.
+    | 2: Columns are typed: spike indices uint16 (uint32 for groups larger than 65535 neurons), spike times float32 [ms], traces and positions float32. RunFile memory-maps the columns, so opening a run only reads the header.
+    | 3: Column names: spikes/<group>/i, spikes/<group>/t, order_param/<phase|rhythm|coherence>, rate_CA1_E, s2r_drive, stim_input, Vm_avg/<area>_<E|I>, lfp/signal and lfp/electrodes (if enabled), closed_loop/t_trigger [s] (if enabled), rate_bins/<group>/counts (uint32, spatial bins x time bins) and rate_bins/<group>/edges [mm] (if enabled), positions/<group> and recordings/<monitor>/<variable>.
+    | 4: LegacyRun reads the older text results (np.savetxt) with the same interface; open_run() picks the right reader for a results directory.
+    | 5: Runs recorded without the spike rasters (recording.spikes = False) have no spikes/<group> columns; binned_counts() returns their binned spike counts instead (the bin width comes from the run parameters), for src.freq_analysis.binned_spike_counts.
+"""
+
+import os
+import sys
+import json
+import tempfile
+import numpy as np
+
+MAGIC = b'MEMSTIM\x01'
+ALIGN = 64
+RUN_FNAME = 'results.run'
+
+
+def index_dtype(N):
+    """ Smallest unsigned type for the indices of a group of N neurons """
+    return np.uint16 if N <= np.iinfo(np.uint16).max+1 else np.uint32
+
+
+def pack_results(res):
+    """ Maps the results dictionary of a run (NetworkHandle.results) to typed columns (see notes #2, #3) """
+    cols = {}
+    for name, pos in res['positions'].items():
+        cols['positions/'+name] = np.asarray(pos, dtype=np.float32)
+
+    for name, SM in res['spikes'].items():
+        group = name.replace('_spikemon', '')
+        N = len(res['positions'][group]) if group in res['positions'] else int(SM['i'].max(initial=0))+1
+        cols['spikes/'+group+'/i'] = np.asarray(SM['i'], dtype=index_dtype(N))
+        cols['spikes/'+group+'/t'] = np.asarray(SM['t'], dtype=np.float32)
+
+    for key, val in res.get('order_param', {}).items():
+        cols['order_param/'+key] = np.asarray(val, dtype=np.float32)
+
+    for key in ['rate_CA1_E', 's2r_drive', 'stim_input']:
+        cols[key] = np.asarray(res[key], dtype=np.float32)
+
+    for name, Vm_avg in res['Vm_avg'].items():
+        cols['Vm_avg/'+name.replace('Vm_avg_mon_', '')] = np.asarray(Vm_avg, dtype=np.float32)
+
+    if 'lfp' in res:
+        cols['lfp/signal'] = np.asarray(res['lfp']['signal'], dtype=np.float32)
+        cols['lfp/electrodes'] = np.asarray(res['lfp']['electrodes'], dtype=np.float32)
+
+    if 'closed_loop' in res:
+        cols['closed_loop/t_trigger'] = np.asarray(res['closed_loop']['t_trigger'], dtype=np.float64)
+
+    for group, RB in res.get('rate_bins', {}).items():
+        cols['rate_bins/'+group+'/counts'] = np.asarray(RB['counts'], dtype=np.uint32)
+        cols['rate_bins/'+group+'/edges'] = np.asarray(RB['edges'], dtype=np.float32)
+
+    for name, rec in res.get('recordings', {}).items():
+        for key, val in rec.items():
+            cols['recordings/'+name+'/'+key] = np.asarray(val) if key == 'i' else np.asarray(val, dtype=np.float32)
+
+    return cols
+
+
+def write_run(fname, columns, parameters=None, info=None):
+    """ Writes a dictionary of arrays, the run parameters and extra run information (e.g. the run time) in a single run file (note #1); the file is written atomically """
+    header = {'version':1, 'parameters':parameters or {}, 'info':info or {}, 'columns':{}}
+    arrays = {name:np.ascontiguousarray(arr) for name, arr in columns.items()}
+
+    # offsets depend on the header length; iterate until the header fits its own estimate
+    header_len = 0
+    while True:
+        offset = len(MAGIC) + 8 + header_len
+        offset += -offset % ALIGN
+        for name, arr in arrays.items():
+            header['columns'][name] = {'dtype':arr.dtype.newbyteorder('<').str, 'shape':list(arr.shape), 'offset':offset}
+            offset += arr.nbytes
+            offset += -offset % ALIGN
+        header_bytes = json.dumps(header).encode('utf8')
+        if len(header_bytes) <= header_len:
+            header_bytes += b' '*(header_len - len(header_bytes))
+            break
+        header_len = len(header_bytes) + 256
+
+    fd, tmpname = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(fname)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fout:
+            fout.write(MAGIC)
+            fout.write(np.uint64(header_len).tobytes())
+            fout.write(header_bytes)
+            for name, arr in arrays.items():
+                fout.seek(header['columns'][name]['offset'])
+                fout.write(arr.astype(arr.dtype.newbyteorder('<'), copy=False).tobytes())
+        os.replace(tmpname, fname)
+    except Exception:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+        raise
+
+
+class RunFile:
+    """ Memory-mapped reader for run files (note #2) """
+
+    def __init__(self, fname):
+        self.fname = fname
+        with open(fname, 'rb') as fin:
+            if fin.read(len(MAGIC)) != MAGIC:
+                raise ValueError('Not a run file: ' + fname)
+            header_len = int(np.frombuffer(fin.read(8), dtype='<u8')[0])
+            header = json.loads(fin.read(header_len).decode('utf8'))
+
+        self.parameters = header['parameters']
+        self.info = header.get('info', {})
+        self.columns = header['columns']
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __getitem__(self, name):
+        col = self.columns[name]
+        if not np.prod(col['shape']):
+            return np.zeros(col['shape'], dtype=col['dtype'])
+        return np.memmap(self.fname, dtype=col['dtype'], mode='r', offset=col['offset'], shape=tuple(col['shape']))
+
+    def keys(self):
+        return self.columns.keys()
+
+    def spikes(self, group):
+        """ Spike indices and times [ms] of a group """
+        return self['spikes/'+group+'/i'], self['spikes/'+group+'/t']
+
+
+class LegacyRun:
+    """ Reader for text results (np.savetxt) with the RunFile interface (note #4) """
+
+    def __init__(self, dirname):
+        self.dirname = dirname
+        self.data_dir = os.path.join(dirname, 'data')
+        with open(os.path.join(dirname, 'parameters_bak.json')) as fin:
+            self.parameters = json.load(fin)
+        self.info = {}
+
+        files = {}
+        for key in ['phase', 'rhythm', 'coherence']:
+            files['order_param/'+key] = os.path.join(self.data_dir, 'order_param_mon_'+key+'.txt')
+        files['rate_CA1_E'] = os.path.join(self.data_dir, 'rate_mon_E_CA1.txt')
+        files['s2r_drive'] = os.path.join(self.data_dir, 's2r_mon_drive.txt')
+        files['stim_input'] = os.path.join(self.data_dir, 'stim_input.txt')
+        files['lfp/signal'] = os.path.join(self.data_dir, 'lfp_signal.txt')
+        files['lfp/electrodes'] = os.path.join(self.data_dir, 'lfp_electrodes.txt')
+        files['closed_loop/t_trigger'] = os.path.join(self.data_dir, 'stim_times.txt')
+
+        for fname in os.listdir(self.data_dir):
+            if fname.startswith('Vm_avg_mon_'):
+                files['Vm_avg/'+fname[len('Vm_avg_mon_'):-4]] = os.path.join(self.data_dir, fname)
+            elif fname.startswith('rate_bins_'):
+                files['rate_bins/'+fname[len('rate_bins_'):-4]+'/counts'] = os.path.join(self.data_dir, fname)
+
+        spikes_dir = os.path.join(self.data_dir, 'spikes')
+        for fname in os.listdir(spikes_dir) if os.path.isdir(spikes_dir) else []:
+            group, var = fname[:-len('_i.txt')].replace('_spikemon', ''), fname[-5]
+            files['spikes/'+group+'/'+var] = os.path.join(spikes_dir, fname)
+
+        positions_dir = os.path.join(self.data_dir, 'positions')
+        for fname in os.listdir(positions_dir) if os.path.isdir(positions_dir) else []:
+            files['positions/'+fname[:-4]] = os.path.join(positions_dir, fname)
+
+        self.files = {name:fname for name, fname in files.items() if os.path.isfile(fname)}
+        self.columns = self.files
+
+    def __contains__(self, name):
+        return name in self.files
+
+    def __getitem__(self, name):
+        fname = self.files[name]
+        if fname.endswith('.npy'):
+            return np.load(fname)
+        return np.atleast_1d(np.loadtxt(fname).squeeze())
+
+    def keys(self):
+        return self.files.keys()
+
+    def spikes(self, group):
+        """ Spike indices and times [ms] of a group """
+        return self['spikes/'+group+'/i'].astype(int), self['spikes/'+group+'/t']
+
+
+def binned_counts(run, group):
+    """ Spike counts of a group in fixed time bins (summed over the spatial bins) and the bin width [s] (note #5) """
+    counts = np.asarray(run['rate_bins/'+group+'/counts'])
+    return counts.reshape(-1, counts.shape[-1]).sum(axis=0), float(run.parameters['recording']['rate_bins']['dt'])
+
+
+def open_run(dirname):
+    """ Opens the results of a run directory (the one holding parameters_bak.json) with the appropriate reader """
+    fname = os.path.join(dirname, 'data', RUN_FNAME)
+    if os.path.isfile(fname):
+        return RunFile(fname)
+    return LegacyRun(dirname)
+
+
+def convert(dirname):
+    """ Converts the text results of a run directory to a run file """
+    run = LegacyRun(dirname)
+    cols = {}
+    for name in run.keys():
+        arr = run[name]
+        if name.endswith('/i'):
+            group = name.split('/')[1]
+            N = len(run['positions/'+group]) if 'positions/'+group in run else int(arr.max(initial=0))+1
+            cols[name] = arr.astype(index_dtype(N))
+        else:
+            cols[name] = arr.astype(np.float32)
+    write_run(os.path.join(run.data_dir, RUN_FNAME), cols, run.parameters)
+
+
+if __name__ == "__main__":
+    # convert older results: python -m src.runfile <results dir>
+    for root, dirs, files in os.walk(sys.argv[1]):
+        if 'parameters_bak.json' in files and not os.path.isfile(os.path.join(root, 'data', RUN_FNAME)):
+            print('[+] Converting', root)
+            convert(root)
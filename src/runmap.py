@@ -0,0 +1,87 @@
+"""
+Implementation Notes
+--------------------------------------------------------------------------------
+    | 1: map_runs() applies a per-run analysis function, func(run_dir, **kwargs), to many run directories in a process pool. The runs are sent to the workers in chunks (default: ~4 chunks per worker) to amortize the inter-process overhead, and the results come back in the order of the input directories, whatever order the workers finish in.
+    | 2: Results are yielded as soon as they are available (in order), so callers can write them out incrementally; map_runs_csv() writes one CSV row per run and flushes it, so an interrupted batch keeps the rows computed so far.
+    | 3: A failing run does not stop the batch: its exception is reported and yielded in place of the result. func must be picklable (defined at module level); the workers are forked, so module globals of the caller are available to them.
+"""
+
+import os
+import csv
+import functools
+import traceback
+import concurrent.futures as cf
+
+from tqdm import tqdm
+
+
+def _call(func, kwargs, run_dir):
+    try:
+        return func(run_dir, **kwargs)
+    except Exception as e:
+        return RuntimeError('{0}: {1}'.format(run_dir, ''.join(traceback.format_exception_only(type(e), e)).strip()))
+
+
+def map_runs(func, run_dirs, workers=None, chunksize=None, desc='Runs', **kwargs):
+    """
+    Applies func(run_dir, **kwargs) to every run directory in a process pool (see notes #1-#3).
+
+    Parameters
+    ----------
+    func: callable
+        Per-run analysis function (module-level)
+    run_dirs: list
+        Run directories
+    workers: int
+        Number of processes (default: all cores); 1 runs in the calling process
+    chunksize: int
+        Runs per task (default: about 4 tasks per worker)
+    desc: str
+        Label of the progress bar (None disables it)
+
+    Yields
+    ------
+    (run_dir, result): tuple
+        In the order of run_dirs; result is an Exception if func failed
+    """
+    run_dirs = list(run_dirs)
+    workers = workers or os.cpu_count()
+    chunksize = chunksize or max(len(run_dirs)//(4*workers), 1)
+    call = functools.partial(_call, func, kwargs)
+
+    pbar = tqdm(total=len(run_dirs), desc=desc, disable=desc is None)
+    if workers == 1:
+        results = map(call, run_dirs)
+        pool = None
+    else:
+        pool = cf.ProcessPoolExecutor(workers)
+        results = pool.map(call, run_dirs, chunksize=chunksize)
+
+    try:
+        for run_dir, res in zip(run_dirs, results):
+            pbar.update(1)
+            if isinstance(res, Exception):
+                tqdm.write('[!] ' + str(res))
+            yield run_dir, res
+    finally:
+        pbar.close()
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+
+def map_runs_csv(func, run_dirs, fname, header=None, **kwargs):
+    """ Writes the rows returned by func(run_dir, **kwargs) to a CSV file as they arrive (note #2); func returns a row, a list of rows or None. Returns the number of failed runs """
+    failed = 0
+    with open(fname, 'w', encoding='UTF8', newline='') as fout:
+        writer = csv.writer(fout)
+        if header:
+            writer.writerow(header)
+        for run_dir, rows in map_runs(func, run_dirs, **kwargs):
+            if isinstance(rows, Exception):
+                failed += 1
+                continue
+            if rows is None:
+                continue
+            writer.writerows(rows if rows and isinstance(rows[0], (list, tuple)) else [rows])
+            fout.flush()
+    return failed
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Runs a sweep (a set of configuration files) with a pool of warm workers.
+#
+#   python3 sweep.py run configs/fig3_quantify -sd results -j 64
+#   python3 sweep.py slurm configs/fig3_quantify -sd /beegfs/... -nt 8 -j 32
+#   python3 sweep.py status sweeps/fig3_quantify
+#
+# Every worker imports brian2 and the model once and then runs many points in
+# the same process (run_simulation.py is executed in-process), so the compiled
+# code objects stay loaded and there is no per-point startup cost. Points are
+# run with the result cache (run_simulation.py -rc): restarting a sweep only
+# runs the points without a complete result. Failed points are retried; when a
+# worker dies (e.g. out of memory), the points that were running are rerun one
+# at a time and only the point that crashes again is charged a retry.
+#
+# Backends:
+#   run     local ProcessPoolExecutor with -j workers
+#   slurm   SLURM job array; every array task gets a share of the points and
+#           runs them with its own local pool (one worker per allocated CPU).
+#           The caches are warmed first by a job on a compute node (Brian2
+#           compiles with -march=native; warm_cache.py -sb waits for it).
+#
+# With -sa, the warm-up builds the C++ standalone binaries (one per code
+# signature) and every point only executes its binary.
+#
+# Every attempt is appended to <sweep dir>/status/*.jsonl; `status` merges them
+# into <sweep dir>/status.csv (one row per point: state, attempts, run time,
+# return code, host, log file).
+# -----------------------------------------------------------------------------
+import os
+
+# one simulation per core; keep the numerical libraries single-threaded
+for var in ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS']:
+    os.environ.setdefault(var, '1')
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+import sys
+import csv
+import glob
+import json
+import time
+import runpy
+import socket
+import argparse
+import traceback
+import subprocess
+import contextlib
+import concurrent.futures as cf
+from concurrent.futures.process import BrokenProcessPool
+
+import parameters
+from model.globals import bcolors
+from src import runcache
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'run_simulation.py')
+STATUS_FIELDS = ['index', 'config', 'run_id', 'state', 'attempts', 'run_time', 'code', 'host', 'log']
+
+
+# Workers
+# -------------------------------------------------------------#
+def init_worker():
+    """ Loads brian2 and the model once per worker process """
+    import brian2
+    import model.network
+
+
+def marker(logdir, point):
+    """ File that exists while a point runs; left behind if its worker is killed """
+    return os.path.join(logdir, '{0:05d}.running'.format(point['index']))
+
+
+def run_point(point, resdir, extra, logdir):
+    """ Runs run_simulation.py in-process for one point; returns (return code, run time, log file) """
+    fname = os.path.join(logdir, '{0:05d}_{1}.log'.format(point['index'], os.path.splitext(os.path.basename(point['config']))[0]))
+    start = time.time()
+    code = 0
+    open(marker(logdir, point), 'w').close()
+    with open(fname, 'a') as flog, contextlib.redirect_stdout(flog), contextlib.redirect_stderr(flog):
+        sys.argv = [SCRIPT, '-p', point['config'], '-sd', resdir, '-rc'] + extra
+        try:
+            runpy.run_path(SCRIPT, run_name='__main__')
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else int(e.code is not None)
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            import matplotlib.pyplot as plt
+            plt.close('all')
+    os.remove(marker(logdir, point))
+    return code, time.time()-start, fname
+
+
+# Status
+# -------------------------------------------------------------#
+class StatusLog:
+    """ Appends one JSON record per attempt to a per-process file in <sweep dir>/status """
+
+    def __init__(self, sweep_dir):
+        os.makedirs(os.path.join(sweep_dir, 'status'), exist_ok=True)
+        self.host = socket.gethostname()
+        self.fname = os.path.join(sweep_dir, 'status', '{0}_{1}.jsonl'.format(self.host, os.getpid()))
+
+    def write(self, point, state, attempts, run_time=None, code=None, log=None):
+        record = dict(point, state=state, attempts=attempts, run_time=run_time, code=code, host=self.host, log=log, time=time.time())
+        with open(self.fname, 'a') as fout:
+            fout.write(json.dumps(record) + '\n')
+
+
+def status_table(sweep_dir):
+    """ Merges the status records of a sweep (latest record per point) and writes status.csv; returns the rows """
+    with open(os.path.join(sweep_dir, 'points.json')) as fin:
+        points = json.load(fin)['points']
+    rows = {point['index']:dict(point, state='pending', attempts=0) for point in points}
+
+    records = []
+    for fname in glob.glob(os.path.join(sweep_dir, 'status', '*.jsonl')):
+        with open(fname) as fin:
+            records += [json.loads(line) for line in fin if line.strip()]
+    for record in sorted(records, key=lambda rec: rec['time']):
+        rows[record['index']].update(record)
+
+    rows = [rows[idx] for idx in sorted(rows)]
+    with open(os.path.join(sweep_dir, 'status.csv'), 'w', newline='') as fout:
+        writer = csv.DictWriter(fout, fieldnames=STATUS_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+    return rows
+
+
+# Backends
+# -------------------------------------------------------------#
+def run_local(sweep_dir, points, workers):
+    """ Runs `points` on a local pool of warm workers, retrying failed points (also a worker crash, see the header) """
+    with open(os.path.join(sweep_dir, 'points.json')) as fin:
+        sweep = json.load(fin)
+    logdir = os.path.join(sweep_dir, 'logs')
+    os.makedirs(logdir, exist_ok=True)
+    status = StatusLog(sweep_dir)
+
+    attempts = {point['index']:0 for point in points}
+    queue = list(points)
+    suspects = [] # running when a worker died
+    failed = []
+    ndone = 0
+    while queue or suspects:
+        # suspects run alone, so that a crash identifies the point
+        isolated = bool(suspects)
+        batch = [suspects.pop(0)] if isolated else queue
+        queue = queue if isolated else []
+        crashed = []
+
+        with cf.ProcessPoolExecutor(1 if isolated else workers, initializer=init_worker) as pool:
+            futures = {}
+
+            def submit(point):
+                attempts[point['index']] += 1
+                status.write(point, 'running', attempts[point['index']])
+                if os.path.exists(marker(logdir, point)):
+                    os.remove(marker(logdir, point))
+                futures[pool.submit(run_point, point, sweep['resdir'], sweep['extra'], logdir)] = point
+
+            for point in batch:
+                submit(point)
+
+            while futures:
+                done, _ = cf.wait(futures, return_when=cf.FIRST_COMPLETED)
+                for fut in done:
+                    point = futures.pop(fut)
+                    try:
+                        code, run_time, log = fut.result()
+                    except BrokenProcessPool:
+                        # a worker died (e.g. out of memory); the other workers are terminated with it
+                        crashed = [point] + list(futures.values())
+                        futures = {}
+                        break
+
+                    if code == 0:
+                        ndone += 1
+                        status.write(point, 'done', attempts[point['index']], run_time, code, log)
+                        print('[+] [{0}/{1}] {2} ({3:.1f} min)'.format(ndone, len(points), point['config'], run_time/60))
+                    elif attempts[point['index']] <= sweep['retries']:
+                        status.write(point, 'retry', attempts[point['index']], run_time, code, log)
+                        print(bcolors.YELLOW + '[!]' + bcolors.ENDC + ' {0} failed with code {1}; retrying'.format(point['config'], code))
+                        submit(point)
+                    else:
+                        failed.append(point)
+                        status.write(point, 'failed', attempts[point['index']], run_time, code, log)
+                        print(bcolors.RED + '[!]' + bcolors.ENDC + ' {0} failed with code {1}; see {2}'.format(point['config'], code, log))
+
+        # only the point that crashed is charged: the one running alone, or the only one running;
+        # the other running points (all of them if none had started) are rerun alone, the waiting ones are resubmitted
+        running = [point for point in crashed if os.path.exists(marker(logdir, point))] or crashed
+        culprit = batch[0] if isolated else (running[0] if len(running) == 1 else None)
+        for point in crashed:
+            if os.path.exists(marker(logdir, point)):
+                os.remove(marker(logdir, point))
+            if point is culprit:
+                if attempts[point['index']] > sweep['retries']:
+                    failed.append(point)
+                    status.write(point, 'failed', attempts[point['index']], code=-1)
+                    print(bcolors.RED + '[!]' + bcolors.ENDC + ' {0}: worker died; no retries left'.format(point['config']))
+                else:
+                    status.write(point, 'retry', attempts[point['index']], code=-1)
+                    print(bcolors.YELLOW + '[!]' + bcolors.ENDC + ' {0}: worker died; retrying'.format(point['config']))
+                    queue.append(point)
+                continue
+            attempts[point['index']] -= 1
+            status.write(point, 'pending', attempts[point['index']])
+            if point in running:
+                suspects.append(point)
+            else:
+                queue.append(point)
+
+    return failed
+
+
+def sbatch_header(name, cpus, mem_per_cpu, time_limit, output, partition=None, array=None):
+    """ #SBATCH lines of a single-task job (array job if `array` is given) """
+    lines = ['#!/usr/bin/env bash',
+             '#SBATCH --job-name={0}'.format(name)]
+    if array:
+        lines.append('#SBATCH --array={0}'.format(array))
+    lines += ['#SBATCH --ntasks=1',
+              '#SBATCH --cpus-per-task={0}'.format(cpus),
+              '#SBATCH --mem-per-cpu={0}'.format(mem_per_cpu),
+              '#SBATCH --time={0}'.format(time_limit),
+              '#SBATCH --output={0}'.format(output)]
+    if partition:
+        lines.append('#SBATCH --partition={0}'.format(partition))
+    return lines + ['', 'cd {0}'.format(os.path.dirname(SCRIPT))]
+
+
+def write_job(fname, lines):
+    """ Writes a job script """
+    with open(fname, 'w') as fout:
+        fout.write('\n'.join(lines) + '\n')
+    print('[+] Job script:', fname)
+
+
+def submit_slurm(sweep_dir, ntasks, cpus, mem_per_cpu, time_limit, partition=None, dry_run=False):
+    """ Writes and submits a SLURM array job; every array task runs its share of the points with the local backend """
+    name = os.path.basename(os.path.normpath(sweep_dir))
+    outdir = os.path.abspath(sweep_dir)
+
+    fname = os.path.join(sweep_dir, 'sweep.sbatch')
+    write_job(fname, sbatch_header('sweep_'+name, cpus, mem_per_cpu, time_limit, os.path.join(outdir, 'slurm_%A_%a.out'), partition, '0-{0}'.format(ntasks-1)) +
+                     ['python3 sweep.py worker {0} --task $SLURM_ARRAY_TASK_ID --ntasks {1} -j $SLURM_CPUS_PER_TASK'.format(outdir, ntasks)])
+
+    if dry_run:
+        return
+    subprocess.check_call(['sbatch', fname])
+
+
+# Sweep setup
+# -------------------------------------------------------------#
+def warm_args(args, sweep_dir):
+    """ Arguments of warm_cache.py for the configurations of a sweep (standalone builds with -sa; a SLURM job for the slurm backend) """
+    items = [os.path.abspath(item) for item in args.configs]
+    if args.standalone:
+        items += ['--standalone', os.path.abspath(args.standalone), '--threads', str(args.threads)]
+    if args.command == 'slurm':
+        items += ['--slurm', '--mem_per_cpu', args.mem_per_cpu, '--time', args.time, '--output', os.path.join(os.path.abspath(sweep_dir), 'slurm_warm_%j.out')]
+        items += ['--partition', args.partition] if args.partition else []
+    return items
+
+
+def prepare(args, warm=True):
+    """ Lists the pending points of a sweep and saves them in <sweep dir>/points.json; warms the caches first if `warm` (see warm_args) """
+    fconfigs = []
+    for item in args.configs:
+        fconfigs += sorted(glob.glob(os.path.join(item, '*.json'))) if os.path.isdir(item) else [item]
+
+    sweep_dir = args.sweep_dir or os.path.join('sweeps', os.path.basename(os.path.normpath(args.configs[0])).replace('.json', ''))
+    os.makedirs(sweep_dir, exist_ok=True)
+
+    todo = set(runcache.pending(fconfigs, args.save_dir))
+    points = [{'index':idx, 'config':os.path.abspath(fconf), 'run_id':runcache.run_hash(parameters.load(fconf))}
+              for idx, fconf in enumerate(fconfigs)]
+    extra = args.extra + (['--standalone', os.path.abspath(args.standalone), '--threads', str(args.threads)] if args.standalone else [])
+    sweep = {'resdir':os.path.abspath(args.save_dir), 'extra':extra, 'retries':args.retries, 'points':points}
+    with open(os.path.join(sweep_dir, 'points.json'), 'w') as fout:
+        json.dump(sweep, fout, indent=4)
+
+    status = StatusLog(sweep_dir)
+    for point, fconf in zip(points, fconfigs):
+        if fconf not in todo:
+            status.write(point, 'done', 0)
+
+    print('[+] Sweep directory:', sweep_dir)
+    print('[+] {0}/{1} points pending'.format(len(todo), len(fconfigs)))
+
+    if todo and warm and not args.no_warm:
+        print('[+] Warming caches...')
+        subprocess.check_call([sys.executable, 'warm_cache.py'] + warm_args(args, sweep_dir), cwd=os.path.dirname(SCRIPT))
+
+    return sweep_dir, [point for point, fconf in zip(points, fconfigs) if fconf in todo]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run a parameter sweep with warm workers')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    for name, help in [('run', 'run the sweep on this machine'), ('slurm', 'submit the sweep as a SLURM job array')]:
+        sub = subparsers.add_parser(name, help=help)
+        sub.add_argument('configs', nargs='+', type=str, help='Configuration files (json) and/or directories containing them')
+        sub.add_argument('-sd', '--save_dir', nargs='?', type=str, default='results', help='Destination directory of the results')
+        sub.add_argument('-sw', '--sweep_dir', nargs='?', type=str, default=None, help='Directory of the sweep logs and status table (default: sweeps/<config dir>)')
+        sub.add_argument('-r', '--retries', nargs='?', type=int, default=2, help='Number of retries of a failed point')
+        sub.add_argument('-nw', '--no_warm', action='store_true', default=False, help='Do not warm the Cython/connectivity caches first')
+        sub.add_argument('-x', '--extra', nargs='*', default=[], help='Extra arguments for run_simulation.py (e.g. -x=--text)')
+        sub.add_argument('-j', '--jobs', nargs='?', type=int, default=os.cpu_count(), help='Workers (per array task for slurm)')
+        sub.add_argument('-sa', '--standalone', nargs='?', type=str, default=None, help='Run with the C++ standalone device; the binaries are built in this directory by the warm-up and only executed by the points')
+        sub.add_argument('-th', '--threads', nargs='?', type=int, default=0, help='OpenMP threads per standalone run')
+
+    sub = subparsers.choices['slurm']
+    sub.add_argument('-nt', '--ntasks', nargs='?', type=int, default=1, help='Number of array tasks (allocations)')
+    sub.add_argument('-mem', '--mem_per_cpu', nargs='?', type=str, default='16G', help='Memory per CPU')
+    sub.add_argument('-t', '--time', nargs='?', type=str, default='24:00:00', help='Time limit per array task')
+    sub.add_argument('-pa', '--partition', nargs='?', type=str, default=None, help='SLURM partition')
+    sub.add_argument('-dr', '--dry_run', action='store_true', default=False, help='Only write the job script')
+
+    sub = subparsers.add_parser('worker', help='run the share of one array task (used by the SLURM job script)')
+    sub.add_argument('sweep_dir', type=str)
+    sub.add_argument('--task', type=int, default=0)
+    sub.add_argument('--ntasks', type=int, default=1)
+    sub.add_argument('-j', '--jobs', nargs='?', type=int, default=os.cpu_count())
+
+    sub = subparsers.add_parser('status', help='merge the status records into status.csv and print a summary')
+    sub.add_argument('sweep_dir', type=str)
+
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        sweep_dir, points = prepare(args)
+        start = time.time()
+        failed = run_local(sweep_dir, points, args.jobs)
+        status_table(sweep_dir)
+        print('[+] Done in {0:.1f} min; {1} failed'.format((time.time()-start)/60, len(failed)))
+        sys.exit(1 if failed else 0)
+
+    elif args.command == 'slurm':
+        sweep_dir, points = prepare(args, warm=not args.dry_run) # warmed by a job on a compute node
+        if points:
+            ntasks = min(args.ntasks, len(points))
+            with open(os.path.join(sweep_dir, 'points.json')) as fin:
+                sweep = json.load(fin)
+            sweep['pending'] = [point['index'] for point in points]
+            with open(os.path.join(sweep_dir, 'points.json'), 'w') as fout:
+                json.dump(sweep, fout, indent=4)
+            submit_slurm(sweep_dir, ntasks, args.jobs, args.mem_per_cpu, args.time, args.partition, args.dry_run)
+
+    elif args.command == 'worker':
+        with open(os.path.join(args.sweep_dir, 'points.json')) as fin:
+            sweep = json.load(fin)
+        pending = set(sweep.get('pending', [point['index'] for point in sweep['points']]))
+        points = [point for point in sweep['points'] if point['index'] in pending]
+        failed = run_local(args.sweep_dir, points[args.task::args.ntasks], args.jobs)
+        sys.exit(1 if failed else 0)
+
+    elif args.command == 'status':
+        rows = status_table(args.sweep_dir)
+        states = {}
+        for row in rows:
+            states[row['state']] = states.get(row['state'], 0) + 1
+        print(' | '.join('{0}: {1}'.format(state, cnt) for state, cnt in sorted(states.items())))
+        for row in rows:
+            if row['state'] == 'failed':
+                print('[-]', row['config'], 'code', row['code'], row['log'])
+        print('[+] Status table:', os.path.join(args.sweep_dir, 'status.csv'))
@@ -0,0 +1,61 @@
+import os
+import json
+import shutil
+
+import numpy as np
+import pytest
+
+from src import runfile
+from src.catalog import Catalog
+
+
+def make_run(dirname, I_stim, kN, n_spikes, duration=1., dt=1e-3):
+    """ Results directory with a run file: 100 CA1 E neurons, n_spikes spikes and a 6 Hz CA1 rate """
+    os.makedirs(os.path.join(dirname, 'data'))
+    params = {'Kuramoto':{'kN':kN}, 'stimulation':{'I':[I_stim], 'target':'CA1'}, 'simulation':{'duration':duration, 'dt':dt}}
+    with open(os.path.join(dirname, 'parameters_bak.json'), 'w') as fout:
+        json.dump(params, fout)
+    tv = np.arange(0, duration, dt)
+    cols = {'positions/CA1_pyCAN':np.zeros((100, 3), dtype=np.float32),
+            'spikes/CA1_pyCAN/i':np.zeros(n_spikes, dtype=np.uint16),
+            'spikes/CA1_pyCAN/t':np.linspace(0, duration*1e3, n_spikes, dtype=np.float32),
+            'rate_CA1_E':(1+np.sin(2*np.pi*6*tv)).astype(np.float32)}
+    runfile.write_run(os.path.join(dirname, 'data', runfile.RUN_FNAME), cols, params, {'run_time':10.})
+
+
+@pytest.fixture
+def results(tmp_path):
+    make_run(str(tmp_path/'res'/'a'), 10., 15, 500)
+    make_run(str(tmp_path/'res'/'b'), 20., 15, 1000)
+    make_run(str(tmp_path/'res'/'c'), 20., 5, 2000)
+    make_run(str(tmp_path/'res_old'/'d'), 10., 5, 100) # sibling root with the same prefix
+    return tmp_path
+
+
+def test_index_and_query(results):
+    with Catalog(str(results/'catalog.sqlite')) as cat:
+        assert cat.index(str(results/'res'), verbose=False) == 3
+        assert cat.index(str(results/'res'), verbose=False) == 0 # incremental
+
+        runs = cat.query()
+        assert [os.path.basename(run['path']) for run in runs] == ['a', 'b', 'c']
+        assert runs[0]['rates']['CA1_pyCAN'] == pytest.approx(5.)
+        assert runs[0]['rhythm_freq'] == pytest.approx(6.)
+        assert runs[0]['run_time'] == 10.
+
+        assert [os.path.basename(run['path']) for run in cat.query({'stimulation.I':20.})] == ['b', 'c']
+        assert [os.path.basename(run['path']) for run in cat.query({'stimulation.I':20., 'Kuramoto.kN':(10, 20)})] == ['b']
+        assert [os.path.basename(run['path']) for run in cat.query({'rate.CA1_pyCAN':(8., 25.)})] == ['b', 'c']
+        assert [os.path.basename(run['path']) for run in cat.query({'stimulation.target':'CA1'})] == ['a', 'b', 'c']
+        assert cat.query({'stimulation.target':'CA3'}) == []
+
+
+def test_index_removes_deleted_runs_under_root_only(results):
+    with Catalog(str(results/'catalog.sqlite')) as cat:
+        cat.index(str(results/'res'), verbose=False)
+        cat.index(str(results/'res_old'), verbose=False)
+        assert len(cat.query()) == 4
+
+        shutil.rmtree(results/'res'/'a')
+        cat.index(str(results/'res'), verbose=False)
+        assert sorted(os.path.basename(run['path']) for run in cat.query()) == ['b', 'c', 'd']
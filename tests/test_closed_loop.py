@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('brian2')
+
+from brian2 import NeuronGroup, TimedArray, Network, prefs, second, ms, nA, Hz
+
+from model.closed_loop import ClosedLoopStimulation, pulse_train, wrap
+
+stim = {'dt':1e-4, 'I':[10.], 'pulse_width':[1e-3], 'stim_freq':5, 'pulse_freq':100, 'nr_of_trains':1, 'nr_of_pulses':1, 'ipi':1e-4}
+
+
+def oscillator():
+    """ Order parameter (x, y) rotating at 6 Hz, phase 0 at t = 0 """
+    G = NeuronGroup(1, 'dx/dt = -2*pi*f*y : 1\ndy/dt = 2*pi*f*x : 1', namespace={'f':6*Hz}, method='rk4', name='G_pop_avg_cl')
+    G.x = 1.
+    return G
+
+
+def test_wrap():
+    np.testing.assert_allclose(wrap(np.array([0., np.pi, -np.pi, 3*np.pi/2, -3*np.pi/2, 2*np.pi])),
+                               [0., -np.pi, -np.pi, -np.pi/2, np.pi/2, 0.], atol=1e-12)
+
+
+def test_crossed():
+    inputs_stim = TimedArray(np.zeros(10)*nA, dt=0.1*ms)
+    cl = ClosedLoopStimulation({'signal':'phase', 'target':0.}, stim, inputs_stim, G_pop_avg=oscillator())
+    assert not cl.crossed(0.1) # no previous value
+
+    for previous, value, expected in [(-0.1, 0.1, True), (-0.1, 0., True), (0.1, 0.2, False), (-0.2, -0.1, False),
+                                      (3.1, -3.1, False), (-3.1, 3.1, False)]: # phase wraps are not crossings
+        cl.previous = previous
+        assert cl.crossed(value) == expected, (previous, value)
+
+    # no wrap check for the drive
+    G_S2R = NeuronGroup(1, 'Y : 1', name='G_S2R_cl')
+    cl = ClosedLoopStimulation({'signal':'drive', 'target':5.}, stim, inputs_stim, G_S2R=G_S2R)
+    cl.previous = -4.
+    assert cl.crossed(4.)
+
+
+def test_triggers():
+    prefs.codegen.target = 'numpy'
+    duration = 0.9
+    inputs_stim = TimedArray(np.zeros(int(round(duration/stim['dt']))+1)*nA, dt=stim['dt']*second)
+    G = oscillator()
+    cl = ClosedLoopStimulation({'signal':'phase', 'target':0., 'start':0.1, 'refractory':0.2, 'max_trains':3}, stim, inputs_stim, G_pop_avg=G)
+    net = Network(G, cl)
+    net.run(duration*second)
+
+    # crossings every 1/6 s; the one at 2/6 s is within the refractory period, max_trains stops after 5/6 s
+    np.testing.assert_allclose(cl.triggers, [1/6, 3/6, 5/6], atol=3e-4)
+
+    # one train per trigger in the waveform, nothing else
+    train = pulse_train(stim)
+    expected = np.zeros(len(inputs_stim.values))
+    for t in cl.triggers:
+        i0 = int(round(t/stim['dt']))
+        expected[i0:i0+len(train)] = train
+    np.testing.assert_allclose(cl.delivered(), expected, rtol=1e-9)
+
+    cl.reset()
+    assert cl.triggers == [] and not cl.delivered().any()
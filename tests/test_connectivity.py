@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('brian2')
+
+from model import connectivity
+
+
+def expected_synapses(pos_pre, pos_post, p, sigma, autapses=True):
+    d2 = np.sum((pos_pre[:, np.newaxis, :] - pos_post[np.newaxis, :, :])**2, axis=-1)
+    prob = p*np.exp(-d2/(2*sigma**2))
+    if not autapses:
+        np.fill_diagonal(prob, 0.)
+    return prob.sum()
+
+
+def check_count(n, expected):
+    # Poisson-binomial: variance <= mean
+    assert abs(n - expected) < 5*np.sqrt(expected)
+
+
+def test_kdtree_indices():
+    rng = np.random.default_rng(5)
+    sigma, p = 350e-6, 0.5
+    pos = rng.random((1500, 3))*np.array([5e-3, 5e-3, 5e-3])
+    i, j, mass = connectivity.kdtree_indices(pos, pos, p, sigma, cutoff=4., autapses=False, rng=np.random.default_rng(0))
+
+    check_count(len(i), expected_synapses(pos, pos, p, sigma, autapses=False))
+    assert not np.any(i == j)
+    assert len(np.unique(i*len(pos) + j)) == len(i) # no duplicates
+    assert mass < 1e-3
+
+    # Gaussian kernel: std of the coordinate differences ~ sigma, away from the borders
+    inner = np.all((pos[i] > 1.5e-3) & (pos[i] < 3.5e-3), axis=1)
+    d = pos[i[inner]] - pos[j[inner]]
+    np.testing.assert_allclose(d.std(axis=0), sigma, rtol=0.05)
+    assert np.all(np.sqrt(np.sum(d**2, axis=1)) <= 4*sigma)
+
+    # same generator state -> same connectivity
+    i2, j2, _ = connectivity.kdtree_indices(pos, pos, p, sigma, cutoff=4., autapses=False, rng=np.random.default_rng(0))
+    np.testing.assert_array_equal(i, i2)
+    np.testing.assert_array_equal(j, j2)
+
+
+def test_banded_indices():
+    rng = np.random.default_rng(6)
+    sigma, p = 1000e-6, 0.2
+    z_pre = rng.random(2000)*15e-3
+    z_post = np.sort(rng.random(1500)*15e-3)
+    i, j, mass = connectivity.banded_indices(z_pre, z_post, p, sigma, cutoff=4., rng=np.random.default_rng(0))
+
+    check_count(len(i), expected_synapses(z_pre[:, np.newaxis], z_post[:, np.newaxis], p, sigma))
+    assert len(np.unique(i*len(z_post) + j)) == len(i)
+    assert mass < 1e-3
+
+    inner = (z_pre[i] > 5e-3) & (z_pre[i] < 10e-3)
+    dz = z_pre[i[inner]] - z_post[j[inner]]
+    assert dz.std() == pytest.approx(sigma, rel=0.05)
+    assert abs(dz.mean()) < 0.05*sigma
+    assert np.all(np.abs(dz) <= 4*sigma)
+
+
+def test_get_rng_per_projection():
+    a = connectivity.get_rng(42, 'EC_pyCANtoDG_py').random(5)
+    np.testing.assert_array_equal(a, connectivity.get_rng(42, 'EC_pyCANtoDG_py').random(5))
+    assert not np.array_equal(a, connectivity.get_rng(42, 'EC_pyCANtoCA3_pyCAN').random(5))
+    assert not np.array_equal(a, connectivity.get_rng(43, 'EC_pyCANtoDG_py').random(5))
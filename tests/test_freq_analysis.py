@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from src import freq_analysis as fa
+
+
+def loop_counts(spikes, duration, window_size, overlap):
+    """ Spikes per window, one window at a time (left <= t < right) """
+    centers = fa.window_centers(duration, window_size, overlap)
+    return np.array([np.count_nonzero((spikes >= c-window_size/2) & (spikes < c+window_size/2)) for c in centers])
+
+
+@pytest.mark.parametrize('window_size, overlap', [(5e-3, 0.9), (10e-3, 0.5), (1e-3, 0.)])
+def test_sliding_spike_counts(window_size, overlap):
+    rng = np.random.default_rng(1)
+    duration = 2.
+    spikes = rng.random(5000)*duration
+    t, counts = fa.sliding_spike_counts(spikes, duration, window_size, overlap)
+    np.testing.assert_array_equal(t, fa.window_centers(duration, window_size, overlap))
+    np.testing.assert_array_equal(counts, loop_counts(spikes, duration, window_size, overlap))
+
+    # per label
+    labels = rng.integers(0, 4, len(spikes))
+    _, counts_lbl = fa.sliding_spike_counts(spikes, duration, window_size, overlap, labels=labels, n_labels=5)
+    assert counts_lbl.shape == (5, len(t))
+    for lbl in range(5):
+        np.testing.assert_array_equal(counts_lbl[lbl], loop_counts(spikes[labels == lbl], duration, window_size, overlap))
+
+
+def loop_modulation_index(sig_phase, sig_amp, nbins=18):
+    """ Tort et al. (2010): mean amplitude per phase bin, KL distance to the uniform distribution """
+    edges = np.linspace(-np.pi, np.pi, nbins+1)
+    amp = np.array([sig_amp[(sig_phase >= edges[k]) & (sig_phase < edges[k+1])].mean() for k in range(nbins)])
+    P = amp/amp.sum()
+    dist_KL = np.sum(P*np.log(P*nbins))
+    return dist_KL/np.log(nbins), dist_KL
+
+
+def coupled_signals(rng, shape, N):
+    sig_phase = rng.uniform(-np.pi, np.pi, shape+(N,))
+    sig_amp = 1 + rng.random(shape+(1,))*np.cos(sig_phase) + 0.1*rng.random(shape+(N,))
+    return sig_phase, sig_amp
+
+
+def test_modulation_index():
+    rng = np.random.default_rng(3)
+    sig_phase, sig_amp = coupled_signals(rng, (2, 3), 5000)
+    MI, dist_KL = fa.modulation_index(sig_phase, sig_amp)
+    assert MI.shape == (2, 3)
+    for idx in np.ndindex(2, 3):
+        MI_ref, KL_ref = loop_modulation_index(sig_phase[idx], sig_amp[idx])
+        assert MI[idx] == pytest.approx(MI_ref, rel=1e-9)
+        assert dist_KL[idx] == pytest.approx(KL_ref, rel=1e-9)
+
+    MI_one, _ = fa.my_modulation_index(sig_phase[0, 0], sig_amp[0, 0])
+    assert MI_one == pytest.approx(MI[0, 0])
+
+
+def test_sliding_modulation_index():
+    rng = np.random.default_rng(4)
+    sig_phase, sig_amp = coupled_signals(rng, (2,), 6000)
+    window, step = 2000, 500
+    MI, dist_KL, starts = fa.sliding_modulation_index(sig_phase, sig_amp, window, step)
+    np.testing.assert_array_equal(starts, np.arange(0, 6000-window+1, step))
+    assert MI.shape == (2, len(starts))
+    for k in range(2):
+        for w, s in enumerate(starts):
+            MI_ref, KL_ref = loop_modulation_index(sig_phase[k, s:s+window], sig_amp[k, s:s+window])
+            assert MI[k, w] == pytest.approx(MI_ref, rel=1e-9)
+            assert dist_KL[k, w] == pytest.approx(KL_ref, rel=1e-9)
+
+
+def test_binned_spike_counts():
+    rng = np.random.default_rng(2)
+    duration, bin_size, window_size, overlap = 1., 0.5e-3, 5e-3, 0.9
+    N_bins = int(round(duration/bin_size))
+    # spikes at the bin centers: the windows sum whole bins
+    bins = rng.integers(0, N_bins, (3, 4000))
+    counts = np.stack([np.bincount(b, minlength=N_bins) for b in bins])
+
+    t, binned = fa.binned_spike_counts(counts, bin_size, window_size, overlap)
+    np.testing.assert_array_equal(t, fa.window_centers(duration, window_size, overlap))
+    for k in range(3):
+        np.testing.assert_array_equal(binned[k], loop_counts((bins[k]+0.5)*bin_size, duration, window_size, overlap))
+
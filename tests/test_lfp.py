@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('brian2')
+
+from brian2 import NeuronGroup, Network, prefs, ms, metre
+
+from model import lfp
+
+
+def test_weight_matrix():
+    rng = np.random.default_rng(0)
+    electrodes = lfp.electrode_positions({'electrodes':[[0., 0., 0.]], 'line':{'n':3, 'start':[1., 0., 0.], 'end':[3., 0., 0.]}})
+    np.testing.assert_allclose(electrodes, [[0., 0., 0.], [1., 0., 0.], [2., 0., 0.], [3., 0., 0.]])
+
+    positions = np.concatenate([rng.uniform(-1., 4., (500, 3)), electrodes[:1]]) # one soma right at a contact
+    W = lfp.weight_matrix(electrodes, positions, cutoff=1., r_min=10e-3)
+    assert W.shape == (4, 501)
+
+    # brute force: 1/max(r, r_min) within the cutoff
+    r = np.linalg.norm(electrodes[:, np.newaxis] - positions[np.newaxis], axis=-1)
+    expected = np.where(r <= 1., 1./np.maximum(r, 10e-3), 0.)
+    np.testing.assert_allclose(W.toarray(), expected)
+    assert W[0, 500] == pytest.approx(100.)
+
+
+def test_make_lfp():
+    prefs.codegen.target = 'numpy'
+    eqs = 'v : 1\nx_soma : metre\ny_soma : metre\nz_soma : metre'
+    groups = {'A':NeuronGroup(3, eqs, name='A_lfp'), 'B':NeuronGroup(2, eqs, name='B_lfp')}
+    groups['A'].x_soma = np.array([0., 0.5, 2.])*1e-3*metre
+    groups['B'].x_soma = np.array([0.25, 5.])*1e-3*metre
+    groups['A'].v = [1., 2., 3.]
+    groups['B'].v = [4., 5.]
+
+    red = lfp.make_lfp({'groups':['A', 'B'], 'electrodes':[[0., 0., 0.]], 'cutoff':1., 'r_min':0.1, 'dt':None}, groups, 1e-3)
+    net = Network(list(groups.values()) + [red])
+    net.run(2*ms)
+    out = red.collect()
+
+    # somata at 0, 0.5 and 0.25 mm are within the cutoff
+    expected = 1./0.1 + 2./0.5 + 4./0.25
+    np.testing.assert_allclose(out['lfp.lfp'], [expected, expected])
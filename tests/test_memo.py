@@ -0,0 +1,70 @@
+import os
+import sys
+import importlib
+
+import numpy as np
+
+from src import memo
+
+
+def write_module(dirname, body):
+    with open(os.path.join(dirname, 'memo_mod.py'), 'w') as fout:
+        fout.write(body)
+    # the file hashes are keyed by (path, size, mtime)
+    st = os.stat(os.path.join(dirname, 'memo_mod.py'))
+    os.utime(os.path.join(dirname, 'memo_mod.py'), ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+
+def load_module(dirname):
+    sys.modules.pop('memo_mod', None)
+    importlib.invalidate_caches()
+    return importlib.import_module('memo_mod')
+
+
+def test_memoize_hit_and_arguments(tmp_path):
+    calls = []
+
+    def f(x, scale=1.):
+        calls.append(1)
+        return x*scale
+
+    g = memo.memoize(f, cache_dir=str(tmp_path))
+    x = np.arange(5.)
+    np.testing.assert_array_equal(g(x), x)
+    np.testing.assert_array_equal(g(x.copy()), x) # same content
+    assert len(calls) == 1
+    g(x, scale=2.)
+    g(x+1)
+    assert len(calls) == 3
+
+    # files are hashed by content
+    fname = tmp_path/'data.txt'
+    np.savetxt(fname, x)
+    loadtxt = memo.memoize(np.loadtxt, cache_dir=str(tmp_path))
+    np.testing.assert_array_equal(loadtxt(str(fname)), x)
+    key = memo.call_key(memo.func_hash(np.loadtxt), (str(fname),), {})
+    np.savetxt(fname, x+1)
+    os.utime(fname, ns=(0, os.stat(fname).st_mtime_ns + 10**9))
+    assert memo.call_key(memo.func_hash(np.loadtxt), (str(fname),), {}) != key
+    np.testing.assert_array_equal(loadtxt(str(fname)), x+1)
+
+
+def test_key_invalidation(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(str(tmp_path))
+    write_module(str(tmp_path), 'K = 1\n\ndef f(x):\n    return x*K\n')
+    mod = load_module(str(tmp_path))
+    h = memo.func_hash(mod.f)
+    key = memo.call_key(h, (2,), {})
+    assert memo.call_key(h, (2,), {}) == key
+    assert memo.call_key(h, (3,), {}) != key
+    assert memo.call_key(h, (2,), {}, version=2) != key
+
+    # editing a constant of the defining module (not the function) changes the key
+    write_module(str(tmp_path), 'K = 2\n\ndef f(x):\n    return x*K\n')
+    mod = load_module(str(tmp_path))
+    assert memo.func_hash(mod.f) != h
+
+    g = memo.memoize(mod.f, cache_dir=str(tmp_path/'cache'))
+    assert g(2) == 4
+    assert g(2) == 4
+    assert g.clear() == 1
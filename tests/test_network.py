@@ -0,0 +1,48 @@
+import copy
+
+import numpy as np
+import pytest
+
+pytest.importorskip('brian2')
+
+from brian2 import NeuronGroup, Network, prefs, second, ms, nA, Hz
+
+import parameters
+from model import settings
+from model.network import NetworkHandle
+
+
+def oscillator_handle(f=6., k=10.):
+    """ Hand-built NetworkHandle around a single phase oscillator: d(phase)/dt = 2*pi*f + k*stimulation [nA] """
+    settings.init(copy.deepcopy(parameters._data))
+    handle = NetworkHandle({})
+    handle.dt = 0.1*ms
+    handle.duration = 0.3*second
+    handle.stim_dt = 1e-4
+    handle.fixed_input = False
+    handle.namespace.update({'w':2*np.pi*f*Hz, 'k':k*Hz/nA})
+    handle.G_pop_avg = NeuronGroup(1, 'dth/dt = w + k*inputs_stim(t) : 1\nx = cos(th) : 1\ny = sin(th) : 1', name='G_pop_avg_prc')
+    handle.net = Network(handle.G_pop_avg)
+    return handle
+
+
+def test_phase_response():
+    prefs.codegen.target = 'numpy'
+    handle = oscillator_handle()
+    trains = {'none':np.zeros(100), 'pulse':np.ones(100)} # 10 ms of 1 nA
+    out = list(handle.phase_response([0.05, 0.12], trains, window=0.05))
+
+    assert [onset for onset, _, _ in out] == [0.05, 0.12]
+    for onset, phase0, d_phase in out:
+        # the unperturbed network is restored after every onset
+        assert phase0 == pytest.approx((2*np.pi*6*onset + np.pi) % (2*np.pi) - np.pi, abs=1e-6)
+        assert d_phase['none'] == pytest.approx(0., abs=1e-9)
+        assert d_phase['pulse'] == pytest.approx(10*0.01, abs=1e-6) # k * 1 nA * 10 ms
+    assert not handle.xstim.any()
+
+
+def test_phase_response_needs_kuramoto():
+    handle = oscillator_handle()
+    handle.fixed_input = True
+    with pytest.raises(NotImplementedError):
+        next(handle.phase_response([0.05], {'none':np.zeros(1)}, window=0.05))
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('brian2')
+
+from scipy import sparse
+from brian2 import NeuronGroup, Network, prefs, ms
+
+from model.reduction import PopulationReduction
+
+
+def test_channels_and_state():
+    prefs.codegen.target = 'numpy'
+    G = NeuronGroup(4, 'dv/dt = 1/ms : 1', name='G_red')
+    H = NeuronGroup(2, 'v : 1', name='H_red')
+    G.v = [1., 2., 3., 4.]
+    H.v = [10., 20.]
+    W = np.array([[1., 0., 0., 0., 1., 0.], [0., 0., 0., 0., 0., 2.]])
+
+    red = PopulationReduction('red', 1e-3)
+    red.add('mean', G)
+    red.add('subset', G, indices=[0, 3])
+    red.add('vector', H, weights=np.array([1., -1.]))
+    red.add('matrix', [G, H], weights=sparse.csr_matrix(W))
+
+    # one sample per ms at the start of the step: G.v grows by 1 per ms
+    net = Network(G, H, red)
+    net.run(2*ms)
+    out = red.collect()
+    np.testing.assert_allclose(out['red.mean'], [2.5, 3.5])
+    np.testing.assert_allclose(out['red.subset'], [2.5, 3.5])
+    np.testing.assert_allclose(out['red.vector'], [-10., -10.])
+    assert out['red.matrix'].shape == (2, 2)
+    np.testing.assert_allclose(out['red.matrix'], [[11., 12.], [40., 40.]])
+
+    # the samples follow store/restore and are emptied by clear()
+    net.store('red')
+    net.run(1*ms)
+    assert len(red.collect()['red.mean']) == 3
+    net.restore('red')
+    np.testing.assert_allclose(red.collect()['red.mean'], [2.5, 3.5])
+    red.clear()
+    assert red.collect()['red.mean'].shape == (0,)
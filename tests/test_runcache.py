@@ -0,0 +1,35 @@
+import copy
+
+from src import runcache
+
+config = {'seed_val':42,
+          'Kuramoto':{'N':250, 'f0':6.0, 'kN':15},
+          'stimulation':{'I':[10.0], 'onset':1.333},
+          'simulation':{'duration':3.0, 'dt':0.0001},
+          'timestamp':'Sun Oct 18 00:00:00 2026', 'git_branch':'master', 'git_hash':'abc', 'git_short_hash':'abc'}
+
+
+def test_run_hash_pinned():
+    # the identity of existing results must not change between versions
+    assert runcache.run_hash(config, git_hash='0'*40) == '0c99665e0560b921'
+
+
+def test_run_hash_canonical():
+    h = runcache.run_hash(config, git_hash='x')
+    same = {key:config[key] for key in reversed(list(config))} # key order
+    same = copy.deepcopy(same)
+    same['Kuramoto']['N'] = 250.    # int vs float
+    same['simulation']['dt'] = 1e-4
+    assert runcache.run_hash(same, git_hash='x') == h
+
+    bookkeeping = dict(config, timestamp='later', git_branch='other', git_hash='def', git_short_hash='def')
+    assert runcache.run_hash(bookkeeping, git_hash='x') == h
+
+
+def test_run_hash_changes():
+    h = runcache.run_hash(config, git_hash='x')
+    assert runcache.run_hash(config, git_hash='y') != h
+    assert runcache.run_hash(dict(config, seed_val=43), git_hash='x') != h
+    other = copy.deepcopy(config)
+    other['stimulation']['I'] = [12.0]
+    assert runcache.run_hash(other, git_hash='x') != h
@@ -0,0 +1,101 @@
+import os
+import json
+
+import numpy as np
+
+from src import runfile
+
+
+def fake_results(rng, n_E=70000, n_I=100):
+    """ Results dictionary of a short run, as returned by NetworkHandle.results """
+    res = {'positions':{'CA1_pyCAN':rng.random((n_E, 3)), 'CA1_inh':rng.random((n_I, 3))},
+           'spikes':{'CA1_pyCAN_spikemon':{'i':rng.integers(0, n_E, 500), 't':np.sort(rng.random(500))*1e3},
+                     'CA1_inh_spikemon':{'i':rng.integers(0, n_I, 300), 't':np.sort(rng.random(300))*1e3}},
+           'order_param':{'phase':rng.random(100), 'rhythm':rng.random(100), 'coherence':rng.random(100)},
+           'rate_CA1_E':rng.random(100), 's2r_drive':rng.random(100), 'stim_input':np.zeros(100),
+           'Vm_avg':{'Vm_avg_mon_CA1_E':rng.random(50)},
+           'rate_bins':{'CA1_pyCAN':{'counts':rng.integers(0, 10, (2, 20)), 'edges':np.linspace(0, 1, 3)}},
+           'recordings':{'rec_mon':{'i':np.arange(3), 'v':rng.random((3, 10))}}}
+    return res
+
+
+def test_write_open_roundtrip(tmp_path):
+    rng = np.random.default_rng(0)
+    res = fake_results(rng)
+    os.makedirs(tmp_path/'data')
+    params = {'seed_val':42, 'simulation':{'duration':1., 'dt':1e-4}}
+    info = {'run_time':12.5, 'n_spikes':{'CA1_pyCAN_spikemon':500}}
+    cols = runfile.pack_results(res)
+    runfile.write_run(str(tmp_path/'data'/runfile.RUN_FNAME), cols, params, info)
+
+    run = runfile.open_run(str(tmp_path))
+    assert isinstance(run, runfile.RunFile)
+    assert run.parameters == params
+    assert run.info == info
+    assert set(run.keys()) == set(cols)
+    for name, arr in cols.items():
+        assert run[name].dtype == arr.dtype, name
+        assert run[name].shape == arr.shape, name
+        np.testing.assert_array_equal(run[name], arr)
+
+    # typed columns (note #2)
+    assert run['spikes/CA1_pyCAN/i'].dtype == np.uint32 # more than 65536 neurons
+    assert run['spikes/CA1_inh/i'].dtype == np.uint16
+    assert run['spikes/CA1_inh/t'].dtype == np.float32
+    i, t = run.spikes('CA1_inh')
+    np.testing.assert_array_equal(i, res['spikes']['CA1_inh_spikemon']['i'])
+    np.testing.assert_allclose(t, res['spikes']['CA1_inh_spikemon']['t'], rtol=1e-6)
+
+
+def test_empty_columns(tmp_path):
+    fname = str(tmp_path/runfile.RUN_FNAME)
+    runfile.write_run(fname, {'spikes/G/i':np.zeros(0, dtype=np.uint16), 'x':np.arange(3.)})
+    run = runfile.RunFile(fname)
+    assert run['spikes/G/i'].shape == (0,)
+    np.testing.assert_array_equal(run['x'], np.arange(3.))
+
+
+def test_open_legacy(tmp_path):
+    os.makedirs(tmp_path/'data'/'spikes')
+    with open(tmp_path/'parameters_bak.json', 'w') as fout:
+        json.dump({'seed_val':1}, fout)
+    np.savetxt(tmp_path/'data'/'rate_mon_E_CA1.txt', np.arange(5.))
+    np.savetxt(tmp_path/'data'/'spikes'/'CA1_inh_spikemon_i.txt', [3, 1, 2], fmt='%d')
+    np.savetxt(tmp_path/'data'/'spikes'/'CA1_inh_spikemon_t.txt', [0.5, 1.5, 2.5], fmt='%.1f')
+
+    run = runfile.open_run(str(tmp_path))
+    assert isinstance(run, runfile.LegacyRun)
+    assert run.parameters == {'seed_val':1}
+    np.testing.assert_array_equal(run['rate_CA1_E'], np.arange(5.))
+    i, t = run.spikes('CA1_inh')
+    np.testing.assert_array_equal(i, [3, 1, 2])
+    np.testing.assert_array_equal(t, [0.5, 1.5, 2.5])
+
+
+def test_binned_counts_fallback(tmp_path):
+    from src import pac_sweep
+
+    # spikes in [0, 1) s of two groups, off the bin edges; a run with the rasters and one with 0.5 ms binned counts only
+    rng = np.random.default_rng(1)
+    duration, dt_bin, N = 1., 0.5e-3, [100, 10]
+    t = {group:(np.sort(rng.integers(0, int(duration/dt_bin), n))+0.5)*dt_bin for group, n in [('CA1_pyCAN', 2000), ('CA1_inh', 800)]}
+    params = {'recording':{'rate_bins':{'dt':dt_bin}}}
+    cols_spikes = {}
+    cols_binned = {}
+    for group, times in t.items():
+        cols_spikes['spikes/'+group+'/i'] = np.zeros(len(times), dtype=np.uint16)
+        cols_spikes['spikes/'+group+'/t'] = np.asarray(times*1e3, dtype=np.float32)
+        counts = np.bincount(np.floor(times/dt_bin).astype(int), minlength=int(duration/dt_bin))
+        cols_binned['rate_bins/'+group+'/counts'] = np.asarray([counts//2, counts - counts//2], dtype=np.uint32) # 2 spatial bins
+    for name, cols in [('spikes', cols_spikes), ('binned', cols_binned)]:
+        os.makedirs(tmp_path/name/'data')
+        runfile.write_run(str(tmp_path/name/'data'/runfile.RUN_FNAME), cols, params)
+
+    counts, dt = runfile.binned_counts(runfile.open_run(str(tmp_path/'binned')), 'CA1_inh')
+    assert dt == dt_bin
+    assert counts.sum() == 800
+
+    tv0, FR0 = pac_sweep.load_rates(str(tmp_path/'spikes'), list(t), N, duration, 5e-3, 0.9)
+    tv1, FR1 = pac_sweep.load_rates(str(tmp_path/'binned'), list(t), N, duration, 5e-3, 0.9)
+    np.testing.assert_allclose(tv1, tv0)
+    np.testing.assert_allclose(FR1, FR0)
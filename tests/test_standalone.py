@@ -0,0 +1,53 @@
+import os
+import sys
+import glob
+import shutil
+import subprocess
+
+import pytest
+
+pytest.importorskip('brian2')
+pytestmark = pytest.mark.skipif(shutil.which('g++') is None, reason='C++ standalone needs a compiler')
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# set_device() is global to the process: build and run in a subprocess
+smoke = """
+import os, sys, copy
+sys.path.insert(0, {root!r})
+from brian2 import prefs
+prefs.devices.cpp_standalone.extra_make_args_unix = ['-j2']
+import parameters
+from model.network import build_network
+
+data = copy.deepcopy(parameters._data)
+data['simulation']['duration'] = 0.01
+data['Kuramoto']['kN'] = {kN} # run-time argument
+model = build_network(data, conn_cache_dir={cache!r}, standalone={build!r})
+model.run(report=None, results_directory={results!r})
+res = model.results()
+assert len(res['n_spikes']) == 8 # one spike monitor per population
+assert len(res['order_param']['coherence']) > 0
+print('SMOKE OK')
+"""
+
+
+def run_smoke(tmp_path, results, kN):
+    code = smoke.format(root=root, cache=str(tmp_path/'cache'), build=str(tmp_path/'build'), results=str(tmp_path/results), kN=kN)
+    proc = subprocess.run([sys.executable, '-c', code], cwd=str(tmp_path), capture_output=True, text=True, timeout=3600)
+    assert proc.returncode == 0, proc.stderr[-3000:]
+    assert 'SMOKE OK' in proc.stdout
+    assert os.path.isdir(tmp_path/results)
+    return proc.stdout
+
+
+def test_standalone_default_config(tmp_path):
+    """ Default configuration (connectivity cache on, default generators) builds and runs with the C++ standalone device; a second run with other run-time values only executes the binary """
+    run_smoke(tmp_path, 'results_1', 15)
+    assert not os.path.exists(tmp_path/'output') # built in the standalone directory
+    binary, = glob.glob(str(tmp_path/'build'/'*'/'main'))
+    mtime = os.path.getmtime(binary)
+
+    stdout = run_smoke(tmp_path, 'results_2', 5)
+    assert 'Reusing standalone build' in stdout
+    assert os.path.getmtime(binary) == mtime
@@ -0,0 +1,41 @@
+import os
+import json
+import time
+
+import pytest
+
+pytest.importorskip('brian2')
+
+import sweep
+
+
+def fake_run(point, resdir, extra, logdir):
+    """ run_point() stand-in: point 3 kills its worker, point 5 fails, the others succeed """
+    open(sweep.marker(logdir, point), 'w').close()
+    time.sleep(0.3)
+    if point['index'] == 3:
+        os._exit(9)
+    code = 1 if point['index'] == 5 else 0
+    os.remove(sweep.marker(logdir, point))
+    return code, 0.3, 'log'
+
+
+def test_run_local_retries(tmp_path, monkeypatch):
+    monkeypatch.setattr(sweep, 'run_point', fake_run)
+    monkeypatch.setattr(sweep, 'init_worker', lambda: None)
+
+    points = [{'index':idx, 'config':'c{0}.json'.format(idx), 'run_id':'x'} for idx in range(8)]
+    with open(tmp_path/'points.json', 'w') as fout:
+        json.dump({'resdir':str(tmp_path), 'extra':[], 'retries':2, 'points':points}, fout)
+
+    failed = sweep.run_local(str(tmp_path), points, 4)
+    assert sorted(point['index'] for point in failed) == [3, 5]
+
+    # a crash is only charged to the point that caused it
+    rows = {row['index']:row for row in sweep.status_table(str(tmp_path))}
+    for idx, row in rows.items():
+        if idx in (3, 5):
+            assert (row['state'], row['attempts']) == ('failed', 3), idx
+        else:
+            assert (row['state'], row['attempts']) == ('done', 1), idx
+    assert os.path.isfile(tmp_path/'status.csv')
@@ -0,0 +1,58 @@
+import pytest
+
+pytest.importorskip('brian2')
+
+from brian2 import NeuronGroup, PopulationRateMonitor, Network, prefs, second, ms
+
+from model import watchdog
+from model.watchdog import Watchdog
+
+
+class FakeS2R:
+    """ S2R filter stand-in with a settable drive """
+    drive = [0.]
+
+
+def test_violation_counting(monkeypatch):
+    stops = []
+    monkeypatch.setattr(watchdog, 'stop', lambda: stops.append(1))
+    G_S2R = FakeS2R()
+    wd = Watchdog({'groups':['S2R_filter'], 'min_rate':1., 'max_rate':50., 'period':50e-3, 'window':200e-3, 'start':200e-3}, {}, G_S2R)
+
+    # before `start` nothing is counted
+    G_S2R.drive = [500.]
+    wd.check(0.1*second)
+    assert wd.counts['S2R_filter'] == 0
+
+    # a violation shorter than the window is forgotten once the rate is back within the bounds
+    for t in [0.2, 0.25, 0.3]:
+        wd.check(t*second)
+    assert wd.counts['S2R_filter'] == 3
+    G_S2R.drive = [10.]
+    wd.check(0.35*second)
+    assert wd.counts['S2R_filter'] == 0 and not stops
+
+    # window/period checks in a row abort the run, once
+    G_S2R.drive = [0.]
+    for t in [0.4, 0.45, 0.5, 0.55, 0.6, 0.65]:
+        wd.check(t*second)
+    assert stops == [1]
+    assert wd.status() == {'aborted':True, 'reason':wd.reason, 't_abort':pytest.approx(0.55)}
+    assert 'below min_rate' in wd.reason
+
+    wd.reset()
+    assert wd.status()['aborted'] is False and wd.counts['S2R_filter'] == 0
+
+
+def test_stops_saturated_run():
+    prefs.codegen.target = 'numpy'
+    G = NeuronGroup(10, 'dv/dt = 1000/second : 1', threshold='v > 1', reset='v = 0', name='G') # ~1 kHz
+    mon = PopulationRateMonitor(G, name='G_ratemon')
+    wd = Watchdog({'groups':['G'], 'max_rate':100., 'period':50e-3, 'window':200e-3, 'start':100e-3}, {'G_ratemon':mon}, dt=0.1e-3)
+    net = Network(G, mon, wd.operation)
+    net.run(1*second)
+
+    assert wd.status()['aborted']
+    assert 'above max_rate' in wd.reason
+    assert wd.t_abort == pytest.approx(0.25)
+    assert net.t < 300*ms
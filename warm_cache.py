@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# Pre-compiles the Cython code objects (and generates the connectivity) for a
+# family of configuration files, so that the jobs of a sweep start from a warm
+# shared cache and do not need to be staggered.
+#
+# Brian2 compiles with -march=native: run this on a compute node of the
+# partition the jobs run on, not on the submit node, or the jobs may load code
+# built for another CPU. With -sb, this script submits itself as a SLURM job
+# and blocks until the job is done (parallel_run2.sh, parallel_run_cluster.sh
+# and sweep.py warm up this way).
+#
+# Gains, connection probabilities and the other model parameters are part of
+# the generated code, so one configuration is built per distinct code
+# signature (the configuration without the entries that are run-time values,
+# state variables or bookkeeping, see src/runcache.py), not per directory.
+#
+# With -sa, the C++ standalone binaries are built instead, one per standalone
+# signature; the runs of the sweep then only execute them.
+# -----------------------------------------------------------------------------
+import os
+import sys
+import glob
+import shlex
+import argparse
+import subprocess
+
+import parameters
+from model import connectivity
+from src import runcache
+
+
+def job_command(args):
+    """ Command line of the warm-up without the SLURM options (runs inside the job) """
+    cmd = ['python3', 'warm_cache.py'] + [os.path.abspath(item) for item in args.configs] + ['-cy', args.cython_cache, '-cc', args.conn_cache]
+    if args.standalone:
+        cmd += ['-sa', os.path.abspath(args.standalone), '-th', str(args.threads)]
+    if args.all:
+        cmd.append('-a')
+    return ' '.join(shlex.quote(item) for item in cmd)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Warm the shared Cython/connectivity caches for a set of configuration files')
+
+    parser.add_argument('configs',
+                        nargs='+',
+                        type=str,
+                        help='Configuration files (json) and/or directories containing them')
+
+    parser.add_argument('-cy', '--cython_cache',
+                        nargs='?',
+                        type=str,
+                        default=os.path.expanduser(os.path.join('~', '.cython', 'brian_extensions')),
+                        help='Shared Cython cache directory')
+
+    parser.add_argument('-cc', '--conn_cache',
+                        nargs='?',
+                        type=str,
+                        default=connectivity.conn_cache_dir,
+                        help='Connectivity cache directory')
+
+    parser.add_argument('-sa', '--standalone',
+                        nargs='?',
+                        type=str,
+                        default=None,
+                        help='Build the C++ standalone binaries in this directory (see run_simulation.py -sa)')
+
+    parser.add_argument('-th', '--threads',
+                        nargs='?',
+                        type=int,
+                        default=0,
+                        help='Number of OpenMP threads of the standalone binaries')
+
+    parser.add_argument('-a', '--all',
+                        action='store_true',
+                        default=False,
+                        help='Build every configuration file; by default only one file per distinct code signature is built')
+
+    parser.add_argument('-sb', '--slurm',
+                        action='store_true',
+                        default=False,
+                        help='Run the warm-up as a SLURM job on a compute node and wait for it')
+
+    parser.add_argument('-mem', '--mem_per_cpu',
+                        nargs='?',
+                        type=str,
+                        default='16G',
+                        help='Memory per CPU of the SLURM job')
+
+    parser.add_argument('-t', '--time',
+                        nargs='?',
+                        type=str,
+                        default='120',
+                        help='Time limit of the SLURM job')
+
+    parser.add_argument('-pa', '--partition',
+                        nargs='?',
+                        type=str,
+                        default=None,
+                        help='SLURM partition')
+
+    parser.add_argument('-o', '--output',
+                        nargs='?',
+                        type=str,
+                        default=None,
+                        help='Output file of the SLURM job')
+
+    args = parser.parse_args()
+
+    # Submit this script as a blocking job on a compute node
+    if args.slurm:
+        cmd = ['sbatch', '--wait', '--job-name=WARM_CACHE', '--ntasks=1', '--cpus-per-task=1',
+               '--mem-per-cpu='+args.mem_per_cpu, '--time='+args.time, '--chdir='+os.path.dirname(os.path.abspath(__file__))]
+        if args.partition:
+            cmd.append('--partition='+args.partition)
+        if args.output:
+            cmd.append('--output='+os.path.abspath(args.output))
+        print('[+] Submitting the warm-up job (waits until it is done)')
+        exit(subprocess.call(cmd + ['--wrap='+job_command(args)]))
+
+    # Gather the configuration files
+    fnames = []
+    for item in args.configs:
+        fnames += sorted(glob.glob(os.path.join(item, '*.json'))) if os.path.isdir(item) else [item]
+
+    # Unseeded configurations cannot share a standalone binary (see model/network.py)
+    if args.standalone:
+        unseeded = [fconf for fconf in fnames if parameters.load(fconf)['seed_val'] is None]
+        if unseeded:
+            print('[!] Skipping {0} unseeded configuration files: every run builds its own binary'.format(len(unseeded)))
+        fnames = [fconf for fconf in fnames if fconf not in unseeded]
+
+    # One configuration per code signature
+    fconfigs = fnames
+    if not args.all:
+        signatures = {}
+        for fconf in fnames:
+            signatures.setdefault(runcache.code_signature(parameters.load(fconf), standalone=bool(args.standalone)), fconf)
+        fconfigs = list(signatures.values())
+
+    print('[+] Warming caches for {0} configuration files ({1} in total)'.format(len(fconfigs), len(fnames)))
+    print('[+] Cython cache:', args.cython_cache)
+    print('[+] Connectivity cache:', args.conn_cache)
+    if args.standalone:
+        print('[+] Standalone builds:', args.standalone)
+
+    # One process per config
+    failed = []
+    for cnt, fconf in enumerate(fconfigs):
+        print('[•]\t[{0}/{1}] {2}'.format(cnt+1, len(fconfigs), fconf))
+        cmd = [sys.executable, 'run_simulation.py', '-p', fconf, '-cy', args.cython_cache, '-cc', args.conn_cache, '--warm_cache']
+        if args.standalone:
+            cmd += ['--standalone', args.standalone, '--threads', str(args.threads)]
+        ret = subprocess.call(cmd, stdout=subprocess.DEVNULL)
+        if ret != 0:
+            print('[-]\tfailed with code', ret)
+            failed.append(fconf)
+
+    if failed:
+        print('[!] Failed:', failed)
+        exit(1)
+
+    print('[+] Done')
+    exit(0)